@@ -0,0 +1,1190 @@
+"""
+扫雷插件性能基准测试。
+
+把插件目录作为包加载，直接导入 game.py、renderer.py 等模块（不依赖 AstrBot），用法:
+    python benchmark.py            # 运行全部基准
+    python benchmark.py render     # 只运行指定基准
+"""
+import asyncio
+import importlib.machinery
+import itertools
+import json
+import math
+import importlib.util
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = "minesweeper_plugin"
+
+
+def _load_plugin_package():
+    """把插件目录注册为包，使模块间的相对导入可以正常工作。"""
+    if PACKAGE not in sys.modules:
+        spec = importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True)
+        spec.submodule_search_locations = [PLUGIN_DIR]
+        sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+
+
+_load_plugin_package()
+
+from minesweeper_plugin import game as game_module
+from minesweeper_plugin import metrics
+from minesweeper_plugin.game import MINE, MinesweeperGame
+from minesweeper_plugin import leaderboard as leaderboard_module
+from minesweeper_plugin import renderer
+from minesweeper_plugin import replay as replay_module
+from minesweeper_plugin.renderer import render_board, render_overview, encode_image, RenderCache
+from minesweeper_plugin.render_pool import RenderPool
+from minesweeper_plugin.sessions import SessionManager, estimate_session_bytes
+from minesweeper_plugin.solver import Solver, solver_for
+from minesweeper_plugin.storage import StoreWriter, create_store
+
+HARD = (30, 16, 99)
+
+
+def _play_moves(game, rng, count):
+    """在游戏上随机执行最多 count 步（点开或插旗），返回实际执行的步数。"""
+    moves = 0
+    while moves < count and not game.game_over:
+        x, y = rng.randrange(game.width), rng.randrange(game.height)
+        if game.revealed[y][x]:
+            continue
+        if rng.random() < 0.2:
+            game.flag_cell(x, y)
+        elif not game.flagged[y][x]:
+            game.reveal_cell(x, y)
+        moves += 1
+    return moves
+
+
+def _check_stale_render():
+    """渲染完成前缓存被丢弃（例如超时后切换到文字模式）时，晚到的旧帧不应写回缓存。"""
+    game = MinesweeperGame(*HARD, seed=3)
+    _play_moves(game, random.Random(3), 10)
+    cache = RenderCache()
+    generation = cache.generation # 渲染池取得游戏状态时的代数
+    state = game.get_state()
+    dirty = game.take_dirty_cells()
+    cache.invalidate()
+    _play_moves(game, random.Random(4), 5)
+    game.take_dirty_cells() # 文字模式下丢弃的变化
+    render_board(state, cache, dirty, generation=generation)
+    assert cache.image is None, "缓存丢弃前开始的渲染写回了旧帧"
+    assert render_board(game.get_state(), cache, set()) == render_board(game.get_state())
+
+
+def bench_render():
+    """对比困难棋盘 (30x16) 上每步完整重绘与增量重绘的耗时，并校验缓存丢弃后不会写回旧帧。"""
+    width, height, mines = HARD
+    rng = random.Random(0)
+    full_times = []
+    incremental_times = []
+    encode_times = []
+    for _ in range(20):
+        game = MinesweeperGame(width, height, mines)
+        cache = RenderCache()
+        render_board(game.get_state(), cache, game.take_dirty_cells())
+        while not game.game_over:
+            if not _play_moves(game, rng, 1):
+                break
+            state = game.get_state()
+            dirty = game.take_dirty_cells()
+            start = time.perf_counter()
+            full = render_board(state)
+            full_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            incremental = render_board(state, cache, dirty)
+            incremental_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            encode_image(cache.image)
+            encode_times.append(time.perf_counter() - start)
+            assert full == incremental, "增量渲染结果与完整渲染不一致"
+
+    full_ms = sum(full_times) * 1000 / len(full_times)
+    incremental_ms = sum(incremental_times) * 1000 / len(incremental_times)
+    encode_ms = sum(encode_times) * 1000 / len(encode_times)
+    print(f"render ({width}x{height}, {len(full_times)} 帧, 含 PNG 编码 {encode_ms:.2f} ms)")
+    print(f"  完整重绘: {full_ms:.2f} ms/帧  (绘制 {full_ms - encode_ms:.2f} ms)")
+    print(f"  增量重绘: {incremental_ms:.2f} ms/帧  (绘制 {incremental_ms - encode_ms:.2f} ms, "
+          f"{(full_ms - encode_ms) / max(incremental_ms - encode_ms, 1e-6):.1f}x)")
+    _check_stale_render()
+    print("  缓存丢弃后晚到的渲染不会写回旧帧")
+
+
+ENCODINGS = {
+    "png (默认)": {"format": "png"},
+    "png level=1": {"format": "png", "compress_level": 1},
+    "png level=9": {"format": "png", "compress_level": 9},
+    "png rle": {"format": "png", "compress_type": 3},
+    "png_palette": {"format": "png_palette"},
+    "png_palette level=9": {"format": "png_palette", "compress_level": 9},
+    "png_palette 16 色": {"format": "png_palette", "palette_colors": 16},
+    "webp 无损": {"format": "webp"},
+    "webp 有损 q=80": {"format": "webp", "webp_lossless": False},
+    "gif": {"format": "gif"},
+}
+
+
+def bench_encode(frames=30):
+    """比较不同输出格式和压缩参数下的体积与编码耗时（困难棋盘中局）。"""
+    width, height, mines = HARD
+    rng = random.Random(0)
+    images = []
+    while len(images) < frames:
+        game = MinesweeperGame(width, height, mines)
+        cache = RenderCache()
+        _play_moves(game, rng, rng.randrange(1, 40))
+        render_board(game.get_state(), cache)
+        images.append(cache.image)
+
+    print(f"encode ({width}x{height}, {frames} 帧)")
+    for label, options in ENCODINGS.items():
+        renderer.ENCODE_STATS.clear()
+        for image in images:
+            encode_image(image, options)
+        stats = renderer.ENCODE_STATS[options["format"]]
+        print(f"  {label:<20} {stats['bytes'] / stats['count'] / 1024:7.1f} KiB  "
+              f"{stats['seconds'] * 1000 / stats['count']:6.2f} ms")
+
+
+class LegacyListGame:
+    """旧版（嵌套列表 + 元组集合）棋盘存储的精简副本，仅用于对比基准。"""
+
+    def __init__(self, width, height, mines):
+        self.width = width
+        self.height = height
+        self.mines_count = mines
+        self.board = [[' ' for _ in range(width)] for _ in range(height)]
+        self.mine_locations = set()
+        self.revealed = [[False for _ in range(width)] for _ in range(height)]
+        self.flagged = [[False for _ in range(width)] for _ in range(height)]
+        self.first_click = True
+        self.game_over = False
+
+    def _get_neighbors(self, x, y):
+        return [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                if (dx or dy) and 0 <= x + dx < self.width and 0 <= y + dy < self.height]
+
+    def _place_mines(self, start_x, start_y):
+        possible_locations = [(c, r) for r in range(self.height) for c in range(self.width)
+                              if abs(r - start_y) > 1 or abs(c - start_x) > 1]
+        self.mine_locations = set(random.sample(possible_locations, self.mines_count))
+        for r in range(self.height):
+            for c in range(self.width):
+                if (c, r) in self.mine_locations:
+                    self.board[r][c] = '*'
+                    continue
+                count = sum((n in self.mine_locations) for n in self._get_neighbors(c, r))
+                if count > 0:
+                    self.board[r][c] = str(count)
+
+    def reveal_cell(self, x, y):
+        if self.revealed[y][x] or self.flagged[y][x] or self.game_over:
+            return []
+        if self.first_click:
+            self._place_mines(x, y)
+            self.first_click = False
+        self.revealed[y][x] = True
+        if self.board[y][x] == '*':
+            self.game_over = True
+            return [(x, y)]
+        if self.board[y][x] == ' ':
+            queue = [(x, y)]
+            visited = {(x, y)}
+            while queue:
+                cx, cy = queue.pop(0)
+                for nx, ny in self._get_neighbors(cx, cy):
+                    if (nx, ny) not in visited and not self.revealed[ny][nx] and not self.flagged[ny][nx]:
+                        self.revealed[ny][nx] = True
+                        visited.add((nx, ny))
+                        if self.board[ny][nx] == ' ':
+                            queue.append((nx, ny))
+        self._check_win()
+        return [(x, y)]
+
+    def flag_cell(self, x, y):
+        if self.revealed[y][x] or self.game_over:
+            return []
+        self.flagged[y][x] = not self.flagged[y][x]
+        self._check_win()
+        return [(x, y)]
+
+    def _check_win(self):
+        revealed_count = sum(1 for r in range(self.height) for c in range(self.width)
+                             if self.revealed[r][c] and (c, r) not in self.mine_locations)
+        if revealed_count == self.width * self.height - self.mines_count:
+            self.game_over = True
+
+
+def bench_layout(games=1000):
+    """对比旧版嵌套列表与扁平 bytearray 存储的内存占用和走子吞吐量（困难棋盘）。"""
+    width, height, mines = HARD
+    print(f"layout ({width}x{height}, {games} 局)")
+    for label, cls in (("嵌套列表", LegacyListGame), ("bytearray", MinesweeperGame)):
+        random.seed(0)
+        tracemalloc.start()
+        kept = []
+        for _ in range(games):
+            game = cls(width, height, mines)
+            game.reveal_cell(width // 2, height // 2)
+            kept.append(game)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+
+        rng = random.Random(0)
+        moves = 0
+        start = time.perf_counter()
+        for _ in range(games // 10):
+            game = cls(width, height, mines)
+            moves += _play_moves(game, rng, 200)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<10} {memory / games / 1024:6.1f} KiB/局  {moves / elapsed:9.0f} 步/秒")
+
+
+def bench_flood(repeat=20):
+    """最坏情况的空旷棋盘: 30x30 仅 1 个雷，首次点击几乎揭开整个棋盘。"""
+    width, height, mines = 30, 30, 1
+    print(f"flood ({width}x{height}, {mines} 个雷, 首次点击)")
+    for label, cls in (("列表 pop(0)", LegacyListGame), ("邻接表 + 栈", MinesweeperGame)):
+        random.seed(0)
+        elapsed = 0.0
+        for _ in range(repeat):
+            game = cls(width, height, mines)
+            start = time.perf_counter()
+            game.reveal_cell(0, 0)
+            elapsed += time.perf_counter() - start
+        print(f"  {label:<12} {elapsed * 1000 / repeat:7.2f} ms")
+
+
+def _chord_positions(game):
+    """给所有地雷插旗后，返回周围还有未揭开安全格的数字格下标。"""
+    for i in game.mine_indices:
+        if not game.flagged_mask[i]:
+            game.flag_cell(i % game.width, i // game.width)
+    cells, revealed, flagged = game.cells, game.revealed_mask, game.flagged_mask
+    return [i for i in range(game.width * game.height)
+            if revealed[i] and 0 < cells[i] < game_module.MINE
+            and any(not revealed[j] and not flagged[j] for j in game.neighbors[i])]
+
+
+def bench_chord(games=200):
+    """双击: 一次 chord_cell 与逐个点开相同格子的耗时对比，并校验两者结果一致（困难棋盘）。"""
+    width, height, mines = HARD
+    chord_s = single_s = 0.0
+    chords = 0
+    for seed in range(games):
+        random.seed(seed)
+        game = MinesweeperGame(width, height, mines)
+        game.reveal_cell(width // 2, height // 2)
+        positions = _chord_positions(game)
+        if not positions:
+            continue
+        index = positions[0]
+        x, y = index % width, index // width
+        twin = MinesweeperGame.from_bytes(game.to_bytes())
+
+        start = time.perf_counter()
+        game.chord_cell(x, y)
+        chord_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for j in twin.neighbors[index]:
+            twin.reveal_cell(j % width, j // width)
+        single_s += time.perf_counter() - start
+        assert twin.revealed_mask == game.revealed_mask and twin.won == game.won, "双击与逐个点开的结果不一致"
+        chords += 1
+    print(f"chord ({chords} 次, {width}x{height})")
+    print(f"  双击 {chord_s * 1e6 / chords:6.1f} us  逐个点开 {single_s * 1e6 / chords:6.1f} us")
+
+
+def _brute_force_probabilities(game):
+    """枚举所有与已揭开数字一致的布雷，返回每个未揭开格子的精确踩雷概率（仅适用于小棋盘）。"""
+    size = game.width * game.height
+    revealed = game.revealed_mask
+    hidden = [i for i in range(size) if not revealed[i]]
+    numbers = [i for i in range(size) if revealed[i]]
+    counts = dict.fromkeys(hidden, 0)
+    total = 0
+    for combo in itertools.combinations(hidden, game.mines_count):
+        mines = set(combo)
+        if all(sum(j in mines for j in game.neighbors[i]) == game.cells[i] for i in numbers):
+            total += 1
+            for i in combo:
+                counts[i] += 1
+    return {i: n / total for i, n in counts.items()}
+
+
+def _check_solver_exact(positions=60):
+    """小棋盘上把求解器的概率与暴力枚举逐格比对。"""
+    width, height, mines = 6, 5, 6
+    checked = 0
+    for seed in range(positions):
+        random.seed(seed)
+        game = MinesweeperGame(width, height, mines)
+        game.reveal_cell(random.randrange(width), random.randrange(height))
+        if game.game_over:
+            continue
+        analysis = Solver(game).analyze()
+        for i, p in _brute_force_probabilities(game).items():
+            assert abs(analysis.probability(i) - p) < 1e-9, f"种子 {seed} 格子 {i}: {analysis.probability(i)} != {p}"
+        checked += 1
+    return checked
+
+
+def _solve_with_guesses(game, timings):
+    """用求解器玩一局: 有安全格时全部点开，否则点开踩雷概率最低的格子。返回是否获胜。"""
+    width = game.width
+    solver = Solver(game)
+    while not game.game_over:
+        start = time.perf_counter()
+        analysis = solver.analyze()
+        timings.append(time.perf_counter() - start)
+        for i in analysis.safe:
+            assert game.cells[i] != game_module.MINE, "求解器把地雷判为安全"
+        for i in analysis.mines:
+            assert game.cells[i] == game_module.MINE, "求解器把安全格判为地雷"
+        if analysis.safe:
+            for i in sorted(analysis.safe):
+                game.reveal_cell(i % width, i // width)
+        else:
+            candidates = [i for i in range(width * game.height)
+                          if not game.revealed_mask[i] and i not in analysis.mines]
+            i = min(candidates, key=analysis.probability)
+            game.reveal_cell(i % width, i // width)
+    return game.won
+
+
+def _opened_board(size, seed, opened=0.3):
+    """size x size、雷密度约 20% 的棋盘上随机点开 opened 比例的安全格，得到边界分量很多的局面。"""
+    rng = random.Random(seed)
+    game = MinesweeperGame(size, size, size * size // 5, seed=seed)
+    game.reveal_cell(size // 2, size // 2)
+    safe = [i for i in range(size * size) if game.cells[i] != MINE]
+    rng.shuffle(safe)
+    for i in safe:
+        if game.revealed_safe_count >= opened * len(safe):
+            break
+        if not game.revealed_mask[i]:
+            game.reveal_cell(i % size, i // size)
+    return game
+
+
+def _check_large_solver(sizes=(100, 200, 300), limit=5.0):
+    """大棋盘随机局面的首次求解耗时（要求不超过 limit 秒），并校验结论正确。"""
+    results = []
+    for size in sizes:
+        game = _opened_board(size, seed=size)
+        start = time.perf_counter()
+        analysis = Solver(game).analyze()
+        elapsed = time.perf_counter() - start
+        for i in analysis.safe:
+            assert game.cells[i] != MINE, "求解器把地雷判为安全"
+        for i in analysis.mines:
+            assert game.cells[i] == MINE, "求解器把安全格判为地雷"
+        assert elapsed < limit, f"{size}x{size} 求解耗时 {elapsed:.1f} s"
+        results.append((size, elapsed, analysis.exact))
+    return results
+
+
+def bench_solver(games=200):
+    """求解器: 困难棋盘上每次求解的耗时分布与胜率，并校验结论正确、概率与暴力枚举一致；以及大棋盘上的求解耗时。"""
+    width, height, mines = HARD
+    timings = []
+    won = 0
+    for seed in range(games):
+        random.seed(seed)
+        game = MinesweeperGame(width, height, mines)
+        game.reveal_cell(width // 2, height // 2)
+        won += _solve_with_guesses(game, timings)
+    timings.sort()
+    checked = _check_solver_exact()
+    print(f"solver ({games} 局 {width}x{height}, 共求解 {len(timings)} 次)")
+    print(f"  单次求解 p50 {timings[len(timings) // 2] * 1000:.2f} ms  "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1000:.2f} ms  最大 {timings[-1] * 1000:.2f} ms")
+    print(f"  胜率 {won / games:.0%}（猜测时选踩雷概率最低的格子）")
+    print(f"  {checked} 个小棋盘局面的概率与暴力枚举一致")
+    for size, elapsed, exact in _check_large_solver():
+        print(f"  {size}x{size} 随机点开 30%: 求解 {elapsed * 1000:7.1f} ms{'' if exact else '（近似）'}")
+
+
+def bench_noguess(games=20):
+    """无猜模式: 各难度下首次点击（反复布雷直到可解）的耗时，并校验布局确实无需猜测。"""
+    print(f"noguess (每种难度 {games} 局)")
+    for width, height, mines in ((9, 9, 10), (16, 16, 40), HARD):
+        timings = []
+        verified = 0
+        for seed in range(games):
+            random.seed(seed)
+            game = MinesweeperGame(width, height, mines, no_guess=True)
+            start = time.perf_counter()
+            game.reveal_cell(width // 2, height // 2)
+            timings.append(time.perf_counter() - start)
+            if game.no_guess_verified:
+                verified += 1
+                # 不猜测地解开整局
+                solver = Solver(game)
+                while not game.game_over:
+                    safe = solver.safe_cells()
+                    assert safe, "无猜布局需要猜测"
+                    for i in list(safe):
+                        game.reveal_cell(i % width, i // width)
+                assert game.won
+        timings.sort()
+        print(f"  {width:>2}x{height:<2} {mines:>3} 雷  生成 p50 {timings[len(timings) // 2] * 1000:6.1f} ms  "
+              f"最大 {timings[-1] * 1000:6.1f} ms  成功 {verified}/{games}")
+
+
+def _mid_game(seed, steps=3):
+    """困难棋盘上由求解器走几步得到的中局（尚未结束）。"""
+    while True:
+        random.seed(seed)
+        width, height, mines = HARD
+        game = MinesweeperGame(width, height, mines)
+        game.reveal_cell(width // 2, height // 2)
+        solver = Solver(game)
+        for _ in range(steps):
+            safe = solver.analyze().safe
+            for i in sorted(safe)[:5]:
+                game.reveal_cell(i % width, i // width)
+        if not game.game_over:
+            return game
+        seed += 1000
+
+
+def bench_heatmap(positions=20, repeat=5):
+    """概率热力图: 叠加热力图的渲染耗时与普通渲染对比（要求不超过 2 倍），以及求解结果缓存的效果。"""
+    normal_s = overlay_s = incremental_s = 0.0
+    analyze_s = cached_s = 0.0
+    for seed in range(positions):
+        game = _mid_game(seed)
+        state = game.get_state()
+
+        start = time.perf_counter()
+        heatmap = solver_for(game).heatmap()
+        analyze_s += time.perf_counter() - start
+        start = time.perf_counter()
+        assert solver_for(game).heatmap() is heatmap, "局面未变时应复用求解结果"
+        cached_s += time.perf_counter() - start
+
+        cache = RenderCache()
+        render_board(state, cache)
+        x, y = next((i % game.width, i // game.width) for i in range(len(game.revealed_mask)) if not game.revealed_mask[i])
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render_board(state)
+            normal_s += time.perf_counter() - start
+            start = time.perf_counter()
+            render_board(state, cache, {(x, y)})
+            incremental_s += time.perf_counter() - start
+            start = time.perf_counter()
+            render_board(state, overlay=heatmap)
+            overlay_s += time.perf_counter() - start
+    frames = positions * repeat
+    normal_ms, overlay_ms = normal_s * 1000 / frames, overlay_s * 1000 / frames
+    print(f"heatmap ({positions} 个中局 {HARD[0]}x{HARD[1]}, 每个渲染 {repeat} 次)")
+    print(f"  普通完整渲染 {normal_ms:6.2f} ms  增量渲染 {incremental_s * 1000 / frames:6.2f} ms  "
+          f"热力图 {overlay_ms:6.2f} ms ({overlay_ms / normal_ms:.2f}x)")
+    print(f"  求解 {analyze_s * 1000 / positions:6.2f} ms  缓存命中 {cached_s * 1e6 / positions:6.2f} us")
+    assert overlay_ms <= 2 * normal_ms, "热力图渲染耗时超过普通渲染的 2 倍"
+
+
+def bench_large():
+    """大棋盘: 各尺寸下的首次点击耗时、单局内存，以及 30x20 视口和缩略图的渲染耗时。"""
+    print("large (雷密度 15%, 视口 30x20)")
+    for side in (30, 100, 200, 300):
+        mines = side * side * 15 // 100
+        random.seed(0)
+        game = MinesweeperGame(side, side, mines)
+        start = time.perf_counter()
+        game.reveal_cell(side // 2, side // 2)
+        click_ms = (time.perf_counter() - start) * 1000
+        game.take_dirty_cells()
+
+        # tracemalloc 会显著拖慢分配，内存单独用另一局测量
+        random.seed(0)
+        tracemalloc.start()
+        measured = MinesweeperGame(side, side, mines)
+        measured.reveal_cell(side // 2, side // 2)
+        measured.take_dirty_cells()
+        memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del measured
+
+        viewport = (side // 2 - 15, side // 2 - 10, 30, 20)
+        start = time.perf_counter()
+        render_board(game.get_state(), viewport=viewport)
+        view_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        render_overview(game.get_state(), viewport)
+        overview_ms = (time.perf_counter() - start) * 1000
+        print(f"  {side:>3}x{side:<3} 首次点击 {click_ms:7.2f} ms  峰值内存 {memory / 1024:7.1f} KiB  "
+              f"视口 {view_ms:6.2f} ms  缩略图 {overview_ms:6.2f} ms")
+
+
+def bench_placement(repeat=20):
+    """比较纯 Python 与 NumPy 布雷 + 计数在不同棋盘尺寸下的耗时（雷密度约 20%）。"""
+    print("placement (布雷 + 相邻计数)")
+    if game_module._numpy() is None:
+        print("  未安装 NumPy，跳过")
+        return
+    for width, height in ((16, 16), (30, 16), (50, 50), (100, 100), (300, 300)):
+        mines = width * height // 5
+        results = []
+        for method in ("_place_mines_python", "_place_mines_numpy"):
+            random.seed(0)
+            elapsed = 0.0
+            for _ in range(repeat):
+                game = MinesweeperGame(width, height, mines)
+                start_index = (height // 2) * width + width // 2
+                excluded = sorted([start_index, *game.neighbors[start_index]])
+                start = time.perf_counter()
+                getattr(game, method)(excluded)
+                elapsed += time.perf_counter() - start
+            results.append(elapsed * 1000 / repeat)
+        python_ms, numpy_ms = results
+        print(f"  {width:>3}x{height:<3} Python {python_ms:8.2f} ms  NumPy {numpy_ms:8.2f} ms  "
+              f"({python_ms / numpy_ms:.1f}x)")
+
+
+def _same_game(a, b):
+    fields = ("cells", "revealed_mask", "flagged_mask", "mine_indices", "first_click", "game_over",
+              "won", "lost_mine_location", "revealed_safe_count", "flag_count", "correct_flag_count")
+    return all(getattr(a, f) == getattr(b, f) for f in fields)
+
+
+async def _store_round_trip(kind, directory, games):
+    writer = StoreWriter(create_store(kind, directory), flush_interval=0.05)
+    start = time.perf_counter()
+    for key, game in games.items():
+        writer.mark_dirty(key, game)
+    mark_us = (time.perf_counter() - start) * 1e6 / len(games)
+    start = time.perf_counter()
+    await writer.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+
+    # 模拟崩溃: 不调用 close()，直接用新的 StoreWriter 打开同一存储
+    # 之后的变化只在 flush 前丢失，已写入的快照应完整可读
+    key = next(iter(games))
+    writer.mark_dirty(key, games[key])
+    restarted = StoreWriter(create_store(kind, directory))
+    assert restarted.known_keys == set(games), "重启后会话列表不一致"
+    start = time.perf_counter()
+    for key, game in games.items():
+        assert _same_game(restarted.load_game(key), game), f"{key} 往返后状态不一致"
+    load_us = (time.perf_counter() - start) * 1e6 / len(games)
+    await writer.close()
+    restarted.store.close()
+    return mark_us, flush_ms, load_us
+
+
+def bench_store(sessions=500):
+    """持久化: 快照大小、标记/批量写入/懒加载耗时，并校验往返与崩溃恢复。"""
+    width, height, mines = HARD
+    rng = random.Random(0)
+    games = {}
+    for i in range(sessions):
+        game = MinesweeperGame(width, height, mines)
+        _play_moves(game, rng, rng.randrange(0, 30))
+        games[f"platform:GroupMessage:{i}"] = game
+    size = sum(len(g.to_bytes()) for g in games.values()) / sessions
+    print(f"store ({sessions} 局 {width}x{height}, 快照平均 {size:.0f} 字节)")
+    for kind in ("file", "sqlite"):
+        with tempfile.TemporaryDirectory() as directory:
+            mark_us, flush_ms, load_us = asyncio.run(_store_round_trip(kind, directory, games))
+            print(f"  {kind:<7} 标记 {mark_us:5.2f} us/局  批量写入 {flush_ms:7.1f} ms  懒加载 {load_us:6.1f} us/局")
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_store_corruption(directory, games["platform:GroupMessage:0"]))
+    print("  往返与崩溃恢复校验通过")
+
+
+async def _store_corruption(directory, game):
+    """写入中途崩溃留下的临时文件和损坏的快照都不应影响加载，损坏的快照会被清理。"""
+    store = create_store("file", directory)
+    store.write_batch({"ok": game.to_bytes(), "broken": b"MSW\x01"}, [])
+    with open(store._path("ok") + ".tmp", "wb") as f:
+        f.write(b"partial")
+    writer = StoreWriter(store)
+    assert writer.known_keys == {"ok", "broken"}
+    assert writer.load_game("broken") is None
+    assert _same_game(writer.load_game("ok"), game)
+    await writer.close()
+    assert create_store("file", directory).keys() == {"ok"}
+
+
+async def _session_eviction(directory, count):
+    width, height, mines = HARD
+    rng = random.Random(0)
+    writer = StoreWriter(create_store("file", directory), flush_interval=0.05)
+    manager = SessionManager(writer, idle_ttl=3600, max_sessions=count // 2, memory_budget=0)
+    games = {}
+    i = 0
+    while len(games) < count: # 随机走子常会踩雷结束，补足 count 局未结束的对局
+        game = MinesweeperGame(width, height, mines, seed=i)
+        _play_moves(game, rng, 5)
+        i += 1
+        if game.game_over:
+            continue
+        key = f"session-{i}"
+        games[key] = game
+        manager.add(key, game)
+    assert manager.resident == count // 2, "超过上限的会话应按 LRU 淘汰"
+    assert manager.stats["evicted_lru"] == count - count // 2
+
+    # 被换出的对局无论是否已写入存储都能恢复，且状态不变
+    start = time.perf_counter()
+    for key, game in games.items():
+        assert _same_game(manager.get(key), game), f"{key} 换出后状态不一致"
+    reload_us = (time.perf_counter() - start) * 1e6 / len(games)
+    await writer.flush()
+
+    # 空闲超时
+    manager.idle_ttl = 0
+    start = time.perf_counter()
+    evicted = manager.sweep()
+    sweep_us = (time.perf_counter() - start) * 1e6 / max(evicted, 1)
+    assert manager.resident == 0 and evicted == count // 2
+
+    # 内存预算: 带有缓存帧的会话更大
+    manager.idle_ttl = 3600
+    keys = list(games)[:10]
+    for key in keys:
+        session = manager.session(key)
+        render_board(session.game.get_state(), session.render_cache)
+    per_session = estimate_session_bytes(manager.session(keys[0]))
+    manager.memory_budget = per_session * 4
+    manager.sweep()
+    assert manager.resident <= 4 and manager.stats["evicted_memory"] >= 6
+    assert manager.get(keys[0]) is not None, "按内存淘汰的对局也应能恢复"
+    await manager.close()
+    return reload_us, sweep_us, per_session, manager.stats
+
+
+def bench_sessions(count=400):
+    """会话管理: LRU 上限、空闲超时、内存预算三种淘汰方式，以及换出到存储后的恢复。"""
+    with tempfile.TemporaryDirectory() as directory:
+        reload_us, sweep_us, per_session, stats = asyncio.run(_session_eviction(directory, count))
+    print(f"sessions ({count} 局 {HARD[0]}x{HARD[1]}, 常驻上限 {count // 2})")
+    print(f"  换出后恢复 {reload_us:6.1f} us/局  清理 {sweep_us:5.2f} us/局  "
+          f"带缓存帧的会话约 {per_session / 1024:.0f} KiB")
+    print(f"  统计: {stats}")
+
+
+class FakeEvent:
+    """模拟 AstrMessageEvent 中本基准用到的部分。"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+    def get_session_id(self):
+        return self.session_id
+
+
+async def _measure_loop_lag(stop, lags):
+    """每 5 ms 唤醒一次，记录事件循环被阻塞的额外延迟。"""
+    interval = 0.005
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def _run_sessions(pool, sessions, moves_per_session):
+    rng = random.Random(0)
+    width, height, mines = HARD
+    latencies = []
+
+    async def play(event):
+        game = MinesweeperGame(width, height, mines)
+        cache = RenderCache()
+        for _ in range(moves_per_session):
+            if game.game_over:
+                game = MinesweeperGame(width, height, mines)
+                cache = RenderCache()
+            _play_moves(game, rng, 1)
+            start = time.perf_counter()
+            await pool.render(event.get_session_id(), game, cache)
+            latencies.append(time.perf_counter() - start)
+
+    async def burst(event):
+        # 同一会话快速连续发送多步，应被合并为更少的渲染
+        game = MinesweeperGame(width, height, mines)
+        cache = RenderCache()
+        requests = []
+        for _ in range(5):
+            _play_moves(game, rng, 1)
+            requests.append(pool.render(event.get_session_id(), game, cache))
+        await asyncio.gather(*requests)
+
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(_measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    events = [FakeEvent(f"session-{i}") for i in range(sessions)]
+    await asyncio.gather(*(play(e) for e in events))
+    await asyncio.gather(*(burst(e) for e in events))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    await pool.close()
+    return elapsed, sorted(latencies), max(lags, default=0.0)
+
+
+def bench_pool(sessions=50, moves_per_session=10):
+    """负载测试: 多个并发会话通过渲染池渲染，检查事件循环是否被阻塞。"""
+    pool = RenderPool(max_workers=4, max_queue=16)
+    elapsed, latencies, max_lag = asyncio.run(_run_sessions(pool, sessions, moves_per_session))
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"pool ({sessions} 个会话, 每会话 {moves_per_session} 步 + 5 步连发)")
+    print(f"  总耗时 {elapsed:.2f} s, 单帧延迟 p50 {p50:.1f} ms / p99 {p99:.1f} ms")
+    print(f"  请求 {pool.requested} 次, 实际渲染 {pool.rendered} 帧, 合并 {pool.coalesced} 次")
+    print(f"  事件循环最大阻塞 {max_lag * 1000:.1f} ms")
+
+
+def _check_restored_play_time(age=900.0):
+    """快照往返后的用时应从开局算到最后一步，而不是从加载时算起（否则为负数）。"""
+    width, height, mines = HARD
+    for replayable in (True, False):
+        game = MinesweeperGame(width, height, mines, seed=7)
+        game.replayable = replayable
+        _play_moves(game, random.Random(7), 20)
+        # 模拟 age 秒前开始、30 秒后走完最后一步的对局
+        game.started_at -= age
+        game.first_click_at = game.started_at + 5
+        game.last_move_at = game.started_at + 30
+        twin = MinesweeperGame.from_bytes(game.to_bytes())
+        assert twin.play_seconds == 30, f"快照往返后用时为 {twin.play_seconds:.0f} 秒"
+
+
+def bench_replay(games=300, checked=30):
+    """种子 + 走子记录: 与位图快照的体积、加载耗时对比，并校验每一步的回放及有无 NumPy 时布局一致。"""
+    width, height, mines = HARD
+    rng = random.Random(0)
+    played = []
+    for i in range(games):
+        game = MinesweeperGame(width, height, mines, seed=i)
+        _play_moves(game, rng, rng.randrange(0, 60))
+        played.append(game)
+    legacy = []
+    for game in played:
+        copy = game.copy()
+        copy.replayable = False
+        legacy.append(copy)
+    print(f"replay ({games} 局 {width}x{height})")
+    for name, group in (("位图 (v1)", legacy), ("回放 (v2)", played)):
+        snapshots = [g.to_bytes() for g in group]
+        start = time.perf_counter()
+        for data, game in zip(snapshots, group):
+            assert _same_game(MinesweeperGame.from_bytes(data), game), "快照往返后状态不一致"
+        load_us = (time.perf_counter() - start) * 1e6 / games
+        size = sum(map(len, snapshots)) / games
+        print(f"  {name:<10} 快照平均 {size:6.0f} 字节  加载 {load_us:7.1f} us/局")
+    _check_restored_play_time()
+    print("  快照往返后用时从开局算起")
+
+    # 每一步之后的局面都应能由种子和走子记录的前缀精确重建
+    for i in range(checked):
+        game = MinesweeperGame(width, height, mines, no_guess=i % 2 == 1, seed=1000 + i)
+        states = [game.copy()]
+        while not game.game_over and len(game.move_log) < 200:
+            before = len(game.move_log)
+            _play_moves(game, rng, 1)
+            if len(game.move_log) > before:
+                states.append(game.copy())
+        for count, state in enumerate(states):
+            assert _same_game(game.replay_to(count), state), f"种子 {game.seed} 回放 {count} 步后不一致"
+    print(f"  {checked} 局逐步回放校验通过")
+
+    if game_module._numpy() is not None:
+        saved = game_module.np
+        for width, height in ((40, 40), (100, 100)):
+            layouts = []
+            for np_module in (saved, None):
+                game_module.np = np_module
+                try:
+                    game = MinesweeperGame(width, height, width * height // 5, seed=42)
+                    game.reveal_cell(width // 2, height // 2)
+                finally:
+                    game_module.np = saved
+                layouts.append((game.cells, game.mine_indices))
+            assert layouts[0] == layouts[1], f"{width}x{height} 有无 NumPy 时布局不一致"
+        print("  同一种子在有无 NumPy 时布局一致")
+
+
+def bench_metrics(calls=200_000):
+    """运行统计: 开启与关闭时每次计时的开销，以及直方图百分位数的误差。"""
+    print(f"metrics ({calls} 次计时)")
+    saved = metrics.enabled
+    try:
+        start = time.perf_counter()
+        for _ in range(calls):
+            pass
+        empty = time.perf_counter() - start
+        for flag in (False, True):
+            metrics.enable(flag)
+            metrics.reset()
+            start = time.perf_counter()
+            for _ in range(calls):
+                t = metrics.start()
+                metrics.record("bench", t)
+            per_call_ns = (time.perf_counter() - start - empty) * 1e9 / calls
+            print(f"  {'开启' if flag else '关闭'}  {per_call_ns:6.0f} ns/次")
+        metrics.reset()
+    finally:
+        metrics.enable(saved)
+
+    # 对数分桶的百分位数: 相对误差不超过一个桶宽
+    rng = random.Random(0)
+    samples = sorted(rng.lognormvariate(-6, 1.5) for _ in range(100_000))
+    histogram = metrics.Histogram()
+    for value in samples:
+        histogram.record(value)
+    bucket_width = 2 ** (1 / metrics.BUCKETS_PER_OCTAVE)
+    worst = 0.0
+    for q in (50, 90, 99, 99.9):
+        exact = samples[math.ceil(len(samples) * q / 100) - 1]
+        estimate = histogram.percentile(q)
+        assert exact <= estimate <= exact * bucket_width, f"p{q} 误差过大: {estimate} vs {exact}"
+        worst = max(worst, estimate / exact - 1)
+    print(f"  百分位数最大相对误差 {worst:.1%}（上限 {bucket_width - 1:.1%}），"
+          f"直方图 {len(histogram.counts)} 个桶")
+
+
+REPLAY_TIME_BUDGET = {"gif": 1.0, "webp": 3.0} # 困难棋盘上数百步的一局生成回放的耗时上限（秒）
+REPLAY_MEMORY_BUDGET = 16 * 1024 * 1024 # 生成回放时 Python 分配的峰值内存上限（字节）
+
+
+def _long_game(seed, min_moves=200):
+    """困难棋盘上模仿玩家的一局: 逐个给确定的雷插旗、点开确定安全的格子，没有把握时点开概率最低的格子。"""
+    while True:
+        game = MinesweeperGame(30, 16, 99, seed=seed)
+        game.reveal_cell(15, 8)
+        solver = Solver(game)
+        width = game.width
+        while not game.game_over:
+            analysis = solver.analyze()
+            for i in sorted(analysis.mines):
+                if not game.flagged_mask[i]:
+                    game.flag_cell(i % width, i // width)
+            if analysis.safe:
+                for i in sorted(analysis.safe):
+                    game.reveal_cell(i % width, i // width)
+            else:
+                candidates = [i for i in range(width * game.height)
+                              if not game.revealed_mask[i] and i not in analysis.mines]
+                i = min(candidates, key=analysis.probability)
+                game.reveal_cell(i % width, i // width)
+        if len(game.move_log) >= min_moves:
+            return game
+        seed += 1
+
+
+def _measure_replay(snapshot, fmt):
+    """返回 (回放字节, 耗时秒, Python 分配的峰值字节)。"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = replay_module.render_replay(snapshot, fmt)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return data, elapsed, peak
+
+
+def bench_animation():
+    """回放动画: 困难棋盘上数百步的一局生成 GIF / WebP 的耗时、体积与内存，并校验终局画面和帧数。"""
+    from PIL import Image, ImageSequence
+    game = _long_game(seed=7)
+    moves = len(game.move_log)
+    snapshot = game.to_bytes()
+    final = Image.open(io.BytesIO(render_board(game.get_state()))).convert("RGB")
+    for fmt in replay_module.REPLAY_FORMATS: # 预热: 构建贴图和调色板，加载 Pillow 的编码插件
+        replay_module.render_replay(game.replay_to(10).to_bytes(), fmt)
+    print(f"animation (30x16, {moves} 步, {'胜利' if game.won else '失败'})")
+    for fmt in replay_module.REPLAY_FORMATS:
+        data, elapsed, peak = _measure_replay(snapshot, fmt)
+        # 只回放前四分之一: 峰值内存不应随对局长度增长
+        short = game.replay_to(moves // 4).to_bytes()
+        short_peak = _measure_replay(short, fmt)[2]
+        with Image.open(io.BytesIO(data)) as animation:
+            frames = 0
+            for frame in ImageSequence.Iterator(animation):
+                frames += 1
+            last = frame.convert("RGB")
+        # 调色板量化只影响抗锯齿的文字边缘
+        diff = sum(abs(a - b) for a, b in zip(last.tobytes(), final.tobytes())) / (final.width * final.height * 3)
+        print(f"  {fmt:<5} {len(data) / 1024:7.1f} KiB  {frames} 帧  {elapsed * 1000:7.1f} ms  "
+              f"峰值内存 {peak / 1024 / 1024:.2f} MiB（前 1/4 局 {short_peak / 1024 / 1024:.2f} MiB）")
+        assert last.size == final.size and diff < 1, f"{fmt} 回放的终局画面与棋盘不一致（平均差 {diff:.2f}）"
+        assert frames <= replay_module.MAX_FRAMES, f"{fmt} 回放帧数超过上限"
+        assert elapsed < REPLAY_TIME_BUDGET[fmt], f"{fmt} 回放耗时 {elapsed:.2f} s 超过预算"
+        assert peak < REPLAY_MEMORY_BUDGET, f"{fmt} 回放峰值内存超过预算"
+        # 除输出缓冲区（BytesIO 的扩容与最终拷贝）外，峰值内存不随对局长度增长
+        assert peak - short_peak < 4 * len(data), f"{fmt} 回放内存随对局长度增长"
+
+
+# 在新的解释器中运行，测量插件的导入与首次出图耗时。astrbot 用最小的占位模块代替（只需能完成导入）。
+_STARTUP_SCRIPT = """
+import asyncio, importlib.machinery, importlib.util, json, sys, time, types # asyncio 在 AstrBot 中早已加载，不计入
+
+def stub(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+
+decorator = lambda *args, **kwargs: (lambda obj: obj)
+stub("astrbot")
+stub("astrbot.api", AstrBotConfig=dict, logger=None)
+stub("astrbot.api.event", AstrMessageEvent=object, MessageEventResult=object,
+     filter=types.SimpleNamespace(command=decorator, permission_type=decorator,
+                                  PermissionType=types.SimpleNamespace(ADMIN=None)))
+stub("astrbot.api.star", Context=object, Star=object, register=decorator)
+stub("astrbot.api.message_components")
+spec = importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True)
+spec.submodule_search_locations = [PLUGIN_DIR]
+sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+
+result = {}
+start = time.perf_counter()
+importlib.import_module(PACKAGE + ".main")
+result["import"] = time.perf_counter() - start
+result["renderer_loaded"] = PACKAGE + ".renderer" in sys.modules or "PIL" in sys.modules
+result["numpy_loaded"] = "numpy" in sys.modules
+game_module = sys.modules[PACKAGE + ".game"]
+game = game_module.MinesweeperGame(30, 16, 99)
+game.reveal_cell(15, 8)
+state = game.get_state()
+start = time.perf_counter()
+from minesweeper_plugin.renderer import render_board
+result["renderer_import"] = time.perf_counter() - start
+start = time.perf_counter()
+render_board(state)
+result["first_render"] = time.perf_counter() - start
+start = time.perf_counter()
+render_board(state)
+result["render"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def bench_startup(runs=5):
+    """启动: 新进程中导入插件的耗时（不应加载 Pillow、renderer 和 NumPy），以及首次出图时加载字体和贴图的额外耗时。"""
+    script = f"PACKAGE = {PACKAGE!r}\nPLUGIN_DIR = {PLUGIN_DIR!r}\n" + _STARTUP_SCRIPT
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output))
+    assert not any(r["renderer_loaded"] for r in results), "导入插件时不应加载 renderer 和 Pillow"
+    assert not any(r["numpy_loaded"] for r in results), "导入插件时不应加载 NumPy"
+
+    def median_ms(key):
+        return sorted(r[key] for r in results)[runs // 2] * 1000
+
+    print(f"startup (新进程，{runs} 次取中位数)")
+    print(f"  导入插件            {median_ms('import'):7.1f} ms  (未加载 Pillow / 字体 / NumPy)")
+    print(f"  首次出图时导入渲染  {median_ms('renderer_import'):7.1f} ms")
+    print(f"  首次渲染 (字体+贴图) {median_ms('first_render'):7.1f} ms")
+    print(f"  之后每次渲染        {median_ms('render'):7.1f} ms")
+    eager = median_ms("import") + median_ms("renderer_import") + median_ms("first_render") - median_ms("render")
+    print(f"  对比: 若在导入时加载 renderer、字体和贴图，导入约需 {eager:.1f} ms")
+
+
+def _clicks_to_solve(game):
+    """在已布雷的棋盘上从头逐个点开格子（先点空白格，再点剩下的数字格），返回点击数，用来校验 three_bv()。"""
+    game = game.copy()
+    game.revealed_mask = bytearray(len(game.cells)) # 盖回所有格子，布局不变
+    game.revealed_safe_count = 0
+    clicks = 0
+    for zeros_only in (True, False):
+        for i, value in enumerate(game.cells):
+            if value != MINE and not game.revealed_mask[i] and (value == 0 or not zeros_only):
+                game.reveal_cell(i % game.width, i // game.width)
+                clicks += 1
+    assert game.won
+    return clicks
+
+
+def _brute_force_top(reference, scope, difficulty, metric, limit):
+    """遍历全部汇总求前 limit 名的玩家 ID。"""
+    column, higher = leaderboard_module.METRICS[metric]
+    rows = [(getattr(stats, column), user_id) for (s, user_id, d), stats in reference.items()
+            if s == scope and d == difficulty and getattr(stats, column)]
+    rows.sort(key=lambda row: ((-row[0] if higher else row[0]), row[1]))
+    return [user_id for _, user_id in rows[:limit]]
+
+
+async def _leaderboard_run(path, players, games, groups, difficulties, rng):
+    lb = leaderboard_module
+    board = lb.Leaderboard(lb.StatsStore(path), top_n=10, flush_interval=3600)
+    reference = {} # 独立维护的汇总，用于校验
+    record_time = 0.0
+    flush_times = []
+    flush = None
+    for n in range(games):
+        user_id = f"user{rng.randrange(players)}"
+        scope = f"group{rng.randrange(groups)}"
+        difficulty = rng.choice(difficulties)
+        won = rng.random() < 0.4
+        seconds = rng.uniform(5, 300) if won else None
+        three_bv = rng.randrange(10, 200) if won else 0
+        start = time.perf_counter()
+        board.record((lb.GLOBAL_SCOPE, scope), user_id, user_id, difficulty, won, seconds, three_bv)
+        record_time += time.perf_counter() - start
+        result = lb.PlayerStats(user_id, 1, int(won), seconds, three_bv / seconds if won else None)
+        for key in ((lb.GLOBAL_SCOPE, user_id, difficulty), (scope, user_id, difficulty)):
+            if key in reference:
+                reference[key].merge(result)
+            else:
+                reference[key] = result.copy()
+        if n == games // 2:
+            # 中途建立缓存（此时还有未写入的增量），之后的对局增量更新缓存
+            for cached_scope in (lb.GLOBAL_SCOPE, "group0"):
+                for cached_difficulty in difficulties:
+                    for metric in lb.METRICS:
+                        board.top(cached_scope, cached_difficulty, metric)
+        if flush is not None:
+            # 上一局在写入进行中记录，检验读取时对正在写入的一批的合并
+            await flush
+            flush_times.append(time.perf_counter() - flush_start)
+            flush = None
+        if (n + 1) % 5000 == 0:
+            flush_start = time.perf_counter()
+            flush = asyncio.ensure_future(board.flush())
+            await asyncio.sleep(0)
+    if flush is not None:
+        await flush
+    return board, reference, record_time / games, flush_times
+
+
+def _reads_during_write(board, hold=0.5):
+    """写线程持有写锁和未提交的写事务 hold 秒，期间在本线程读取汇总和冷启动的前 N 名，返回读取耗时。"""
+    lb = leaderboard_module
+    store = board.store
+    started = threading.Event()
+
+    def writer():
+        with store._lock:
+            store._conn.execute("UPDATE stats SET games = games + 1") # 开始写事务
+            started.set()
+            time.sleep(hold)
+            store._conn.rollback()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    started.wait()
+    start = time.perf_counter()
+    board.stats(lb.GLOBAL_SCOPE, "user0", "普通")
+    lb.Leaderboard(store).top(lb.GLOBAL_SCOPE, "困难", lb.METRIC_RATE)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    return elapsed
+
+
+def bench_leaderboard(players=20000, games=50000, groups=50):
+    """排行榜: 记录一局的耗时、批量写入耗时，前 N 名缓存与全表排序的耗时对比，并校验缓存与暴力计算一致。"""
+    lb = leaderboard_module
+    difficulties = ["简单", "普通", "困难"]
+    rng = random.Random(0)
+    for seed in range(20):
+        game = MinesweeperGame(*HARD, seed=seed)
+        game.reveal_cell(0, 0)
+        if not game.game_over:
+            assert game.three_bv() == _clicks_to_solve(game), "3BV 与逐个点开的点击数不一致"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stats.sqlite3")
+        board, reference, record_s, flush_times = asyncio.run(
+            _leaderboard_run(path, players, games, groups, difficulties, rng))
+        print(f"leaderboard ({players} 名玩家，{games} 局，{groups} 个群)")
+        print(f"  记录一局 {record_s * 1e6:6.2f} us  批量写入 {len(flush_times)} 次，"
+              f"平均 {sum(flush_times) / len(flush_times) * 1000:.1f} ms")
+
+        for scope in (lb.GLOBAL_SCOPE, "group0", "group1"):
+            for difficulty in difficulties:
+                for metric in lb.METRICS:
+                    expected = _brute_force_top(reference, scope, difficulty, metric, board.top_n)
+                    assert [u for u, _ in board.top(scope, difficulty, metric)] == expected, \
+                        f"{scope} {difficulty} {metric} 的前 N 名与暴力计算不一致"
+        for key in rng.sample(sorted(reference), 200):
+            stats = board.stats(*key)
+            ref = reference[key]
+            assert (stats.games, stats.wins) == (ref.games, ref.wins) and stats.best_time == ref.best_time, \
+                f"{key} 的汇总不一致"
+        # 全部写入后由新的实例冷启动读取，结果应与缓存相同
+        asyncio.run(board.flush())
+        cold = lb.Leaderboard(board.store)
+        for metric, (column, _) in lb.METRICS.items():
+            rows = [(u, getattr(stats, column)) for u, stats in cold.top(lb.GLOBAL_SCOPE, "普通", metric)]
+            assert rows == [(u, getattr(stats, column)) for u, stats in board.top(lb.GLOBAL_SCOPE, "普通", metric)], \
+                f"{metric} 冷启动读取的前 N 名与缓存不一致"
+            plan = board.store._conn.execute("EXPLAIN QUERY PLAN " + lb.StatsStore.top_query(metric),
+                                             (lb.GLOBAL_SCOPE, "普通", 10)).fetchall()
+            assert all("USING INDEX" in row[-1] and "TEMP B-TREE" not in row[-1] for row in plan), \
+                f"{metric} 前 N 名查询没有使用索引: {plan}"
+
+        repeat = 1000
+        start = time.perf_counter()
+        for _ in range(repeat):
+            board.top(lb.GLOBAL_SCOPE, "普通", lb.METRIC_TIME)
+        cached_us = (time.perf_counter() - start) * 1e6 / repeat
+        start = time.perf_counter()
+        for _ in range(20):
+            board.store.top(lb.GLOBAL_SCOPE, "普通", lb.METRIC_TIME, board.top_n)
+        indexed_us = (time.perf_counter() - start) * 1e6 / 20
+        start = time.perf_counter()
+        rows = board.store._conn.execute(
+            "SELECT user_id, best_time FROM stats WHERE difficulty = ? AND best_time IS NOT NULL", ("普通",)).fetchall()
+        sorted(rows, key=lambda row: row[1])[:board.top_n]
+        scan_us = (time.perf_counter() - start) * 1e6
+        print(f"  /扫雷 rank: 缓存 {cached_us:6.2f} us  索引查询 {indexed_us:7.1f} us  "
+              f"全表扫描排序 {scan_us / 1000:6.1f} ms")
+        print("  前 N 名缓存、汇总与暴力计算一致，查询使用索引")
+        assert cached_us < indexed_us, "前 N 名缓存应快于数据库查询"
+        blocked = _reads_during_write(board)
+        print(f"  写入事务进行中读取 {blocked * 1000:.2f} ms（写事务持续 500 ms）")
+        assert blocked < 0.05, "读取不应等待进行中的批量写入"
+        board.store.close()
+
+
+BENCHMARKS = {
+    "render": bench_render,
+    "encode": bench_encode,
+    "layout": bench_layout,
+    "flood": bench_flood,
+    "chord": bench_chord,
+    "solver": bench_solver,
+    "noguess": bench_noguess,
+    "heatmap": bench_heatmap,
+    "large": bench_large,
+    "placement": bench_placement,
+    "store": bench_store,
+    "replay": bench_replay,
+    "sessions": bench_sessions,
+    "pool": bench_pool,
+    "metrics": bench_metrics,
+    "startup": bench_startup,
+    "animation": bench_animation,
+    "leaderboard": bench_leaderboard,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"未知的基准: {name}。可选: {', '.join(BENCHMARKS)}")
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,150 +1,849 @@
+import functools
 import random
+import struct
+import sys
+import time
+from array import array
+
+np = None # NumPy 模块，由 _numpy() 在第一次用到时导入
+_numpy_loaded = False
+
+# cells 数组中的取值: 0-8 为周围地雷数, MINE 表示地雷
+MINE = 9
+# 棋盘尺寸上限。存储为每格 3 字节，300x300 的棋盘约占 270 KB
+MAX_BOARD_WIDTH = 300
+MAX_BOARD_HEIGHT = 300
+# 不超过此格数的棋盘使用预计算的邻接表，更大的棋盘按需计算相邻下标
+NEIGHBOR_TABLE_MAX_CELLS = 4096
+# 二进制快照格式
+# 版本 1: 头部 + 地雷/已揭开/已插旗三个位图（每格 1 bit）
+# 版本 2: 头部 + 种子 + 走子记录（每步 4 字节），加载时回放走子重建对局
+SNAPSHOT_MAGIC = b"MSW"
+SNAPSHOT_VERSION = 2
+# magic, 版本, 宽, 高, 雷数, 状态位, 踩中地雷的下标 (-1 表示无), 开始时间, 最后走子时间
+_SNAPSHOT_HEADER = struct.Struct("<3sBHHIBidd")
+# 版本 2 在头部之后: 种子, 布雷尝试次数, 走子数
+_SNAPSHOT_REPLAY = struct.Struct("<QHI")
+_STATUS_FIRST_CLICK = 1
+_STATUS_GAME_OVER = 2
+_STATUS_WON = 4
+_STATUS_NO_GUESS = 8
+_STATUS_NO_GUESS_VERIFIED = 16
+_BIT_CHARS = bytes.maketrans(b"\x00\x01", b"01")
+_BIT_VALUES = bytes.maketrans(b"01", b"\x00\x01")
+# 安装了 NumPy 时，不小于此格数的棋盘使用向量化的布雷与计数（小棋盘上 NumPy 的固定开销不划算）
+NUMPY_MIN_CELLS = 1024
+
+
+def _numpy():
+    """返回 NumPy 模块，第一次调用时才导入（约 100 ms，只玩小棋盘时不会加载）。未安装时返回 None。"""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy as np
+        except ImportError: # NumPy 为可选依赖，缺失时使用纯 Python 实现
+            np = None
+    return np
+
+# apply_moves() 使用的走子动作
+MOVE_REVEAL = "click"
+MOVE_FLAG = "flag"
+MOVE_CHORD = "chord"
+# 走子记录中每步编码为 下标 << 2 | 动作
+LOG_REVEAL = 0
+LOG_FLAG = 1
+LOG_CHORD = 2
+SEED_BITS = 64
+
+# 无猜模式: 首次点击时反复布雷，直到求解器能从首次点击处不靠猜测解开整局。
+# 布雷在事件循环中进行，因此限制棋盘大小和耗时；超过尝试次数或时间仍未找到时
+# 使用最后一次的布局（no_guess_verified 为 False）
+NO_GUESS_MAX_CELLS = 1024
+NO_GUESS_MAX_ATTEMPTS = 1000
+NO_GUESS_TIME_LIMIT = 0.5
+CELL_CHARS = (' ', '1', '2', '3', '4', '5', '6', '7', '8', '*')
+
+
+class _RowView:
+    """GridView 的单行只读视图。"""
+    __slots__ = ("_data", "_offset", "_width", "_convert")
+
+    def __init__(self, data, offset, width, convert):
+        self._data = data
+        self._offset = offset
+        self._width = width
+        self._convert = convert
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self._width
+        if not 0 <= x < self._width:
+            raise IndexError("列索引超出范围")
+        return self._convert(self._data[self._offset + x])
+
+    def __len__(self):
+        return self._width
+
+    def __iter__(self):
+        convert = self._convert
+        return (convert(v) for v in self._data[self._offset:self._offset + self._width])
+
+
+class GridView:
+    """以 view[y][x] 的方式只读访问按 y * width + x 排列的扁平数组。"""
+    __slots__ = ("_data", "_width", "_height", "_convert")
+
+    def __init__(self, data, width, height, convert=bool):
+        self._data = data
+        self._width = width
+        self._height = height
+        self._convert = convert
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self._height
+        if not 0 <= y < self._height:
+            raise IndexError("行索引超出范围")
+        return _RowView(self._data, y * self._width, self._width, self._convert)
+
+    def __len__(self):
+        return self._height
+
+    def __iter__(self):
+        return (self[y] for y in range(self._height))
+
+
+class MineSetView:
+    """地雷位置的只读集合视图，支持 (x, y) in view、迭代和 len()。"""
+    __slots__ = ("_cells", "_indices", "_width", "_height")
+
+    def __init__(self, cells, indices, width, height):
+        self._cells = cells
+        self._indices = indices
+        self._width = width
+        self._height = height
+
+    def __contains__(self, location):
+        x, y = location
+        return 0 <= x < self._width and 0 <= y < self._height and self._cells[y * self._width + x] == MINE
+
+    def __iter__(self):
+        width = self._width
+        return ((i % width, i // width) for i in self._indices)
+
+    def __len__(self):
+        return len(self._indices)
+
+
+def pack_bits(mask):
+    """把每格一个字节的 0/1 数组压缩为位图（第 i 格对应第 i // 8 字节的第 i % 8 位）。"""
+    if not mask:
+        return b""
+    bits = bytes(mask).translate(_BIT_CHARS)[::-1]
+    return int(bits, 2).to_bytes((len(mask) + 7) // 8, "little")
+
+
+def unpack_bits(data, count):
+    """pack_bits 的逆操作，返回长度为 count 的 0/1 bytearray。"""
+    if not count:
+        return bytearray()
+    bits = format(int.from_bytes(data, "little"), f"0{count}b")[::-1][:count]
+    return bytearray(bits.encode().translate(_BIT_VALUES))
+
+
+@functools.lru_cache(maxsize=8)
+def neighbor_table(width, height):
+    """
+    返回每个单元格的相邻单元格下标表: table[y * width + x] 为其相邻下标的元组。
+
+    按棋盘尺寸缓存，同尺寸的所有对局共享同一张表。
+    """
+    table = []
+    for y in range(height):
+        for x in range(width):
+            table.append(tuple(
+                ny * width + nx
+                for ny in range(max(y - 1, 0), min(y + 2, height))
+                for nx in range(max(x - 1, 0), min(x + 2, width))
+                if nx != x or ny != y
+            ))
+    return tuple(table)
+
+
+class NeighborLookup:
+    """
+    与 neighbor_table 接口相同，但按需计算相邻下标。
+
+    邻接表每格需要上百字节，大棋盘上改用本类以保持内存占用与格数同阶的常数级。
+    """
+    __slots__ = ("width", "height", "_offsets")
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._offsets = (-width - 1, -width, -width + 1, -1, 1, width - 1, width, width + 1)
+
+    def __getitem__(self, index):
+        width, height = self.width, self.height
+        y, x = divmod(index, width)
+        if 0 < x < width - 1 and 0 < y < height - 1:
+            return tuple(index + d for d in self._offsets)
+        return tuple(
+            ny * width + nx
+            for ny in range(max(y - 1, 0), min(y + 2, height))
+            for nx in range(max(x - 1, 0), min(x + 2, width))
+            if nx != x or ny != y
+        )
+
+    def __len__(self):
+        return self.width * self.height
+
+
+def neighbor_lookup(width, height):
+    """返回适合该棋盘尺寸的相邻下标查询对象（小棋盘为共享邻接表）。"""
+    if width * height <= NEIGHBOR_TABLE_MAX_CELLS:
+        return neighbor_table(width, height)
+    return NeighborLookup(width, height)
+
 
 class MinesweeperGame:
-    def __init__(self, width, height, mines):
-        if not (0 < width <= 30 and 0 < height <= 30): # 添加尺寸限制
-             raise ValueError("棋盘尺寸必须在 1 到 30 之间。")
+    def __init__(self, width, height, mines, no_guess=False, seed=None):
+        if not (0 < width <= MAX_BOARD_WIDTH and 0 < height <= MAX_BOARD_HEIGHT): # 添加尺寸限制
+             raise ValueError(f"棋盘宽度必须在 1 到 {MAX_BOARD_WIDTH} 之间，高度必须在 1 到 {MAX_BOARD_HEIGHT} 之间。")
         if not (0 < mines < width * height):
             raise ValueError("无效的雷数。")
+        if no_guess and width * height > NO_GUESS_MAX_CELLS:
+            raise ValueError(f"无猜模式最多支持 {NO_GUESS_MAX_CELLS} 个格子的棋盘。")
 
         self.width = width
         self.height = height
         self.mines_count = mines
-        self.board = [[' ' for _ in range(width)] for _ in range(height)]
-        self.mine_locations = set()
-        self.revealed = [[False for _ in range(width)] for _ in range(height)]
-        self.flagged = [[False for _ in range(width)] for _ in range(height)]
+        # 紧凑的扁平存储，下标为 y * width + x
+        size = width * height
+        self.cells = bytearray(size) # 周围地雷数，地雷为 MINE
+        self.revealed_mask = bytearray(size) # 1 表示已揭开
+        self.flagged_mask = bytearray(size) # 1 表示已插旗
+        self.mine_indices = array('I') # 地雷所在的下标
+        self.reveal_order = array('I') # 按揭开顺序排列的下标，求解器据此增量更新
+        self.neighbors = neighbor_lookup(width, height)
+        # 每局独立的随机数生成器。未指定种子时从全局 random 取一个，使 random.seed() 仍可复现
+        if seed is None:
+            seed = random.getrandbits(SEED_BITS)
+        self.seed = seed % (1 << SEED_BITS)
+        self.rng = random.Random(self.seed)
+        self.placement_attempts = 0 # 布雷时随机生成的次数（无猜模式下可能多于 1），回放时需要
+        self.move_log = array('I') # 只追加的走子记录，每步编码为 下标 << 2 | 动作，只记录有变化的走子
+        self.replayable = True # 由版本 1 快照恢复的对局没有种子和走子记录，无法回放
         self.first_click = True
         self.game_over = False
         self.won = False
         self.lost_mine_location = None # 记录哪个雷被踩中了
+        self.no_guess = no_guess
+        self.no_guess_verified = False # 无猜模式下是否确认了布局无需猜测
+        self.dirty_cells = set() # 自上次渲染以来外观发生变化的单元格
+        self.revision = 0 # 棋盘版本，每次有变化的走子后加 1，用于缓存与局面对应的结果
+        # 随走子增量维护的计数器，使胜利判定和状态查询为 O(1)
+        self.safe_cells = size - mines # 非雷单元格总数
+        self.revealed_safe_count = 0 # 已揭开的非雷单元格数
+        self.flag_count = 0 # 已插旗数
+        self.correct_flag_count = 0 # 插在地雷上的旗数
+        self.started_at = time.time()
+        self.last_move_at = self.started_at
+        self.first_click_at = None # 首次点开（布雷完成）的时间，用于计算用时；不写入快照
+
+    # --- 兼容旧接口的只读视图 ---
+
+    @property
+    def board(self):
+        """board[y][x] 为 ' '、'1'-'8' 或 '*'。"""
+        return GridView(self.cells, self.width, self.height, CELL_CHARS.__getitem__)
+
+    @property
+    def revealed(self):
+        return GridView(self.revealed_mask, self.width, self.height)
+
+    @property
+    def flagged(self):
+        return GridView(self.flagged_mask, self.width, self.height)
+
+    @property
+    def mine_locations(self):
+        return MineSetView(self.cells, self.mine_indices, self.width, self.height)
 
     def _is_valid(self, x, y):
         return 0 <= x < self.width and 0 <= y < self.height
 
     def _get_neighbors(self, x, y):
-        neighbors = []
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx == 0 and dy == 0:
-                    continue
-                nx, ny = x + dx, y + dy
-                if self._is_valid(nx, ny):
-                    neighbors.append((nx, ny))
-        return neighbors
+        width = self.width
+        return [(j % width, j // width) for j in self.neighbors[y * width + x]]
 
     def _place_mines(self, start_x, start_y):
-        possible_locations = []
-        for r in range(self.height):
-            for c in range(self.width):
-                # 排除首次点击的位置及其直接相邻的位置
-                if abs(r - start_y) > 1 or abs(c - start_x) > 1:
-                     possible_locations.append((c, r))
-
-        if len(possible_locations) < self.mines_count:
+        width = self.width
+        size = width * self.height
+        start = start_y * width + start_x
+        # 排除首次点击的位置及其直接相邻的位置
+        excluded = sorted([start, *self.neighbors[start]])
+        if size - len(excluded) < self.mines_count:
              # 如果棋盘太小无法满足排除规则，则使用备用方案
-             possible_locations = [(c, r) for r in range(self.height) for c in range(self.width) if (c, r) != (start_x, start_y)]
-             if len(possible_locations) < self.mines_count:
+             excluded = [start]
+             if size - 1 < self.mines_count:
                  raise ValueError("无法在给定约束条件下放置地雷。") # 尺寸检查后应该不会发生
 
-        self.mine_locations = set(random.sample(possible_locations, self.mines_count))
+        if self.no_guess:
+            self._place_mines_no_guess(excluded, start_x, start_y)
+        else:
+            self._place_mines_random(excluded)
+            self.placement_attempts = 1
+
+        # 首次点击前插下的旗帜，此时才能确定是否正确
+        flagged = self.flagged_mask
+        self.correct_flag_count = sum(1 for i in self.mine_indices if flagged[i])
 
-        for r in range(self.height):
-            for c in range(self.width):
-                if (c, r) in self.mine_locations:
-                    self.board[r][c] = '*'
-                    continue
-                count = 0
-                for nx, ny in self._get_neighbors(c, r):
-                    if (nx, ny) in self.mine_locations:
-                        count += 1
-                if count > 0:
-                    self.board[r][c] = str(count)
+    def _place_mines_random(self, excluded):
+        if self.width * self.height >= NUMPY_MIN_CELLS and _numpy() is not None:
+            self._place_mines_numpy(excluded)
+        else:
+            self._place_mines_python(excluded)
+
+    def _place_mines_no_guess(self, excluded, start_x, start_y):
+        """反复随机布雷，直到求解器确认可以从首次点击处不靠猜测解开。"""
+        if self.placement_attempts:
+            # 回放: 丢弃之前被拒绝的抽样，使随机数生成器前进到最后一次的位置，无需再求解
+            for _ in range(self.placement_attempts - 1):
+                self._sample_mines(excluded)
+            self._place_mines_random(excluded)
+            return
+        from .solver import is_solvable # 求解器依赖本模块，延迟导入以避免循环导入
+        deadline = time.perf_counter() + NO_GUESS_TIME_LIMIT
+        for attempt in range(1, NO_GUESS_MAX_ATTEMPTS + 1):
+            self.cells[:] = bytes(len(self.cells))
+            self._place_mines_random(excluded)
+            self.placement_attempts = attempt
+            if is_solvable(self, start_x, start_y):
+                self.no_guess_verified = True
+                return
+            if time.perf_counter() > deadline:
+                return
+
+    def _sample_mines(self, excluded):
+        """用本局的随机数生成器抽样地雷位置，返回升序的下标列表。"""
+        size = self.width * self.height
+        # 在 [0, 可选格数) 中不放回抽样，再跳过被排除的下标映射回棋盘，
+        # 无需构造全部候选位置的列表
+        mine_indices = []
+        for i in self.rng.sample(range(size - len(excluded)), self.mines_count):
+            for e in excluded:
+                if i >= e:
+                    i += 1
+            mine_indices.append(i)
+        mine_indices.sort()
+        return mine_indices
+
+    def _place_mines_python(self, excluded):
+        """纯 Python 实现: 抽样布雷并逐个地雷累加相邻计数。"""
+        self._apply_mines_python(self._sample_mines(excluded))
+
+    def _place_mines_numpy(self, excluded):
+        """NumPy 实现: 抽样与纯 Python 实现相同（保证同一种子在有无 NumPy 时布局一致），用 3x3 滑动求和一次算出所有计数。"""
+        self._apply_mines_numpy(np.array(self._sample_mines(excluded), dtype=np.int64))
+
+    def _apply_mines_python(self, mine_indices):
+        """按升序的地雷下标写入 cells 并计算相邻计数。"""
+        self.mine_indices = array('I', mine_indices)
+        cells = self.cells
+        for i in self.mine_indices:
+            cells[i] = MINE
+        neighbors = self.neighbors
+        for i in self.mine_indices:
+            for j in neighbors[i]:
+                if cells[j] != MINE:
+                    cells[j] += 1
+
+    def _apply_mines_numpy(self, chosen):
+        """_apply_mines_python 的 NumPy 版本，chosen 为升序的地雷下标数组。"""
+        width, height = self.width, self.height
+        mines = np.zeros(width * height, dtype=np.uint8)
+        mines[chosen] = 1
+        grid = mines.reshape(height, width)
+        padded = np.pad(grid, 1)
+        counts = sum(
+            padded[dy:dy + height, dx:dx + width]
+            for dy in range(3) for dx in range(3)
+        ) - grid
+        cells = np.where(grid == 1, MINE, counts).astype(np.uint8)
+        self.cells[:] = cells.tobytes()
+        self.mine_indices = array('I', chosen.astype(np.uint32).tobytes())
 
     def reveal_cell(self, x, y):
-        if not self._is_valid(x, y) or self.revealed[y][x] or self.flagged[y][x] or self.game_over:
-            return False # 表示无变化或无效移动
+        """揭开单元格，返回本次外观发生变化的单元格列表（空列表表示无变化）。"""
+        if not self._is_valid(x, y) or self.game_over:
+            return [] # 表示无变化或无效移动
+        width = self.width
+        index = y * width + x
+        if self.revealed_mask[index] or self.flagged_mask[index]:
+            return []
 
         if self.first_click:
             self._place_mines(x, y)
             self.first_click = False
+            self.first_click_at = time.time()
+        self.last_move_at = time.time()
+        self.move_log.append(index << 2 | LOG_REVEAL)
 
-        self.revealed[y][x] = True
+        cells = self.cells
+        revealed = self.revealed_mask
+        revealed[index] = 1
+        self.reveal_order.append(index)
+        changed = [(x, y)]
 
-        if self.board[y][x] == '*':
-            self.game_over = True
-            self.won = False
-            self.lost_mine_location = (x, y)
-            # 揭开所有地雷
-            for mx, my in self.mine_locations:
-                if not self.flagged[my][mx]:
-                    self.revealed[my][mx] = True
-            return True # 表示有变化
-
-        if self.board[y][x] == ' ':
-            # 对空单元格进行填充
-            queue = [(x, y)]
-            visited = set([(x, y)])
-            while queue:
-                curr_x, curr_y = queue.pop(0)
-                for nx, ny in self._get_neighbors(curr_x, curr_y):
-                    if (nx, ny) not in visited and not self.revealed[ny][nx] and not self.flagged[ny][nx]:
-                        self.revealed[ny][nx] = True
-                        visited.add((nx, ny))
-                        if self.board[ny][nx] == ' ':
-                            queue.append((nx, ny))
-
-        self._check_win()
-        return True # 表示有变化
+        if cells[index] == MINE:
+            self._lose(index, changed)
+            self.dirty_cells.update(changed)
+            self.revision += 1
+            return changed
+
+        self.revealed_safe_count += 1
+        if cells[index] == 0:
+            self.revealed_safe_count += self._flood_fill([index], changed)
+
+        changed.extend(self._check_win())
+        self.dirty_cells.update(changed)
+        self.revision += 1
+        return changed
+
+    def chord_cell(self, x, y):
+        """
+        双击（和弦）已揭开的数字格: 周围的旗数等于该数字时，一次揭开周围其余所有未标记的格子。
+
+        所有被揭开的空白格共用一次填充，最后只做一次胜利判定。旗插错时会踩到雷。
+        返回本次外观发生变化的单元格列表（空列表表示条件不满足或无变化）。
+        """
+        if not self._is_valid(x, y) or self.game_over:
+            return []
+        width = self.width
+        index = y * width + x
+        cells = self.cells
+        revealed = self.revealed_mask
+        flagged = self.flagged_mask
+        number = cells[index]
+        if not revealed[index] or number == 0 or number == MINE:
+            return []
+        neighbors = self.neighbors[index]
+        if sum(flagged[j] for j in neighbors) != number:
+            return []
+        targets = [j for j in neighbors if not revealed[j] and not flagged[j]]
+        if not targets:
+            return []
+        self.last_move_at = time.time()
+        self.move_log.append(index << 2 | LOG_CHORD)
+
+        changed = []
+        for j in targets:
+            if cells[j] == MINE:
+                revealed[j] = 1
+                self.reveal_order.append(j)
+                changed.append((j % width, j // width))
+                self._lose(j, changed)
+                self.dirty_cells.update(changed)
+                self.revision += 1
+                return changed
+
+        empty = []
+        self.reveal_order.extend(targets)
+        for j in targets:
+            revealed[j] = 1
+            changed.append((j % width, j // width))
+            if cells[j] == 0:
+                empty.append(j)
+        self.revealed_safe_count += len(targets)
+        if empty:
+            self.revealed_safe_count += self._flood_fill(empty, changed)
+
+        changed.extend(self._check_win())
+        self.dirty_cells.update(changed)
+        self.revision += 1
+        return changed
+
+    def _lose(self, index, changed):
+        """踩中下标为 index 的雷: 结束游戏并揭开所有未标记的地雷，追加到 changed 中。"""
+        width = self.width
+        revealed = self.revealed_mask
+        flagged = self.flagged_mask
+        self.game_over = True
+        self.won = False
+        self.lost_mine_location = (index % width, index // width)
+        # 揭开所有地雷
+        for i in self.mine_indices:
+            if not flagged[i] and not revealed[i]:
+                revealed[i] = 1
+                self.reveal_order.append(i)
+                changed.append((i % width, i // width))
+
+    def _flood_fill(self, starts, changed):
+        """
+        从已揭开的空单元格 starts 开始揭开连通的空白区域及其边界数字，返回新揭开的单元格数。
+
+        revealed_mask 本身充当访问标记，栈的 pop/append 均为 O(1)。
+        填充只会揭开非雷单元格；新揭开的单元格追加到 changed 中。
+        """
+        cells = self.cells
+        revealed = self.revealed_mask
+        flagged = self.flagged_mask
+        neighbors = self.neighbors
+        width = self.width
+        append = changed.append
+        record = self.reveal_order.append
+        opened = 0
+        stack = list(starts)
+        while stack:
+            for j in neighbors[stack.pop()]:
+                if not revealed[j] and not flagged[j]:
+                    revealed[j] = 1
+                    append((j % width, j // width))
+                    record(j)
+                    opened += 1
+                    if cells[j] == 0:
+                        stack.append(j)
+        return opened
 
     def flag_cell(self, x, y):
-        if not self._is_valid(x, y) or self.revealed[y][x] or self.game_over:
-            return False # 表示无变化或无效移动
+        """切换单元格的旗帜标记，返回本次外观发生变化的单元格列表（空列表表示无变化）。"""
+        if not self._is_valid(x, y) or self.game_over:
+            return [] # 表示无变化或无效移动
+        index = y * self.width + x
+        if self.revealed_mask[index]:
+            return []
+
+        self.flagged_mask[index] ^= 1
+        self.last_move_at = time.time()
+        self.move_log.append(index << 2 | LOG_FLAG)
+        delta = 1 if self.flagged_mask[index] else -1
+        self.flag_count += delta
+        if self.cells[index] == MINE:
+            self.correct_flag_count += delta
+        changed = [(x, y)]
+        changed.extend(self._check_win()) # 插旗/取消插旗后检查胜利条件
+        self.dirty_cells.update(changed)
+        self.revision += 1
+        return changed
+
+    def apply_moves(self, moves):
+        """
+        依次执行一批走子，moves 为 (动作, x, y) 序列，动作为 MOVE_REVEAL、MOVE_FLAG 或 MOVE_CHORD。
+        点开已揭开的数字格等同于双击。
 
-        self.flagged[y][x] = not self.flagged[y][x]
-        self._check_win() # 插旗/取消插旗后检查胜利条件
-        return True # 表示有变化
+        执行前先校验整批走子，有无效的坐标或动作时抛出 ValueError 且不执行任何一步；
+        执行过程中游戏结束（踩雷或胜利）即停止，后面的走子被忽略。
+        返回 (变化的单元格列表, 生效的步数, 已执行的步数)，无变化的走子（如点开已揭开的格子）不计入生效步数。
+        """
+        for action, x, y in moves:
+            if action not in (MOVE_REVEAL, MOVE_FLAG, MOVE_CHORD):
+                raise ValueError(f"未知的走子动作: {action}")
+            if not self._is_valid(x, y):
+                raise ValueError(f"无效的坐标 ({x+1}, {y+1})。")
+        changed = []
+        applied = 0
+        processed = 0
+        for action, x, y in moves:
+            if self.game_over:
+                break
+            processed += 1
+            if action == MOVE_FLAG:
+                result = self.flag_cell(x, y)
+            elif action == MOVE_CHORD or self.revealed_mask[y * self.width + x]:
+                result = self.chord_cell(x, y)
+            else:
+                result = self.reveal_cell(x, y)
+            if result:
+                applied += 1
+                changed.extend(result)
+        return changed, applied, processed
+
+    def take_dirty_cells(self):
+        """取出并清空自上次调用以来发生变化的单元格集合（供增量渲染使用）。"""
+        dirty = self.dirty_cells
+        self.dirty_cells = set()
+        return dirty
 
     def _check_win(self):
+        """检查胜利条件（O(1)），返回因胜利而自动标记的单元格列表。"""
         if self.game_over:
-            return
-        revealed_count = 0
-        correctly_flagged_mines = 0
-        for r in range(self.height):
-            for c in range(self.width):
-                if self.revealed[r][c] and (c, r) not in self.mine_locations:
-                    revealed_count += 1
-                if self.flagged[r][c] and (c, r) in self.mine_locations:
-                     correctly_flagged_mines += 1
+            return []
 
         # 胜利条件 1: 所有非雷单元格都已揭开
-        if revealed_count == self.width * self.height - self.mines_count:
+        if self.revealed_safe_count == self.safe_cells:
             self.game_over = True
             self.won = True
             # 自动标记剩余的地雷
-            for mx, my in self.mine_locations:
-                if not self.flagged[my][mx]:
-                    self.flagged[my][mx] = True
+            flagged = self.flagged_mask
+            auto_flagged = []
+            for i in self.mine_indices:
+                if not flagged[i]:
+                    flagged[i] = 1
+                    auto_flagged.append((i % self.width, i // self.width))
+            self.flag_count += len(auto_flagged)
+            self.correct_flag_count += len(auto_flagged)
+            return auto_flagged
 
         # 胜利条件 2: 所有地雷都被正确标记 (可选，但常见)
         # 注意: 如果严格执行，这可能与主要的胜利条件冲突。
         # 坚持标准的“所有非雷单元格都已揭开”条件。
-        # if correctly_flagged_mines == self.mines_count and \
-        #    sum(row.count(True) for row in self.flagged) == self.mines_count:
+        # if self.correct_flag_count == self.mines_count and \
+        #    self.flag_count == self.mines_count:
         #     self.game_over = True
         #     self.won = True
+        return []
+
+    @property
+    def mines_remaining(self):
+        """剩余雷数（总雷数减去已插旗数，可能为负）。"""
+        return self.mines_count - self.flag_count
 
+    @property
+    def cells_remaining(self):
+        """尚未揭开的非雷单元格数。"""
+        return self.safe_cells - self.revealed_safe_count
+
+    @property
+    def play_seconds(self):
+        """从首次点开到最后一步的用时（秒）。由快照恢复的对局没有首次点开的时间，从开局算起。"""
+        start = self.first_click_at if self.first_click_at is not None else self.started_at
+        return self.last_move_at - start
+
+    def three_bv(self):
+        """
+        布局的 3BV: 不插旗解开棋盘最少需要的点击数，即空白区域数加上不与任何空白格相邻的数字格数。
+
+        布雷前返回 0。需要扫描整个棋盘 (O(格子数))，只在对局结束时计算一次。
+        """
+        if self.first_click:
+            return 0
+        cells = self.cells
+        neighbors = self.neighbors
+        opened = bytearray(len(cells)) # 点开某个空白区域时会一起揭开的格子
+        count = 0
+        for i, value in enumerate(cells):
+            if value or opened[i]:
+                continue
+            count += 1 # 新的空白区域
+            opened[i] = 1
+            stack = [i]
+            while stack:
+                for j in neighbors[stack.pop()]:
+                    if not opened[j]:
+                        opened[j] = 1
+                        if not cells[j]:
+                            stack.append(j)
+        # 空白格的相邻格都不是雷，剩下的每个安全格各需一次点击
+        return count + sum(1 for i, value in enumerate(cells) if value != MINE and not opened[i])
 
     def get_state(self):
-        """返回渲染所需的必要状态。"""
+        """
+        返回渲染所需的必要状态。
+
+        board / revealed / flagged / mine_locations 为只读视图，兼容原先的嵌套列表与集合；
+        cells / revealed_mask / flagged_mask 为底层的扁平数组，供渲染器快速访问。
+        """
+        return self._make_state(self.cells, self.revealed_mask, self.flagged_mask, self.mine_indices)
+
+    def snapshot(self):
+        """返回 get_state() 的独立副本，可安全地交给其他线程或进程渲染。"""
+        return self._make_state(bytes(self.cells), bytes(self.revealed_mask),
+                                bytes(self.flagged_mask), array('I', self.mine_indices))
+
+    def _make_state(self, cells, revealed_mask, flagged_mask, mine_indices):
+        width, height = self.width, self.height
         return {
-            "width": self.width,
-            "height": self.height,
-            "board": self.board,
-            "revealed": self.revealed,
-            "flagged": self.flagged,
+            "width": width,
+            "height": height,
+            "board": GridView(cells, width, height, CELL_CHARS.__getitem__),
+            "revealed": GridView(revealed_mask, width, height),
+            "flagged": GridView(flagged_mask, width, height),
             "game_over": self.game_over,
             "won": self.won,
-            "mine_locations": self.mine_locations, # 失败时需要揭开地雷
-            "lost_mine_location": self.lost_mine_location
+            "mine_locations": MineSetView(cells, mine_indices, width, height), # 失败时需要揭开地雷
+            "lost_mine_location": self.lost_mine_location,
+            "cells": cells,
+            "revealed_mask": revealed_mask,
+            "flagged_mask": flagged_mask,
         }
+
+    def copy(self):
+        """返回对局的独立副本（不含待渲染的变化）。"""
+        game = MinesweeperGame(self.width, self.height, self.mines_count, self.no_guess, self.seed)
+        game.rng.setstate(self.rng.getstate())
+        for name in ("cells", "revealed_mask", "flagged_mask", "mine_indices", "reveal_order", "move_log"):
+            setattr(game, name, getattr(self, name)[:])
+        for name in ("first_click", "game_over", "won", "lost_mine_location", "no_guess_verified", "revision",
+                     "revealed_safe_count", "flag_count", "correct_flag_count", "started_at", "last_move_at",
+                     "first_click_at", "placement_attempts", "replayable"):
+            setattr(game, name, getattr(self, name))
+        return game
+
+    # --- 回放 ---
+
+    @classmethod
+    def replay(cls, width, height, mines, seed, moves, no_guess=False, placement_attempts=0):
+        """
+        由种子和走子记录重建对局，moves 为 move_log 形式的编码序列。
+
+        只回放前若干步即可得到对局的任意中间局面。记录损坏或与对局不符时抛出 ValueError。
+        """
+        game = cls(width, height, mines, no_guess=no_guess, seed=seed)
+        game.placement_attempts = placement_attempts
+        game._apply_logged(moves)
+        game.dirty_cells = set()
+        return game
+
+    def _apply_logged(self, moves):
+        """依次执行 move_log 形式的走子。"""
+        width = self.width
+        size = width * self.height
+        actions = (self.reveal_cell, self.flag_cell, self.chord_cell) # 按 LOG_* 排列
+        for code in moves:
+            index, action = code >> 2, code & 3
+            if index >= size or action > LOG_CHORD:
+                raise ValueError("走子记录损坏。")
+            if not actions[action](index % width, index // width):
+                raise ValueError("走子记录与对局不符。")
+
+    def replay_to(self, move_count):
+        """返回本局前 move_count 步之后的局面（新的对局对象，不影响本局）。"""
+        if not self.replayable:
+            raise ValueError("该对局没有走子记录，无法回放。")
+        game = type(self).replay(self.width, self.height, self.mines_count, self.seed,
+                                 self.move_log[:move_count], self.no_guess, self.placement_attempts)
+        game.no_guess_verified = self.no_guess_verified
+        game.started_at = self.started_at
+        return game
+
+    def iter_replay(self, step=1):
+        """
+        逐步回放本局: 先产生开局时的局面，之后每执行 step 步产生一次（最后不足 step 步时也产生）。
+
+        每次产生的是同一个对局对象，其 dirty_cells 为自上次产生以来外观变化的单元格，
+        调用方用 take_dirty_cells() 取走，因此只需重绘这些格子。整个回放只占用一局的内存。
+        """
+        if not self.replayable:
+            raise ValueError("该对局没有走子记录，无法回放。")
+        game = type(self).replay(self.width, self.height, self.mines_count, self.seed, (),
+                                 self.no_guess, self.placement_attempts)
+        game.no_guess_verified = self.no_guess_verified
+        game.started_at = self.started_at
+        yield game
+        moves = self.move_log
+        for start in range(0, len(moves), step):
+            game._apply_logged(moves[start:start + step])
+            yield game
+
+    # --- 二进制快照（持久化） ---
+
+    def to_bytes(self):
+        """
+        把对局序列化为紧凑的二进制快照。
+
+        可回放的对局只保存种子和走子记录（版本 2），加载时回放重建；
+        由旧快照恢复的对局保存地雷、已揭开、已插旗三个位图（版本 1）。
+        """
+        status = ((_STATUS_FIRST_CLICK if self.first_click else 0)
+                  | (_STATUS_GAME_OVER if self.game_over else 0)
+                  | (_STATUS_WON if self.won else 0)
+                  | (_STATUS_NO_GUESS if self.no_guess else 0)
+                  | (_STATUS_NO_GUESS_VERIFIED if self.no_guess_verified else 0))
+        lost_index = -1
+        if self.lost_mine_location is not None:
+            lost_x, lost_y = self.lost_mine_location
+            lost_index = lost_y * self.width + lost_x
+        header = _SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION if self.replayable else 1, self.width, self.height,
+            self.mines_count, status, lost_index, self.started_at, self.last_move_at)
+        if self.replayable:
+            moves = self.move_log
+            if sys.byteorder != "little":
+                moves = moves[:]
+                moves.byteswap()
+            return b"".join((header, _SNAPSHOT_REPLAY.pack(self.seed, self.placement_attempts, len(moves)),
+                             moves.tobytes()))
+        mines = bytearray(self.width * self.height)
+        for i in self.mine_indices:
+            mines[i] = 1
+        return b"".join((header, pack_bits(mines), pack_bits(self.revealed_mask), pack_bits(self.flagged_mask)))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """从 to_bytes() 生成的快照恢复对局。数据损坏或版本不符时抛出 ValueError。"""
+        try:
+            (magic, version, width, height, mines_count, status, lost_index,
+             started_at, last_move_at) = _SNAPSHOT_HEADER.unpack_from(data)
+        except struct.error as e:
+            raise ValueError(f"快照数据不完整: {e}") from e
+        if magic != SNAPSHOT_MAGIC or version not in (1, 2):
+            raise ValueError("无法识别的快照格式。")
+        if version == 1:
+            game = cls._from_bitmaps(data, width, height, mines_count, status, lost_index)
+        else:
+            game = cls._from_move_log(data, width, height, mines_count, status)
+        game.no_guess_verified = bool(status & _STATUS_NO_GUESS_VERIFIED)
+        game.started_at = started_at
+        game.last_move_at = last_move_at
+        game.first_click_at = None # 回放时记下的是加载时间，不是当初首次点开的时间（见 play_seconds）
+        return game
+
+    @classmethod
+    def _from_move_log(cls, data, width, height, mines_count, status):
+        offset = _SNAPSHOT_HEADER.size
+        try:
+            seed, placement_attempts, move_count = _SNAPSHOT_REPLAY.unpack_from(data, offset)
+        except struct.error as e:
+            raise ValueError(f"快照数据不完整: {e}") from e
+        offset += _SNAPSHOT_REPLAY.size
+        moves = array('I')
+        if len(data) != offset + move_count * moves.itemsize:
+            raise ValueError("快照数据长度不正确。")
+        moves.frombytes(data[offset:])
+        if sys.byteorder != "little":
+            moves.byteswap()
+        game = cls.replay(width, height, mines_count, seed, moves,
+                          no_guess=bool(status & _STATUS_NO_GUESS), placement_attempts=placement_attempts)
+        if (game.first_click != bool(status & _STATUS_FIRST_CLICK) or game.game_over != bool(status & _STATUS_GAME_OVER)
+                or game.won != bool(status & _STATUS_WON)):
+            raise ValueError("回放结果与快照记录的状态不符。")
+        return game
+
+    @classmethod
+    def _from_bitmaps(cls, data, width, height, mines_count, status, lost_index):
+        game = cls(width, height, mines_count)
+        game.replayable = False
+        size = width * height
+        bitmap_size = (size + 7) // 8
+        offset = _SNAPSHOT_HEADER.size
+        if len(data) != offset + 3 * bitmap_size:
+            raise ValueError("快照数据长度不正确。")
+        mines = unpack_bits(data[offset:offset + bitmap_size], size)
+        game.revealed_mask[:] = unpack_bits(data[offset + bitmap_size:offset + 2 * bitmap_size], size)
+        game.flagged_mask[:] = unpack_bits(data[offset + 2 * bitmap_size:], size)
+
+        game.first_click = bool(status & _STATUS_FIRST_CLICK)
+        game.game_over = bool(status & _STATUS_GAME_OVER)
+        game.won = bool(status & _STATUS_WON)
+        game.no_guess = bool(status & _STATUS_NO_GUESS)
+        if lost_index >= 0:
+            game.lost_mine_location = (lost_index % width, lost_index // width)
+
+        if not game.first_click:
+            mine_indices = [i for i, is_mine in enumerate(mines) if is_mine]
+            if len(mine_indices) != mines_count:
+                raise ValueError("快照中的地雷数与记录不符。")
+            if size >= NUMPY_MIN_CELLS and _numpy() is not None:
+                game._apply_mines_numpy(np.array(mine_indices, dtype=np.int64))
+            else:
+                game._apply_mines_python(mine_indices)
+
+        # 由位图重建增量计数器
+        cells, revealed, flagged = game.cells, game.revealed_mask, game.flagged_mask
+        game.reveal_order = array('I', (i for i in range(size) if revealed[i]))
+        game.revealed_safe_count = sum(1 for i in range(size) if revealed[i] and cells[i] != MINE)
+        game.flag_count = flagged.count(1)
+        game.correct_flag_count = sum(1 for i in game.mine_indices if flagged[i])
+        return game
@@ -0,0 +1,358 @@
+"""
+排行榜与玩家统计: 每局结束时记录开局玩家的结果，按 (范围, 玩家, 难度) 汇总在 SQLite 中。
+
+- 范围为 GLOBAL_SCOPE（所有会话）和对局所在的会话（例如群聊），每局结果同时计入两者。
+- 记录一局只更新内存中待写入的增量，与 storage.StoreWriter 一样防抖后在线程中批量写入（UPSERT 累加）。
+- /扫雷 rank 由内存中的前 N 名缓存回答: 每个 (范围, 难度, 指标) 第一次查询时按索引读取前 N 行，
+  之后随每局结果增量更新。最佳用时、最佳效率和胜场都只会变好，前 N 名之外的玩家只有在自己的成绩更新时才可能上榜，
+  所以缓存始终等于真实的前 N 名，不需要重新扫描。
+"""
+import asyncio
+import bisect
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+GLOBAL_SCOPE = "*"
+
+METRIC_TIME = "time"
+METRIC_RATE = "rate"
+METRIC_WINS = "wins"
+# 指标 -> (列名, 是否越大越好)
+METRICS = {METRIC_TIME: ("best_time", False), METRIC_RATE: ("best_rate", True), METRIC_WINS: ("wins", True)}
+METRIC_NAMES = {METRIC_TIME: "最佳用时", METRIC_RATE: "最佳效率", METRIC_WINS: "胜场"}
+
+MIN_SECONDS = 1.0 # 用时不足 1 秒按 1 秒计（与经典扫雷的计时器一样从 1 开始）
+
+
+def _better(a, b, higher):
+    """两个成绩中较好的一个，None 表示没有成绩。"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b) if higher else min(a, b)
+
+
+class PlayerStats:
+    """一名玩家在某个范围、某个难度下的汇总。也用来表示尚未写入的增量（games、wins 为增加量）。"""
+    __slots__ = ("name", "games", "wins", "best_time", "best_rate")
+
+    def __init__(self, name: str, games: int = 0, wins: int = 0,
+                 best_time: Optional[float] = None, best_rate: Optional[float] = None):
+        self.name = name
+        self.games = games
+        self.wins = wins
+        self.best_time = best_time # 最快的胜利用时（秒）
+        self.best_rate = best_rate # 最高的 3BV/s
+
+    def copy(self) -> "PlayerStats":
+        return PlayerStats(self.name, self.games, self.wins, self.best_time, self.best_rate)
+
+    def merge(self, other: "PlayerStats"):
+        """累加另一份汇总或增量。昵称取较新的一份。"""
+        self.name = other.name
+        self.games += other.games
+        self.wins += other.wins
+        self.best_time = _better(self.best_time, other.best_time, False)
+        self.best_rate = _better(self.best_rate, other.best_rate, True)
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+
+class StatsStore:
+    """
+    统计数据的 SQLite 存储，每批写入在一个事务中完成。
+
+    写入与读取使用两个连接: 写连接只在写线程中使用（锁只防止与 close() 并发）；
+    读连接在事件循环线程中使用，WAL 模式下读取的是最近一次提交的快照，不等待进行中的写入。
+    meta 表中的批次数与统计在同一个事务中更新，读取时与查询结果出自同一个快照，
+    用来判断正在写入的那一批是否已包含在结果中。
+
+    path 为 None 时使用临时目录中的数据库，关闭时删除。
+    """
+
+    def __init__(self, path: Optional[str]):
+        self._temp_dir = None
+        if path is None:
+            # 内存数据库不能被两个连接共享，用临时文件代替
+            self._temp_dir = tempfile.mkdtemp(prefix="minesweeper-stats-")
+            path = os.path.join(self._temp_dir, "stats.sqlite3")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "scope TEXT NOT NULL, user_id TEXT NOT NULL, difficulty TEXT NOT NULL, name TEXT NOT NULL, "
+                "games INTEGER NOT NULL, wins INTEGER NOT NULL, best_time REAL, best_rate REAL, "
+                "PRIMARY KEY (scope, user_id, difficulty))")
+            # 每个指标一个索引，排序方向与查询一致，前 N 名只需读取索引开头的 N 项
+            self._conn.execute("CREATE INDEX IF NOT EXISTS stats_time ON stats (scope, difficulty, best_time, user_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS stats_rate ON stats (scope, difficulty, best_rate DESC, user_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS stats_wins ON stats (scope, difficulty, wins DESC, user_id)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('committed', 0)")
+        self.committed = self._conn.execute("SELECT value FROM meta WHERE key = 'committed'").fetchone()[0]
+        self._reader = sqlite3.connect(path, isolation_level=None) # 自动提交模式，读事务由 _fetch 显式开始
+
+    def _fetch(self, sql: str, args: tuple):
+        """在一个读事务中执行查询并读取已提交的批次数，两者出自同一个快照。"""
+        reader = self._reader
+        reader.execute("BEGIN")
+        try:
+            rows = reader.execute(sql, args).fetchall()
+            committed = reader.execute("SELECT value FROM meta WHERE key = 'committed'").fetchone()[0]
+        finally:
+            reader.execute("COMMIT")
+        return rows, committed
+
+    @staticmethod
+    def top_query(metric: str) -> str:
+        column, higher = METRICS[metric]
+        order = "DESC" if higher else "ASC"
+        return (f"SELECT user_id, name, games, wins, best_time, best_rate FROM stats "
+                f"WHERE scope = ? AND difficulty = ? AND {column} > 0 ORDER BY {column} {order}, user_id LIMIT ?")
+
+    def top(self, scope: str, difficulty: str, metric: str, limit: int):
+        """按指标排序的前 limit 名，返回 ([(玩家 ID, 汇总)], 已提交的批次数)。"""
+        rows, committed = self._fetch(self.top_query(metric), (scope, difficulty, limit))
+        return [(row[0], PlayerStats(*row[1:])) for row in rows], committed
+
+    def load(self, scope: str, user_id: str, difficulty: Optional[str] = None):
+        """玩家在某个范围内各难度的汇总（按主键前缀查询），返回 ({难度: 汇总}, 已提交的批次数)。"""
+        sql = "SELECT difficulty, name, games, wins, best_time, best_rate FROM stats WHERE scope = ? AND user_id = ?"
+        args = (scope, user_id)
+        if difficulty is not None:
+            sql += " AND difficulty = ?"
+            args += (difficulty,)
+        rows, committed = self._fetch(sql, args)
+        return {row[0]: PlayerStats(*row[1:]) for row in rows}, committed
+
+    def write_batch(self, deltas: Dict[Tuple[str, str, str], PlayerStats]):
+        """累加一批增量。"""
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO stats (scope, user_id, difficulty, name, games, wins, best_time, best_rate) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(scope, user_id, difficulty) DO UPDATE SET "
+                    "name = excluded.name, games = stats.games + excluded.games, wins = stats.wins + excluded.wins, "
+                    "best_time = COALESCE(MIN(stats.best_time, excluded.best_time), stats.best_time, excluded.best_time), "
+                    "best_rate = COALESCE(MAX(stats.best_rate, excluded.best_rate), stats.best_rate, excluded.best_rate)",
+                    (key + (d.name, d.games, d.wins, d.best_time, d.best_rate) for key, d in deltas.items()))
+                self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'committed'")
+            self.committed += 1
+
+    def close(self):
+        self._reader.close()
+        with self._lock:
+            self._conn.close()
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+
+class TopList:
+    """一个 (范围, 难度, 指标) 的前 N 名，按 (成绩, 玩家 ID) 排序，与 StatsStore.top() 的顺序一致。"""
+
+    def __init__(self, metric: str, size: int):
+        self.column, self.higher = METRICS[metric]
+        self.size = size
+        self.order: List[tuple] = [] # 排序键 (成绩, 玩家 ID)，越大越好的指标取负值
+        self.entries: Dict[str, Tuple[tuple, PlayerStats]] = {}
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.entries
+
+    def stats(self, user_id: str) -> PlayerStats:
+        return self.entries[user_id][1]
+
+    def full(self) -> bool:
+        return len(self.order) >= self.size
+
+    def qualifies(self, user_id: str, value) -> bool:
+        """成绩 value 能否进入（或留在）前 N 名。"""
+        if not value:
+            return False
+        return not self.full() or ((-value if self.higher else value), user_id) < self.order[-1]
+
+    def update(self, user_id: str, stats: PlayerStats):
+        """玩家的汇总变化后调用: 插入或移到新的位置，超出 N 名的玩家被挤出。"""
+        value = getattr(stats, self.column)
+        old = self.entries.pop(user_id, None)
+        if old is not None:
+            del self.order[bisect.bisect_left(self.order, old[0])]
+        if not value:
+            return
+        key = ((-value if self.higher else value), user_id)
+        if self.full() and key > self.order[-1]:
+            return
+        bisect.insort(self.order, key)
+        self.entries[user_id] = (key, stats)
+        if len(self.order) > self.size:
+            del self.entries[self.order.pop()[1]]
+
+    def rows(self) -> List[Tuple[str, PlayerStats]]:
+        return [(key[1], self.entries[key[1]][1]) for key in self.order]
+
+
+class Leaderboard:
+    """
+    以防抖、批量的方式把对局结果写入 StatsStore，并维护前 N 名缓存。
+
+    record() 只更新内存（O(范围数 × N)）；第一次记录后经过 flush_interval 秒，
+    把这段时间内的所有增量在线程中一次写入。读取时合并尚未写入和正在写入的增量。
+    """
+
+    def __init__(self, store: StatsStore, top_n: int = 10, flush_interval: float = 5.0):
+        self.store = store
+        self.top_n = top_n
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, str, str], PlayerStats] = {} # (范围, 玩家, 难度) -> 增量
+        self._flushing: Dict[Tuple[str, str, str], PlayerStats] = {} # 正在写入的一批
+        self._flushing_batch = 0 # 正在写入的一批提交后 store.committed 的值
+        self._tops: Dict[Tuple[str, str, str], TopList] = {} # (范围, 难度, 指标) -> 前 N 名
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # 统计
+        self.recorded = 0
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+
+    def record(self, scopes: Iterable[str], user_id: str, name: str, difficulty: str, won: bool,
+               seconds: Optional[float] = None, three_bv: int = 0):
+        """
+        记录一局结果。seconds 为胜利用时（不计入最佳用时时为 None），three_bv 为布局的 3BV（0 表示不计算效率）。
+        """
+        result = PlayerStats(name, 1, int(won))
+        if won and seconds is not None:
+            result.best_time = max(seconds, MIN_SECONDS)
+            if three_bv:
+                result.best_rate = three_bv / result.best_time
+        for scope in scopes:
+            key = (scope, user_id, difficulty)
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = result.copy()
+            else:
+                pending.merge(result)
+            for metric, (column, _) in METRICS.items():
+                top = self._tops.get((scope, difficulty, metric))
+                if top is None:
+                    continue
+                if user_id in top:
+                    stats = top.stats(user_id).copy()
+                    stats.merge(result)
+                    top.update(user_id, stats)
+                elif metric == METRIC_WINS:
+                    # 不在榜上的玩家的总胜场未知，只有这一局赢了时才需要按主键查一次
+                    if won:
+                        top.update(user_id, self.stats(scope, user_id, difficulty))
+                elif top.qualifies(user_id, getattr(result, column)):
+                    # 不在榜上说明原来的成绩不够上榜，只有这一局的成绩可能上榜
+                    top.update(user_id, self.stats(scope, user_id, difficulty))
+        self.recorded += 1
+        self._schedule()
+
+    def _unwritten(self, committed: int) -> List[Dict[Tuple[str, str, str], PlayerStats]]:
+        """查询结果中还不包含的增量批次（按写入顺序）。committed 为查询时已提交的批次数。"""
+        if self._flushing and committed < self._flushing_batch:
+            return [self._flushing, self._pending]
+        return [self._pending]
+
+    def stats(self, scope: str, user_id: str, difficulty: str) -> Optional[PlayerStats]:
+        """玩家在某个范围、某个难度下的汇总（主键查询加上未写入的增量），没有记录时为 None。"""
+        results, committed = self.store.load(scope, user_id, difficulty)
+        stats = results.get(difficulty)
+        key = (scope, user_id, difficulty)
+        for batch in self._unwritten(committed):
+            delta = batch.get(key)
+            if delta is None:
+                continue
+            if stats is None:
+                stats = delta.copy()
+            else:
+                stats.merge(delta)
+        return stats
+
+    def user_stats(self, scope: str, user_id: str) -> Dict[str, PlayerStats]:
+        """玩家在某个范围内各难度的汇总。"""
+        results, committed = self.store.load(scope, user_id)
+        for batch in self._unwritten(committed):
+            for (key_scope, key_user, difficulty), delta in batch.items():
+                if key_scope != scope or key_user != user_id:
+                    continue
+                if difficulty in results:
+                    results[difficulty].merge(delta)
+                else:
+                    results[difficulty] = delta.copy()
+        return results
+
+    def top(self, scope: str, difficulty: str, metric: str) -> List[Tuple[str, PlayerStats]]:
+        """按指标排序的前 N 名 [(玩家 ID, 汇总)]。第一次查询时从数据库读取，之后由缓存回答。"""
+        cache_key = (scope, difficulty, metric)
+        top = self._tops.get(cache_key)
+        if top is None:
+            top = TopList(metric, self.top_n)
+            rows, committed = self.store.top(scope, difficulty, metric, self.top_n)
+            for user_id, stats in rows:
+                top.update(user_id, stats)
+            # 有未写入增量的玩家按合并后的汇总重新排位
+            unwritten = {key[1] for batch in self._unwritten(committed) for key in batch
+                         if key[0] == scope and key[2] == difficulty}
+            for user_id in unwritten:
+                top.update(user_id, self.stats(scope, user_id, difficulty))
+            self._tops[cache_key] = top
+        return top.rows()
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # 写入期间产生的新增量或写入失败的增量，在下一个周期继续写入
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.errors += 1
+
+    async def flush(self):
+        """立即写入所有待保存的增量。"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch = self._pending
+            self._pending = {}
+            self._flushing = batch
+            self._flushing_batch = self.store.committed + 1
+            try:
+                await asyncio.to_thread(self.store.write_batch, batch)
+            except Exception:
+                # 写入失败: 放回队列，与写入期间的新增量合并
+                for key, delta in batch.items():
+                    later = self._pending.get(key)
+                    if later is not None:
+                        delta.merge(later)
+                    self._pending[key] = delta
+                raise
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+            self.written += len(batch)
+
+    async def close(self):
+        """写入剩余的增量并关闭存储。"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        self.store.close()
@@ -0,0 +1,428 @@
+"""
+扫雷插件的无头负载测试。
+
+用最小的 astrbot.api 替身加载 main.py，不需要运行 AstrBot:
+- 在每个难度下让机器人玩若干局，分别统计以下耗时的 p50/p99:
+  引擎走子、render_board（增量重绘，含编码）、PNG 编码、命令处理器的端到端耗时（含渲染池排队）。
+- 在同一个事件循环上模拟 N 个并发会话，以及多名玩家同时在同一块对战棋盘上走子。
+- 结果以 JSON 输出。指定 --baseline 时与上一版本的结果比较，p99 变慢超过容差则以非零状态退出。
+
+用法:
+    python loadtest.py                                  # 结果输出到标准输出
+    python loadtest.py --games 10 --sessions 100 --output result.json
+    python loadtest.py --baseline last_release.json     # 检查性能回退
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import types
+
+import benchmark # 注册插件包
+from benchmark import _measure_loop_lag
+
+
+# --- astrbot.api 替身 ---
+
+COMMANDS = {} # 命令名 -> 处理函数
+
+
+class _Filter:
+    class PermissionType:
+        ADMIN = "admin"
+
+    @staticmethod
+    def command(name):
+        def decorator(func):
+            COMMANDS[name] = func
+            return func
+        return decorator
+
+    @staticmethod
+    def permission_type(permission):
+        return lambda func: func
+
+
+class AstrMessageEvent:
+    """模拟 AstrMessageEvent 中插件用到的部分。结果以 (类型, 内容) 元组返回。"""
+
+    def __init__(self, message_str, session_id, sender_id=None):
+        self.message_str = message_str
+        self.session_id = session_id
+        self.sender_id = sender_id or session_id
+
+    def get_session_id(self):
+        return self.session_id
+
+    def get_sender_id(self):
+        return self.sender_id
+
+    def get_sender_name(self):
+        return self.sender_id
+
+    def plain_result(self, text):
+        return ("plain", text)
+
+    def chain_result(self, chain):
+        return ("chain", chain)
+
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+
+class Plain:
+    def __init__(self, text):
+        self.text = text
+
+
+class Image:
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def fromBytes(cls, data):
+        return cls(data)
+
+
+def _install_astrbot_stub():
+    """在 sys.modules 中注册 main.py 导入的 astrbot.api 模块。"""
+    api = types.ModuleType("astrbot.api")
+    api.AstrBotConfig = dict
+    api.logger = logging.getLogger("astrbot")
+    event = types.ModuleType("astrbot.api.event")
+    event.filter = _Filter
+    event.AstrMessageEvent = AstrMessageEvent
+    event.MessageEventResult = tuple
+    star = types.ModuleType("astrbot.api.star")
+    star.Context = object
+    star.Star = Star
+    star.register = lambda *args, **kwargs: (lambda cls: cls)
+    components = types.ModuleType("astrbot.api.message_components")
+    components.Plain = Plain
+    components.Image = Image
+    api.event, api.star, api.message_components = event, star, components
+    sys.modules.update({
+        "astrbot": types.ModuleType("astrbot"),
+        "astrbot.api": api,
+        "astrbot.api.event": event,
+        "astrbot.api.star": star,
+        "astrbot.api.message_components": components,
+    })
+
+
+_install_astrbot_stub()
+
+from minesweeper_plugin import main as plugin_main
+from minesweeper_plugin.game import MinesweeperGame
+from minesweeper_plugin.renderer import RenderCache, encode_image, render_board
+from minesweeper_plugin.solver import solver_for
+
+
+async def dispatch(plugin, message, session_id, sender_id=None):
+    """按最长匹配的命令名调用处理器，返回它产生的全部结果。"""
+    text = message.lstrip("/")
+    name = max((n for n in COMMANDS if text == n or text.startswith(n + " ")), key=len)
+    event = AstrMessageEvent(message, session_id, sender_id)
+    return [result async for result in COMMANDS[name](plugin, event)]
+
+
+# --- 统计 ---
+
+def summarize(samples):
+    """把以秒为单位的样本汇总为毫秒的 p50/p99/最大值。"""
+    if not samples:
+        return {"n": 0}
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "p50": round(samples[len(samples) // 2] * 1000, 3),
+        "p99": round(samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1000, 3),
+        "max": round(samples[-1] * 1000, 3),
+    }
+
+
+def choose_move(game, rng, bot):
+    """机器人的下一步 (动作, 下标)。solver: 有确定安全的格子时点开，否则随机点开；random: 随机点开或插旗。"""
+    revealed, flagged = game.revealed_mask, game.flagged_mask
+    avoid = ()
+    if bot == "solver" and not game.first_click:
+        solver = solver_for(game)
+        safe = [i for i in solver.safe_cells() if not revealed[i] and not flagged[i]]
+        if safe:
+            return "click", min(safe)
+        avoid = solver.known_mines
+    while True:
+        i = rng.randrange(len(revealed))
+        if revealed[i] or i in avoid:
+            continue
+        if bot == "random" and rng.random() < 0.2:
+            return "flag", i
+        if not flagged[i]:
+            return "click", i
+
+
+def difficulties():
+    """DIFFICULTY_LEVELS 中的各难度（取英文别名作为结果中的键）。"""
+    return {name: config for name, config in plugin_main.DIFFICULTY_LEVELS.items() if name.islower()}
+
+
+# --- 各阶段 ---
+
+def run_components(config, games, max_moves, bot, rng):
+    """直接调用引擎与渲染器，分别统计走子、render_board 和 PNG 编码的耗时。"""
+    engine, render, encode, frame_bytes = [], [], [], []
+    won = 0
+    for _ in range(games):
+        game = MinesweeperGame(config["width"], config["height"], config["mines"], seed=rng.getrandbits(64))
+        viewport = plugin_main.initial_viewport(game)
+        cache = RenderCache()
+        moves = 0
+        while not game.game_over and moves < max_moves:
+            action, i = choose_move(game, rng, bot)
+            x, y = i % game.width, i // game.width
+            start = time.perf_counter()
+            if action == "flag":
+                game.flag_cell(x, y)
+            else:
+                game.reveal_cell(x, y)
+            engine.append(time.perf_counter() - start)
+            moves += 1
+            if viewport is not None:
+                viewport = plugin_main.center_viewport(game, x, y)
+
+            state = game.snapshot()
+            dirty = game.take_dirty_cells()
+            start = time.perf_counter()
+            data = render_board(state, cache, dirty, encoding={"format": "png"}, viewport=viewport)
+            render.append(time.perf_counter() - start)
+            frame_bytes.append(len(data))
+            start = time.perf_counter()
+            encode_image(cache.image, {"format": "png"})
+            encode.append(time.perf_counter() - start)
+        won += game.won
+    return {
+        "games": games,
+        "won": won,
+        "engine_move_ms": summarize(engine),
+        "render_board_ms": summarize(render),
+        "png_encode_ms": summarize(encode),
+        "frame_bytes_avg": round(sum(frame_bytes) / max(len(frame_bytes), 1)),
+    }
+
+
+def count_results(results, counters):
+    """统计处理器回复中的图片帧数、字节数和渲染错误数。"""
+    for kind, content in results:
+        if kind == "chain":
+            counters["frames"] += 1
+            counters["bytes"] += sum(len(c.data) for c in content if isinstance(c, Image))
+        elif content.startswith("抱歉"):
+            counters["errors"] += 1
+
+
+async def play_game(plugin, session_id, difficulty, max_moves, bot, rng, latencies, counters):
+    """通过命令处理器完整地玩一局，记录每步 click/flag 的端到端耗时。"""
+    await dispatch(plugin, f"/扫雷 start {difficulty}", session_id)
+    moves = 0
+    while moves < max_moves:
+        game = plugin_main.sessions.get(session_id)
+        if game is None: # 游戏结束后会话被移除
+            break
+        action, i = choose_move(game, rng, bot)
+        start = time.perf_counter()
+        results = await dispatch(plugin, f"/扫雷 {action} {i % game.width + 1} {i // game.width + 1}", session_id)
+        latencies.append(time.perf_counter() - start)
+        moves += 1
+        count_results(results, counters)
+    if plugin_main.sessions.get(session_id) is not None:
+        await dispatch(plugin, "/扫雷 end", session_id)
+
+
+def _new_plugin(config):
+    return plugin_main.MinesweeperPlugin(None, {"store_type": "none", **config})
+
+
+async def run_handlers(difficulty, games, max_moves, bot, rng, config):
+    plugin = _new_plugin(config)
+    latencies = []
+    counters = {"frames": 0, "bytes": 0, "errors": 0}
+    for g in range(games):
+        await play_game(plugin, f"loadtest:{difficulty}:{g}", difficulty, max_moves, bot, rng, latencies, counters)
+    await plugin.terminate()
+    return {"handler_ms": summarize(latencies), **counters}
+
+
+async def run_concurrent(sessions, difficulty, max_moves, bot, rng, config):
+    """同一事件循环上 sessions 个会话同时各玩一局。"""
+    plugin = _new_plugin(config)
+    latencies = []
+    counters = {"frames": 0, "bytes": 0, "errors": 0}
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(_measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        play_game(plugin, f"loadtest:concurrent:{i}", difficulty, max_moves, bot,
+                  random.Random(rng.getrandbits(64)), latencies, counters)
+        for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    pool = plugin.render_pool
+    result = {
+        "sessions": sessions,
+        "difficulty": difficulty,
+        "moves": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "moves_per_s": round(len(latencies) / elapsed, 1),
+        "handler_ms": summarize(latencies),
+        "max_loop_lag_ms": round(max(lags, default=0.0) * 1000, 3),
+        "render_requested": pool.requested,
+        "render_coalesced": pool.coalesced,
+        **counters,
+    }
+    await plugin.terminate()
+    return result
+
+
+async def run_multiplayer(players, difficulty, max_moves, bot, rng, config):
+    """players 名玩家同时在同一块对战棋盘上走子: 检查计分与棋盘一致，并统计合并掉的帧数。"""
+    plugin = _new_plugin(config)
+    session_id = "loadtest:multiplayer"
+    await dispatch(plugin, f"/扫雷 start {difficulty} 对战", session_id)
+    session = plugin_main.sessions.session(session_id)
+    latencies = []
+    counters = {"frames": 0, "bytes": 0, "errors": 0}
+
+    async def play(player_id, rng):
+        for _ in range(max_moves):
+            game = plugin_main.sessions.get(session_id)
+            if game is None:
+                break
+            action, i = choose_move(game, rng, bot)
+            start = time.perf_counter()
+            results = await dispatch(plugin, f"/扫雷 {action} {i % game.width + 1} {i // game.width + 1}",
+                                     session_id, player_id)
+            latencies.append(time.perf_counter() - start)
+            count_results(results, counters)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(f"player-{p}", random.Random(rng.getrandbits(64))) for p in range(players)))
+    elapsed = time.perf_counter() - start
+    board = session.scoreboard
+    assert sum(p.cells for p in board.players.values()) == session.game.revealed_safe_count, "玩家得分之和与棋盘不符"
+    result = {
+        "players": players,
+        "difficulty": difficulty,
+        "moves": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "handler_ms": summarize(latencies),
+        "frames_per_move": round(counters["frames"] / max(len(latencies), 1), 3),
+        "frames_dropped": plugin.sender.dropped,
+        "throttled": plugin.sender.throttled,
+        **counters,
+    }
+    await plugin.terminate()
+    return result
+
+
+def run(args):
+    random.seed(args.seed) # start 命令用全局随机数生成种子
+    rng = random.Random(args.seed)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": benchmark.game_module._numpy() is not None,
+            "bot": args.bot,
+            "seed": args.seed,
+            "max_moves": args.max_moves,
+            "send_rate": args.send_rate,
+        },
+        "difficulties": {},
+    }
+    config = {"render_workers": args.render_workers, "send_rate": args.send_rate}
+    for name, level in difficulties().items():
+        result = run_components(level, args.games, args.max_moves, args.bot, rng)
+        result.update(asyncio.run(run_handlers(name, args.games, args.max_moves, args.bot, rng, config)))
+        report["difficulties"][name] = result
+        print(f"{name}: 完成 {args.games} 局", file=sys.stderr)
+    if args.sessions > 0:
+        report["concurrent"] = asyncio.run(run_concurrent(
+            args.sessions, args.concurrent_difficulty, args.max_moves, args.bot, rng, config))
+        print(f"并发: 完成 {args.sessions} 个会话", file=sys.stderr)
+    if args.players > 0:
+        report["multiplayer"] = asyncio.run(run_multiplayer(
+            args.players, args.concurrent_difficulty, args.max_moves, args.bot, rng, config))
+        print(f"多人: 完成 {args.players} 名玩家", file=sys.stderr)
+    return report
+
+
+def _p99_metrics(report):
+    """展开报告中所有的 p99 指标: {'hard.render_board_ms': 1.2, ...}。"""
+    metrics = {}
+    sections = dict(report.get("difficulties", {}))
+    for section in ("concurrent", "multiplayer"):
+        if section in report:
+            sections[section] = report[section]
+    for section, values in sections.items():
+        for key, value in values.items():
+            if isinstance(value, dict) and "p99" in value:
+                metrics[f"{section}.{key}"] = value["p99"]
+    return metrics
+
+
+def compare(report, baseline, tolerance, floor_ms):
+    """返回 p99 比基准慢超过 tolerance 倍（且差值超过 floor_ms 毫秒）的指标。"""
+    current = _p99_metrics(report)
+    regressions = []
+    for key, old in _p99_metrics(baseline).items():
+        new = current.get(key)
+        if new is not None and new > old * tolerance and new - old > floor_ms:
+            regressions.append(f"{key}: p99 {old:.2f} ms -> {new:.2f} ms")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="扫雷插件无头负载测试")
+    parser.add_argument("--games", type=int, default=5, help="每个难度的局数")
+    parser.add_argument("--max-moves", type=int, default=60, help="每局最多走的步数")
+    parser.add_argument("--bot", choices=("solver", "random"), default="solver")
+    parser.add_argument("--sessions", type=int, default=50, help="并发会话数，0 表示跳过")
+    parser.add_argument("--players", type=int, default=10, help="同一块多人棋盘上的玩家数，0 表示跳过")
+    parser.add_argument("--concurrent-difficulty", default="hard")
+    parser.add_argument("--render-workers", type=int, default=2)
+    parser.add_argument("--send-rate", type=float, default=0.0,
+                        help="每个会话的发图频率限制（帧/秒），默认 0 不限制，以便测出渲染本身的耗时")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="把 JSON 结果写入文件而不是标准输出")
+    parser.add_argument("--baseline", help="与之比较的上一版本 JSON 结果")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="p99 允许变慢的倍数")
+    parser.add_argument("--floor-ms", type=float, default=1.0, help="小于此差值的变化不视为回退")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.floor_ms)
+        for line in regressions:
+            print(f"性能回退: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,13 +1,25 @@
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
-from astrbot.api import logger
+from astrbot.api import AstrBotConfig, logger
 import astrbot.api.message_components as Comp
 
-from .game import MinesweeperGame
-from .renderer import render_board
+from . import metrics
+from .game import MOVE_CHORD, MOVE_FLAG, MOVE_REVEAL, MinesweeperGame
+from .leaderboard import (GLOBAL_SCOPE, METRIC_NAMES, METRIC_RATE, METRIC_TIME, METRIC_WINS, Leaderboard,
+                          PlayerStats, StatsStore)
+from .multiplayer import MODE_COOP, MODE_VERSUS, Scoreboard
+from .render_common import REPLAY_FORMATS, clamp_viewport, normalize_encoding
+from .render_pool import RenderPool
+from .sender import SendLimiter
+from .sessions import Session, SessionManager
+from .solver import Analysis, analyze
+from .storage import StoreWriter, create_store
+from .text_renderer import DEFAULT_TEXT_STYLE, TEXT_STYLES, render_text
 
+import asyncio
+import os
 import re # 用于解析参数
-from typing import Dict, Optional
+from typing import Optional
 
 # --- 难度设置 ---
 DIFFICULTY_LEVELS = {
@@ -17,22 +29,99 @@ DIFFICULTY_LEVELS = {
     "medium": {"width": 16, "height": 16, "mines": 40},
     "困难": {"width": 30, "height": 16, "mines": 99},
     "hard": {"width": 30, "height": 16, "mines": 99},
+    "马拉松": {"width": 100, "height": 100, "mines": 2000},
+    "marathon": {"width": 100, "height": 100, "mines": 2000},
 }
 DEFAULT_DIFFICULTY = "普通"
+# 在难度后追加这些词开启无猜模式，例如 /扫雷 start 困难 无猜
+NO_GUESS_WORDS = ("无猜", "noguess", "ng")
+# 在难度后追加这些词开启多人模式，例如 /扫雷 start 困难 对战
+MULTIPLAYER_WORDS = {
+    "合作": MODE_COOP, "coop": MODE_COOP,
+    "对战": MODE_VERSUS, "versus": MODE_VERSUS, "vs": MODE_VERSUS,
+}
+
+# --- 视口设置 ---
+# 超过此尺寸的棋盘只渲染一个视口区域，可用 /扫雷 view 移动视口，/扫雷 zoom 查看全局缩略图
+VIEWPORT_WIDTH = 30
+VIEWPORT_HEIGHT = 20
+
+# --- 批量走子 ---
+# 一条消息中最多可包含的走子数，例如 /扫雷 click 3 4; 5 6; f 7 8
+MAX_BATCH_MOVES = 50
+# 单步前缀: 在 click 中用 f 标记，在 flag 中用 c 点开，d 表示双击
+MOVE_PREFIXES = {
+    "c": MOVE_REVEAL, "click": MOVE_REVEAL, "开": MOVE_REVEAL,
+    "f": MOVE_FLAG, "flag": MOVE_FLAG, "旗": MOVE_FLAG,
+    "d": MOVE_CHORD, "chord": MOVE_CHORD, "双": MOVE_CHORD,
+}
+
+# --- 显示方式 ---
+# image: 发送图片；text: 发送文字棋盘；auto: 发送图片，渲染失败或超过 image_timeout 秒时改发文字棋盘
+RENDER_MODE_IMAGE = "image"
+RENDER_MODE_TEXT = "text"
+RENDER_MODE_AUTO = "auto"
+RENDER_MODE_WORDS = {
+    "图片": RENDER_MODE_IMAGE, "image": RENDER_MODE_IMAGE,
+    "文字": RENDER_MODE_TEXT, "text": RENDER_MODE_TEXT,
+    "自动": RENDER_MODE_AUTO, "auto": RENDER_MODE_AUTO,
+}
+RENDER_MODE_NAMES = {RENDER_MODE_IMAGE: "图片", RENDER_MODE_TEXT: "文字", RENDER_MODE_AUTO: "自动"}
+
+# --- 排行榜 ---
+# 单人对局结束时记录开局玩家的战绩；标准难度的胜局计入最佳用时和 3BV/s，自定义棋盘只统计局数和胜场
+CUSTOM_DIFFICULTY = "自定义"
+RANK_METRIC_WORDS = {
+    "用时": METRIC_TIME, "time": METRIC_TIME,
+    "效率": METRIC_RATE, "3bv": METRIC_RATE, "rate": METRIC_RATE,
+    "胜场": METRIC_WINS, "wins": METRIC_WINS,
+}
+RANK_GLOBAL_WORDS = ("全局", "global", "all")
+RANK_SELF_WORDS = ("me", "我")
+
+# --- 运行统计 ---
+# /扫雷 stats 中各耗时直方图的显示名称与顺序
+STAT_LABELS = {
+    "parse": "命令解析",
+    "reveal": "点开",
+    "flag": "插旗",
+    "chord": "双击",
+    "batch": "批量走子",
+    "render": "绘制",
+    "encode": "图片编码",
+    "frame": "出图 (含排队)",
+    "replay": "回放动画",
+}
 
 # --- 游戏状态管理 ---
-# 按会话（例如，每个聊天窗口或用户私聊）存储游戏
-active_games: Dict[str, MinesweeperGame] = {}
+# 按会话（例如，每个聊天窗口或用户私聊）存储游戏，插件加载时按配置创建
+sessions: Optional[SessionManager] = None
 
 # --- 辅助函数 ---
-def get_game(session_id: str) -> Optional[MinesweeperGame]:
-    """获取会话的活动游戏（如果存在）。"""
-    return active_games.get(session_id)
+def initial_viewport(game: MinesweeperGame) -> Optional[tuple[int, int, int, int]]:
+    """棋盘超过视口尺寸时返回左上角的初始视口，否则返回 None（完整显示）。"""
+    if game.width <= VIEWPORT_WIDTH and game.height <= VIEWPORT_HEIGHT:
+        return None
+    return clamp_viewport((0, 0, VIEWPORT_WIDTH, VIEWPORT_HEIGHT), game.width, game.height)
+
+def center_viewport(game: MinesweeperGame, x: int, y: int) -> tuple[int, int, int, int]:
+    """返回以 (x, y) 为中心的视口。"""
+    return clamp_viewport((x - VIEWPORT_WIDTH // 2, y - VIEWPORT_HEIGHT // 2, VIEWPORT_WIDTH, VIEWPORT_HEIGHT),
+                          game.width, game.height)
 
-def end_game(session_id: str):
-    """移除会话的游戏。"""
-    if session_id in active_games:
-        del active_games[session_id]
+def ensure_visible(session: Session, x: int, y: int):
+    """如果 (x, y) 不在当前视口内，则把视口移动到以它为中心。"""
+    viewport = session.viewport
+    if viewport is None:
+        return
+    x0, y0, width, height = viewport
+    if not (x0 <= x < x0 + width and y0 <= y < y0 + height):
+        session.viewport = center_viewport(session.game, x, y)
+
+def _ignore_result(task: asyncio.Task):
+    """取出已放弃等待的任务的异常，避免 "exception was never retrieved" 警告。"""
+    if not task.cancelled():
+        task.exception()
 
 def parse_coords(text: str) -> Optional[tuple[int, int]]:
     """从文本中解析 'x y' 坐标。"""
@@ -44,25 +133,421 @@ def parse_coords(text: str) -> Optional[tuple[int, int]]:
         return x, y
     return None
 
+def parse_moves(text: str, default_action: str) -> Optional[list[tuple[str, int, int]]]:
+    """
+    从文本中解析以分号分隔的一批走子，例如 '3 4; 5 6; f 7 8'。
+    每步可带前缀 c/click/开 或 f/flag/旗，否则使用 default_action。任何一步格式错误时返回 None。
+    """
+    moves = []
+    for part in re.split(r"[;；]", text):
+        if not part.strip():
+            continue
+        match = re.match(r"^\s*(?:([^\d\s]+)\s*)?(\d+)\s+(\d+)\s*$", part)
+        if not match:
+            return None
+        prefix = match.group(1)
+        if prefix is None:
+            action = default_action
+        elif prefix.lower() in MOVE_PREFIXES:
+            action = MOVE_PREFIXES[prefix.lower()]
+        else:
+            return None
+        # 转换为 0-based 索引
+        moves.append((action, int(match.group(2)) - 1, int(match.group(3)) - 1))
+    return moves or None
+
+def format_stats(snapshot: dict, active_games: int, sender: Optional[SendLimiter] = None,
+                 leaderboard: Optional[Leaderboard] = None) -> str:
+    """把 metrics.snapshot() 格式化为 /扫雷 stats 的回复。"""
+    counters = snapshot["counters"]
+    minutes = max(snapshot["elapsed"] / 60, 1e-9)
+    moves = counters.get("moves", 0)
+    frames = counters.get("frames_sent", 0)
+    sent_mb = counters.get("bytes_sent", 0) / (1024 * 1024)
+    hits = counters.get("render_cache_hit", 0)
+    lookups = hits + counters.get("render_cache_miss", 0)
+    lines = [
+        f"扫雷运行统计（最近 {snapshot['elapsed'] / 60:.1f} 分钟）",
+        f"活动对局: {active_games}",
+        f"吞吐: 走子 {moves} 步 ({moves / minutes:.1f} 步/分钟)，发送 {frames} 帧 ({frames / minutes:.1f} 帧/分钟)",
+        f"发送字节: {sent_mb:.2f} MB" + (f"，平均每帧 {counters.get('bytes_sent', 0) / frames / 1024:.1f} KB" if frames else ""),
+        "渲染缓存命中率: " + (f"{hits / lookups:.0%} ({hits}/{lookups})" if lookups else "暂无数据"),
+    ]
+    if sender is not None:
+        lines.append(f"发图: 已发送 {sender.sent} 帧，合并丢弃 {sender.dropped} 帧，限流等待 {sender.throttled} 次")
+    if leaderboard is not None:
+        lines.append(f"战绩: 记录 {leaderboard.recorded} 局，批量写入 {leaderboard.flushes} 次（{leaderboard.written} 行"
+                     + (f"，失败 {leaderboard.errors} 次）" if leaderboard.errors else "）"))
+    if counters.get("text_frames"):
+        lines.append(f"文字棋盘: {counters['text_frames']} 次（其中图片超时或出错改发 {counters.get('text_fallbacks', 0)} 次）")
+    lines.append("耗时 p50 / p99 / 最大 (ms):")
+    histograms = snapshot["histograms"]
+    for name, label in STAT_LABELS.items():
+        h = histograms.get(name)
+        if h:
+            lines.append(f"  {label}: {h['p50'] * 1000:.2f} / {h['p99'] * 1000:.2f} / {h['max'] * 1000:.2f}  ({h['count']} 次)")
+    return "\n".join(lines)
+
+def difficulty_name(key: str) -> str:
+    """难度参数（可以是英文）对应的中文难度名。"""
+    config = DIFFICULTY_LEVELS[key]
+    return next(name for name, details in DIFFICULTY_LEVELS.items() if details == config and not name.islower())
+
+def game_difficulty(game: MinesweeperGame) -> str:
+    """对局在统计中的难度: 标准难度的中文名（无猜模式另计为 "困难·无猜" 等），其他棋盘为自定义。"""
+    for name, details in DIFFICULTY_LEVELS.items():
+        if (not name.islower() and details["width"] == game.width and details["height"] == game.height
+                and details["mines"] == game.mines_count):
+            return name + "·无猜" if game.no_guess else name
+    return CUSTOM_DIFFICULTY
+
+def format_stat_value(metric: str, stats: PlayerStats) -> str:
+    """排行榜中一名玩家的成绩。"""
+    if metric == METRIC_TIME:
+        return f"{stats.best_time:.1f} 秒"
+    if metric == METRIC_RATE:
+        return f"{stats.best_rate:.2f} 3BV/s"
+    return f"{stats.wins} 胜 / {stats.games} 局 ({stats.win_rate:.0%})"
+
+def parse_board_spec(text: str) -> Optional[tuple[int, int, int]]:
+    """从文本中解析自定义棋盘 'WxH 雷数'，例如 '200x200 6000'。"""
+    match = re.match(r"^\s*(\d+)\s*[xX×*]\s*(\d+)\s+(\d+)\s*$", text)
+    if match:
+        return int(match.group(1)), int(match.group(2)), int(match.group(3))
+    return None
+
 # --- AstrBot 插件类 ---
 @register("Minesweeper", "Jason.Joestar","简单的扫雷小游戏", "1.0.0")
 class MinesweeperPlugin(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: Optional[AstrBotConfig] = None):
         super().__init__(context)
+        self.config = config or {}
+        encoding = {
+            "format": self.config.get("output_format", "png"),
+            "compress_level": self.config.get("png_compress_level", 6),
+            "compress_type": self.config.get("png_compress_type", 0),
+            "palette_colors": self.config.get("palette_colors", 32),
+            "webp_lossless": self.config.get("webp_lossless", True),
+            "webp_quality": self.config.get("webp_quality", 80),
+        }
+        try:
+            encoding = normalize_encoding(encoding)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"图片编码配置无效，使用默认编码: {e}")
+            encoding = None
+        self.render_pool = RenderPool(
+            max_workers=self.config.get("render_workers", 2),
+            max_queue=self.config.get("render_queue_size", 64),
+            use_processes=self.config.get("render_use_processes", False),
+            encoding=encoding,
+            font_path=self.config.get("font_path", ""),
+        )
+        self.sender = SendLimiter(
+            rate=self.config.get("send_rate", 1.0),
+            burst=self.config.get("send_burst", 3),
+        )
+        self.render_mode = self.config.get("render_mode", RENDER_MODE_AUTO)
+        if self.render_mode not in RENDER_MODE_NAMES:
+            logger.warning(f"未知的显示方式 {self.render_mode}，使用自动模式")
+            self.render_mode = RENDER_MODE_AUTO
+        self.text_style = self.config.get("text_style", DEFAULT_TEXT_STYLE)
+        if self.text_style not in TEXT_STYLES:
+            logger.warning(f"未知的文字棋盘样式 {self.text_style}，使用 {DEFAULT_TEXT_STYLE}")
+            self.text_style = DEFAULT_TEXT_STYLE
+        self.image_timeout = self.config.get("image_timeout", 3.0)
+        self.replay_format = self.config.get("replay_format", "gif")
+        if self.replay_format not in REPLAY_FORMATS:
+            logger.warning(f"未知的回放格式 {self.replay_format}，使用 gif")
+            self.replay_format = "gif"
+        self.replay_frame_ms = self.config.get("replay_frame_ms", 300)
+        self._replaying = set() # 正在生成回放动画的会话
+        self._init_sessions()
+        self._init_leaderboard()
+        metrics.enable(self.config.get("metrics_enabled", True))
         logger.info(f"扫雷插件已加载！")
 
-    async def _send_board(self, event: AstrMessageEvent, game: MinesweeperGame, message: str = ""):
-        """渲染并发送当前棋盘状态。"""
+    def _init_sessions(self):
+        """按配置创建对局存储和会话管理器。存储不可用时记录错误并以不持久化的方式继续运行。"""
+        global sessions
+        store_writer = None
         try:
-            image_bytes = render_board(game.get_state())
-            chain = []
-            if message:
-                chain.append(Comp.Plain(message)) # 添加换行符以增加间距
-            chain.append(Comp.Image.fromBytes(image_bytes))
-            yield event.chain_result(chain)
+            store = create_store(self.config.get("store_type", "file"),
+                                 self.config.get("store_path", "data/plugin_data/minesweeper"))
+            if store is not None:
+                store_writer = StoreWriter(store, self.config.get("store_flush_interval", 2.0))
+                logger.info(f"扫雷: 存储中有 {len(store_writer.known_keys)} 局未完成的游戏")
+        except Exception as e:
+            logger.error(f"初始化扫雷对局存储失败，将不保存对局: {e}", exc_info=True)
+            store_writer = None
+        sessions = SessionManager(
+            store_writer,
+            idle_ttl=self.config.get("session_idle_ttl", 3600),
+            max_sessions=self.config.get("session_max_games", 1000),
+            memory_budget=int(self.config.get("session_memory_budget_mb", 256) * 1024 * 1024),
+            spill_to_disk=self.config.get("session_spill_to_disk", True),
+            sweep_interval=self.config.get("session_sweep_interval", 60),
+            viewport_factory=initial_viewport,
+        )
+
+    def _init_leaderboard(self):
+        """按配置创建排行榜。统计数据库不可用时记录错误并关闭排行榜。"""
+        self.leaderboard: Optional[Leaderboard] = None
+        if not self.config.get("leaderboard_enabled", True):
+            return
+        try:
+            if self.config.get("store_type", "file") == "none":
+                path = None # 不保存对局时战绩写入临时文件，插件卸载时删除
+            else:
+                path = os.path.join(self.config.get("store_path", "data/plugin_data/minesweeper"), "stats.sqlite3")
+            store = StatsStore(path)
+            self.leaderboard = Leaderboard(store, top_n=self.config.get("leaderboard_size", 10),
+                                           flush_interval=self.config.get("leaderboard_flush_interval", 5.0))
+        except Exception as e:
+            logger.error(f"初始化扫雷统计数据库失败，将不记录战绩: {e}", exc_info=True)
+
+    async def terminate(self):
+        """插件卸载时关闭渲染池，并写入尚未保存的对局和战绩。"""
+        global sessions
+        await self.render_pool.close()
+        if sessions is not None:
+            await sessions.close()
+            sessions = None
+        if self.leaderboard is not None:
+            await self.leaderboard.close()
+            self.leaderboard = None
+
+    async def _send_board(self, event: AstrMessageEvent, session: Session, message: str = ""):
+        """
+        渲染并发送当前棋盘状态。
+
+        文字模式直接回复文字棋盘（只包含变化的行）。图片模式下:
+        该会话已有一帧正在渲染、发送或等待限流时（例如多人同时走子、刷屏），本步只回复文字，
+        正在出图的一方发完当前帧后再发一帧最新的棋盘，把这段时间内的所有走子合并为一张图。
+        发图频率超过限制时先回复文字，等到允许发送时再发最新的棋盘。
+        自动模式下图片渲染失败或超时时改发文字棋盘。
+        """
+        mode = session.render_mode or self.render_mode
+        if mode == RENDER_MODE_TEXT:
+            # 图片缓存不再跟随走子更新，丢弃待渲染的变化，切回图片时完整重绘
+            session.game.take_dirty_cells()
+            session.render_cache.invalidate()
+            yield event.plain_result(self._text_board(session, message))
+            return
+
+        session_id = event.get_session_id()
+        cache = session.render_cache
+        sender = self.sender
+        if session.rendering:
+            session.frame_stale = True
+            sender.dropped += 1
+            yield event.plain_result((message + "\n" if message else "") + "（棋盘将在下一张图中更新）")
+            return
+        session.rendering = True
+        timeout = self.image_timeout if mode == RENDER_MODE_AUTO else None
+        try:
+            first = True
+            while True:
+                delay = sender.delay(session)
+                if delay > 0:
+                    sender.throttled += 1
+                    if first:
+                        yield event.plain_result((message + "\n" if message else "") + "（操作过于频繁，稍后发送最新的棋盘）")
+                        message = ""
+                    await asyncio.sleep(delay)
+                first = False
+                session.frame_stale = False
+                start = metrics.start()
+                image_bytes = await self._render_image(session_id, session, timeout)
+                if image_bytes is None:
+                    # 图片渲染超时: 先发文字棋盘，渲染完成后仍会更新缓存
+                    metrics.count("text_fallbacks")
+                    yield event.plain_result(self._text_board(session, message))
+                else:
+                    metrics.record("frame", start)
+                    metrics.count("frames_sent")
+                    metrics.count("bytes_sent", len(image_bytes))
+                    sender.consume(session)
+                    session.text_cache.invalidate() # 下一次文字棋盘相对图片发送完整棋盘
+                    chain = []
+                    if message:
+                        chain.append(Comp.Plain(message)) # 添加换行符以增加间距
+                    chain.append(Comp.Image.fromBytes(image_bytes))
+                    yield event.chain_result(chain)
+                if not session.frame_stale:
+                    break
+                message = ""
         except Exception as e:
             logger.error(f"渲染或发送棋盘时出错: {e}", exc_info=True)
-            yield event.plain_result(f"抱歉，渲染扫雷棋盘时出错: {e}")
+            cache.invalidate() # 缓存的帧可能已不完整
+            if timeout is not None:
+                metrics.count("text_fallbacks")
+                yield event.plain_result(self._text_board(session, message, "图片渲染出错，改用文字显示。"))
+            else:
+                yield event.plain_result(f"抱歉，渲染扫雷棋盘时出错: {e}")
+        finally:
+            session.rendering = False
+
+    async def _render_image(self, session_id: str, session: Session, timeout: Optional[float]) -> Optional[bytes]:
+        """在渲染池中渲染棋盘图片。给出 timeout 且超时时返回 None，渲染继续在后台完成。"""
+        # 在渲染池中渲染，避免阻塞事件循环；同一会话的积压请求会合并为一帧
+        render = self.render_pool.render(session_id, session.game, session.render_cache, session.viewport)
+        if timeout is None:
+            return await render
+        task = asyncio.ensure_future(render)
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if not done:
+            # 不取消渲染: 取消排队中的请求会影响合并到同一帧的其他等待者
+            task.add_done_callback(_ignore_result)
+            return None
+        return task.result()
+
+    def _text_board(self, session: Session, message: str = "", note: str = "") -> str:
+        """生成文字棋盘回复。游戏结束时发送完整棋盘，否则尽量只发送变化的行。"""
+        game = session.game
+        board = render_text(game.get_state(), session.text_cache, session.viewport, self.text_style,
+                            full=game.game_over)
+        metrics.count("text_frames")
+        return "\n".join(part for part in (message, note, board) if part)
+
+    def _score_message(self, event: AstrMessageEvent, session: Session, revealed_before: int, moves: int = 1) -> str:
+        """
+        多人模式下为走子的玩家计分，返回得分提示（游戏结束时附上排名）。单人游戏返回空字符串；
+        单人游戏中有开局玩家以外的人走子时，本局不再计入个人战绩。
+        """
+        board = session.scoreboard
+        player_id = str(event.get_sender_id())
+        if board is None:
+            if session.player is not None and session.player[0] != player_id:
+                session.player = None
+            return ""
+        game = session.game
+        cells = game.revealed_safe_count - revealed_before
+        hit_mine = game.game_over and not game.won
+        player = board.record(player_id, event.get_sender_name() or player_id, cells, hit_mine, moves)
+        lines = [board.move_message(player, cells, hit_mine)]
+        if game.game_over:
+            lines.append(board.summary(final=True))
+        return "\n".join(line for line in lines if line)
+
+    async def _play_batch(self, event: AstrMessageEvent, session: Session, args_text: str, default_action: str):
+        """执行一条消息中的一批走子，全部执行完后只渲染并发送一帧。"""
+        session_id = event.get_session_id()
+        game = session.game
+        start = metrics.start()
+        moves = parse_moves(args_text, default_action)
+        metrics.record("parse", start)
+        if not moves:
+            yield event.plain_result("无效的批量走子格式。请使用：/扫雷 click [列] [行]; [列] [行]; f [列] [行] (f 表示标记，c 表示点开)")
+            return
+        if len(moves) > MAX_BATCH_MOVES:
+            yield event.plain_result(f"一次最多执行 {MAX_BATCH_MOVES} 步，本批共 {len(moves)} 步。")
+            return
+
+        try:
+            # 整批走子在一次同步调用中完成，不会与其他玩家的走子交错（见 Session）
+            revealed_before = game.revealed_safe_count
+            start = metrics.start()
+            changed, applied, processed = game.apply_moves(moves)
+            metrics.record("batch", start)
+            score = self._score_message(event, session, revealed_before, applied) if applied else ""
+        except ValueError as e:
+            yield event.plain_result(f"{e} 坐标范围应在 1-{game.width} 列, 1-{game.height} 行之间。本批走子均未执行。")
+            return
+
+        if not applied:
+            yield event.plain_result("这批走子都没有改变棋盘（格子已点开或已标记）。")
+            return
+        logger.info(f"会话 {session_id}: 批量走子 {applied}/{len(moves)} 步生效")
+        metrics.count("moves", applied)
+        _, x, y = moves[processed - 1]
+        ensure_visible(session, x, y)
+        sessions.save(session_id, game)
+        if game.game_over:
+            self._finish_game(session_id, session)
+
+        message = f"执行了 {applied}/{len(moves)} 步。"
+        if processed > applied:
+            message += f"\n{processed - applied} 步无效已跳过（格子已点开或已标记）。"
+        if game.game_over:
+            if game.won:
+                message += "\n恭喜你，你赢了！ 🎉"
+                logger.info(f"会话 {session_id}: 游戏胜利")
+            else:
+                lost_x, lost_y = game.lost_mine_location
+                message += f"\n嘣！你在 ({lost_x+1}, {lost_y+1}) 踩到雷了！游戏结束。💥"
+                logger.info(f"会话 {session_id}: 游戏失败")
+            if processed < len(moves):
+                message += f"\n剩余 {len(moves) - processed} 步未执行。"
+        if score:
+            message += "\n" + score
+
+        async for result in self._send_board(event, session, message):
+            yield result
+
+    def _finish_game(self, session_id: str, session: Session):
+        """
+        走子使对局分出胜负时立即调用（在发送最后一帧之前）: 记录开局玩家的战绩（只更新内存，批量写入），
+        然后移除游戏。发送棋盘会让出事件循环，这期间会话可能被淘汰或清理，所以不能等到发送之后；
+        发送最后一帧仍使用 session 自身的视口和渲染缓存。
+
+        只有 session 仍是该会话当前的游戏时才处理，所以每局只记录一次，也不会影响之后开始的新一局。
+        """
+        if not sessions.is_current(session_id, session):
+            return
+        game = session.game
+        if self.leaderboard is not None and session.player is not None:
+            player_id, name = session.player
+            session.player = None
+            difficulty = game_difficulty(game)
+            ranked = game.won and difficulty != CUSTOM_DIFFICULTY
+            self.leaderboard.record((GLOBAL_SCOPE, session_id), player_id, name, difficulty, game.won,
+                                    seconds=game.play_seconds if ranked else None,
+                                    three_bv=game.three_bv() if ranked else 0)
+        sessions.end(session_id, session)
+
+    def _outcome_message(self, session_id: str, game: MinesweeperGame) -> str:
+        """点开格子后的胜负提示，游戏未结束时为空。"""
+        if not game.game_over:
+            return ""
+        if game.won:
+            logger.info(f"会话 {session_id}: 游戏胜利")
+            return "恭喜你，你赢了！ 🎉"
+        logger.info(f"会话 {session_id}: 游戏失败")
+        return "嘣！你踩到雷了！游戏结束。💥"
+
+    async def _play_chord(self, event: AstrMessageEvent, session: Session, x: int, y: int):
+        """双击已揭开的数字格，一次揭开其周围其余未标记的格子。"""
+        session_id = event.get_session_id()
+        game = session.game
+        number = game.board[y][x]
+        if not game.revealed[y][x] or not number.isdigit():
+            yield event.plain_result(f"格子 ({x+1}, {y+1}) 不是已点开的数字格，无法双击。")
+            return
+        flags = sum(game.flagged[ny][nx] for nx, ny in game._get_neighbors(x, y))
+        if flags != int(number):
+            yield event.plain_result(f"格子 ({x+1}, {y+1}) 周围有 {flags} 面旗，与数字 {number} 不符，无法双击。")
+            return
+
+        logger.info(f"会话 {session_id}: 双击单元格 ({x+1}, {y+1})")
+        ensure_visible(session, x, y)
+        # 从上面的校验到这里没有 await，校验结果在走子时仍然成立（见 Session）
+        revealed_before = game.revealed_safe_count
+        start = metrics.start()
+        changed = game.chord_cell(x, y)
+        metrics.record("chord", start)
+        score = self._score_message(event, session, revealed_before) if changed else ""
+
+        if not changed:
+            yield event.plain_result(f"格子 ({x+1}, {y+1}) 周围没有可以点开的格子。")
+            return
+        metrics.count("moves")
+        sessions.save(session_id, game)
+        if game.game_over:
+            self._finish_game(session_id, session)
+
+        message = "\n".join(m for m in (self._outcome_message(session_id, game), score) if m)
+        async for result in self._send_board(event, session, message):
+            yield result
 
     @filter.command("扫雷")
     async def minesweeper_command_group(self, event: AstrMessageEvent):
@@ -74,12 +559,26 @@ class MinesweeperPlugin(Star):
         """显示扫雷插件的帮助信息。"""
         help_text = """
         扫雷游戏指令组
-        可用子命令: start, click, flag, end, help
+        可用子命令: start, click, flag, chord, hint, score, rank, mode, view, zoom, replay, end, stats, help
         示例:
-        /扫雷 start [难度]  (开始一个新游戏，难度可选：简单/普通/困难，默认为普通)
+        /扫雷 start [难度]  (开始一个新游戏，难度可选：简单/普通/困难/马拉松，默认为普通)
+        /扫雷 start [宽]x[高] [雷数] (开始自定义棋盘，例如 /扫雷 start 200x200 6000)
+        /扫雷 start [难度] 无猜 (无猜模式: 保证从第一步开始不需要靠猜测就能解开)
+        /扫雷 start [难度] 合作|对战 (多人模式: 群内所有人共用一块棋盘，合作解开或比拼得分)
         /扫雷 click [列] [行] (点开指定格子，坐标从1开始)
         /扫雷 flag [列] [行]  (标记/取消标记指定格子，坐标从1开始)
+        /扫雷 chord [列] [行] (双击已点开的数字格: 周围旗数等于数字时点开其余相邻格子；click 已点开的数字格效果相同)
+        /扫雷 click 3 4; 5 6; f 7 8 (一次执行多步，f 表示标记，c 表示点开，d 表示双击；踩雷即停止，只发送一张图)
+        /扫雷 hint            (提示: 给出一个确定安全的格子，或踩雷概率最低的格子，并附上踩雷概率热力图)
+        /扫雷 score           (多人模式: 查看当前排名)
+        /扫雷 rank [难度] [用时|效率|胜场] [全局] (排行榜: 单人对局的最佳用时、3BV/s 或胜场，默认为本会话的普通难度用时榜)
+        /扫雷 rank me [全局]  (查看自己各难度的局数、胜率和最佳成绩)
+        /扫雷 mode [图片|文字|自动] (切换棋盘的显示方式: 图片、文字棋盘，或图片较慢/出错时自动改用文字)
+        /扫雷 view [列] [行]  (大棋盘: 把显示区域移动到以该格为中心)
+        /扫雷 zoom            (大棋盘: 查看整个棋盘的缩略图)
+        /扫雷 replay [gif|webp] (生成上一局的回放动画；没有结束的对局时回放当前对局)
         /扫雷 end             (结束当前游戏)
+        /扫雷 stats [reset]   (管理员: 查看或重置运行统计)
         /扫雷 help            (显示此帮助信息)
         """
         yield event.plain_result(help_text.strip())
@@ -88,46 +587,76 @@ class MinesweeperPlugin(Star):
     async def start_game(self, event: AstrMessageEvent):
         """
         开始一个新的扫雷游戏。
-        用法: /扫雷 start [难度]
-        难度可选: 简单 (easy), 普通 (medium), 困难 (hard)
+        用法: /扫雷 start [难度] [无猜] [合作|对战] 或 /扫雷 start [宽]x[高] [雷数] [无猜] [合作|对战]
+        难度可选: 简单 (easy), 普通 (medium), 困难 (hard), 马拉松 (marathon)
         如果未指定难度，默认为 普通。
-        示例: /扫雷 start 困难
+        示例: /扫雷 start 困难, /扫雷 start 困难 无猜, /扫雷 start 普通 对战, /扫雷 start 200x200 6000
         """
         session_id = event.get_session_id()
         args_text = event.message_str.split("start", 1)[-1].strip()
+        no_guess = False
+        mode = None
+        words = args_text.split()
+        while words and (words[-1].lower() in NO_GUESS_WORDS or words[-1].lower() in MULTIPLAYER_WORDS):
+            word = words.pop().lower()
+            if word in NO_GUESS_WORDS:
+                no_guess = True
+            else:
+                mode = MULTIPLAYER_WORDS[word]
+        args_text = " ".join(words)
 
         difficulty_key = DEFAULT_DIFFICULTY
+        custom_spec = None
         if args_text:
             lookup_key = args_text.lower()
             if lookup_key in DIFFICULTY_LEVELS:
                 difficulty_key = lookup_key
+            elif parse_board_spec(args_text):
+                custom_spec = parse_board_spec(args_text)
             else:
                 valid_options = ", ".join(k for k in DIFFICULTY_LEVELS.keys() if not k.islower())
-                yield event.plain_result(f"无效的难度 '{args_text}'。可用难度: {valid_options}")
+                yield event.plain_result(f"无效的难度 '{args_text}'。可用难度: {valid_options}，或自定义棋盘 [宽]x[高] [雷数]")
                 return
 
-        if get_game(session_id):
+        if sessions.get(session_id):
             yield event.plain_result("你已经有一个正在进行的游戏了。请先使用 /扫雷 end 结束它。")
             return
 
         try:
-            config = DIFFICULTY_LEVELS[difficulty_key]
-            width = config["width"]
-            height = config["height"]
-            mines = config["mines"]
-
-            chosen_difficulty_name = difficulty_key
-            if difficulty_key.islower():
+            if custom_spec:
+                width, height, mines = custom_spec
+                chosen_difficulty_name = "自定义"
+            else:
+                config = DIFFICULTY_LEVELS[difficulty_key]
+                width = config["width"]
+                height = config["height"]
+                mines = config["mines"]
+                chosen_difficulty_name = difficulty_key
+            if not custom_spec and difficulty_key.islower():
                  for name, details in DIFFICULTY_LEVELS.items():
                       if details == config and not name.islower():
                            chosen_difficulty_name = name
                            break
 
-            game = MinesweeperGame(width, height, mines)
-            active_games[session_id] = game
-            logger.info(f"为会话 {session_id} 启动了新的扫雷游戏 (难度: {chosen_difficulty_name}, {width}x{height}, {mines} 个雷)")
+            game = MinesweeperGame(width, height, mines, no_guess=no_guess)
+            if no_guess:
+                chosen_difficulty_name += "·无猜"
+            session = sessions.add(session_id, game)
+            if mode is not None:
+                session.scoreboard = Scoreboard(mode)
+                chosen_difficulty_name += f"·{session.scoreboard.mode_name}"
+            else:
+                player_id = str(event.get_sender_id())
+                session.player = (player_id, event.get_sender_name() or player_id)
+            logger.info(f"为会话 {session_id} 启动了新的扫雷游戏 (难度: {chosen_difficulty_name}, {width}x{height}, {mines} 个雷, 种子 {game.seed})")
             start_message = f"游戏开始！难度：{chosen_difficulty_name} ({width}x{height}, {mines} 个雷)。\n请使用 /扫雷 click x y 来点开格子 (坐标从1开始)。"
-            async for result in self._send_board(event, game, start_message):
+            if session.viewport:
+                start_message += "\n棋盘较大，只显示部分区域。可用 /扫雷 view x y 移动视图，/扫雷 zoom 查看全局。"
+            if mode == MODE_VERSUS:
+                start_message += "\n对战模式：所有人共用这块棋盘，点开一个安全格得 1 分，踩雷扣分并结束本局。/扫雷 score 查看排名。"
+            elif mode == MODE_COOP:
+                start_message += "\n合作模式：所有人共用这块棋盘一起解开它。/扫雷 score 查看各人贡献。"
+            async for result in self._send_board(event, session, start_message):
                  yield result
 
         except ValueError as e:
@@ -140,22 +669,29 @@ class MinesweeperPlugin(Star):
     async def click_cell(self, event: AstrMessageEvent):
         """
         点开一个格子。
-        用法: /扫雷 click [列号] [行号]
-        示例: /扫雷 click 3 4
+        用法: /扫雷 click [列号] [行号]，多步以分号分隔
+        示例: /扫雷 click 3 4, /扫雷 click 3 4; 5 6; f 7 8
         """
         session_id = event.get_session_id()
-        game = get_game(session_id)
+        session = sessions.session(session_id)
 
-        if not game:
+        if not session:
             yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
             return
+        game = session.game
 
         if game.game_over:
              yield event.plain_result("游戏已经结束了！")
              return
 
+        start = metrics.start()
         args_text = event.message_str.split("click", 1)[-1].strip()
+        if re.search(r"[;；]", args_text):
+            async for result in self._play_batch(event, session, args_text, MOVE_REVEAL):
+                yield result
+            return
         coords = parse_coords(args_text)
+        metrics.record("parse", start)
 
         if not coords:
             yield event.plain_result("无效的坐标格式。请使用：/扫雷 click [列号] [行号] (例如: /扫雷 click 3 4)")
@@ -171,49 +707,62 @@ class MinesweeperPlugin(Star):
              return
 
         if game.revealed[y][x]:
-             yield event.plain_result(f"格子 ({x+1}, {y+1}) 已经被点开。")
-             return
+            # 点击已揭开的数字格等同于双击
+            async for result in self._play_chord(event, session, x, y):
+                yield result
+            return
 
         logger.info(f"会话 {session_id}: 点击单元格 ({x+1}, {y+1})")
+        ensure_visible(session, x, y)
+        first_click = game.first_click
+        # 从上面的校验到这里没有 await，校验结果在走子时仍然成立（见 Session）
+        revealed_before = game.revealed_safe_count
+        start = metrics.start()
         changed = game.reveal_cell(x, y)
+        metrics.record("reveal", start)
+        score = self._score_message(event, session, revealed_before) if changed else ""
 
         if not changed:
              yield event.plain_result(f"无法点开格子 ({x+1}, {y+1})。")
              return
-
-        message = ""
+        metrics.count("moves")
+        sessions.save(session_id, game)
         if game.game_over:
-            end_game(session_id)
-            if game.won:
-                message = "恭喜你，你赢了！ 🎉"
-                logger.info(f"会话 {session_id}: 游戏胜利")
-            else:
-                message = "嘣！你踩到雷了！游戏结束。💥"
-                logger.info(f"会话 {session_id}: 游戏失败")
+            self._finish_game(session_id, session)
 
-        async for result in self._send_board(event, game, message):
+        message = "\n".join(m for m in (self._outcome_message(session_id, game), score) if m)
+        if first_click and game.no_guess and not game.no_guess_verified:
+            message = "未能及时生成无需猜测的布局，本局可能需要猜测。\n" + message
+        async for result in self._send_board(event, session, message):
             yield result
 
     @filter.command("扫雷 flag")
     async def flag_cell(self, event: AstrMessageEvent):
         """
         标记/取消标记一个格子作为雷。
-        用法: /扫雷 flag [列号] [行号]
-        示例: /扫雷 flag 1 1
+        用法: /扫雷 flag [列号] [行号]，多步以分号分隔
+        示例: /扫雷 flag 1 1, /扫雷 flag 1 1; 2 2; c 3 3
         """
         session_id = event.get_session_id()
-        game = get_game(session_id)
+        session = sessions.session(session_id)
 
-        if not game:
+        if not session:
             yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
             return
+        game = session.game
 
         if game.game_over:
              yield event.plain_result("游戏已经结束了！")
              return
 
+        start = metrics.start()
         args_text = event.message_str.split("flag", 1)[-1].strip()
+        if re.search(r"[;；]", args_text):
+            async for result in self._play_batch(event, session, args_text, MOVE_FLAG):
+                yield result
+            return
         coords = parse_coords(args_text)
+        metrics.record("parse", start)
 
         if not coords:
             yield event.plain_result("无效的坐标格式。请使用：/扫雷 flag [列号] [行号] (例如: /扫雷 flag 1 1)")
@@ -229,34 +778,413 @@ class MinesweeperPlugin(Star):
             return
 
         logger.info(f"会话 {session_id}: 切换单元格 ({x+1}, {y+1}) 的标记状态")
+        ensure_visible(session, x, y)
+        # 从上面的校验到这里没有 await，校验结果在走子时仍然成立（见 Session）
+        revealed_before = game.revealed_safe_count
+        start = metrics.start()
         changed = game.flag_cell(x, y)
+        metrics.record("flag", start)
+        score = self._score_message(event, session, revealed_before) if changed else ""
 
         if not changed:
              yield event.plain_result(f"无法标记/取消标记格子 ({x+1}, {y+1})。")
              return
+        metrics.count("moves")
+        sessions.save(session_id, game)
+        if game.game_over:
+            self._finish_game(session_id, session)
 
         message = ""
         if game.game_over and game.won:
-             end_game(session_id)
              message = "恭喜你，你赢了！ 🎉 (所有雷都被正确标记)"
              logger.info(f"会话 {session_id}: 通过标记获胜")
+        if score:
+            message = "\n".join(m for m in (message, score) if m)
+
+        async for result in self._send_board(event, session, message):
+            yield result
+
+    @filter.command("扫雷 chord")
+    async def chord_cell(self, event: AstrMessageEvent):
+        """
+        双击一个已点开的数字格：周围的旗数等于该数字时，点开周围其余所有未标记的格子。
+        用法: /扫雷 chord [列号] [行号]
+        示例: /扫雷 chord 3 4
+        """
+        session_id = event.get_session_id()
+        session = sessions.session(session_id)
+
+        if not session:
+            yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
+            return
+        game = session.game
+
+        if game.game_over:
+             yield event.plain_result("游戏已经结束了！")
+             return
 
-        async for result in self._send_board(event, game, message):
+        start = metrics.start()
+        args_text = event.message_str.split("chord", 1)[-1].strip()
+        if re.search(r"[;；]", args_text):
+            async for result in self._play_batch(event, session, args_text, MOVE_CHORD):
+                yield result
+            return
+        coords = parse_coords(args_text)
+        metrics.record("parse", start)
+
+        if not coords:
+            yield event.plain_result("无效的坐标格式。请使用：/扫雷 chord [列号] [行号] (例如: /扫雷 chord 3 4)")
+            return
+
+        x, y = coords
+        if not game._is_valid(x, y):
+             yield event.plain_result(f"无效的坐标 ({x+1}, {y+1})。坐标范围应在 1-{game.width} 列, 1-{game.height} 行之间。")
+             return
+
+        async for result in self._play_chord(event, session, x, y):
+            yield result
+
+    @filter.command("扫雷 hint")
+    async def show_hint(self, event: AstrMessageEvent):
+        """
+        根据已点开的数字给出提示：确定安全的格子、确定是雷的格子，或踩雷概率最低的格子，
+        并发送未点开格子按踩雷概率着色的棋盘。
+        """
+        session_id = event.get_session_id()
+        session = sessions.session(session_id)
+
+        if not session:
+            yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
+            return
+        game = session.game
+
+        if game.game_over:
+             yield event.plain_result("游戏已经结束了！")
+             return
+
+        if game.first_click:
+            yield event.plain_result(f"第一步总是安全的，可以从中间开始: /扫雷 click {game.width // 2 + 1} {game.height // 2 + 1}")
+            return
+
+        analysis = await self._analyze(session, heatmap=True) # 热力图随后发送，一并求出
+        if game.game_over or not sessions.is_current(session_id, session):
+            yield event.plain_result("游戏已经结束了！")
+            return
+        width = game.width
+        flagged = game.flagged_mask
+        revealed = game.revealed_mask
+        # 求解期间可能有人走子，跳过已经点开的格子
+        wrong_flags = sorted(i for i in analysis.safe if flagged[i])
+        safe = sorted(i for i in analysis.safe if not flagged[i] and not revealed[i])
+        mines = sorted(i for i in analysis.mines if not flagged[i] and not revealed[i])
+        lines = []
+        if wrong_flags:
+            i = wrong_flags[0]
+            lines.append(f"格子 ({i % width + 1}, {i // width + 1}) 的旗插错了，那里不是雷。")
+        if safe:
+            i = safe[0]
+            lines.append(f"格子 ({i % width + 1}, {i // width + 1}) 一定是安全的: /扫雷 click {i % width + 1} {i // width + 1}")
+            if len(safe) > 1:
+                lines.append(f"另外还有 {len(safe) - 1} 个确定安全的格子。")
+        elif mines:
+            i = mines[0]
+            lines.append(f"格子 ({i % width + 1}, {i // width + 1}) 一定是雷: /扫雷 flag {i % width + 1} {i // width + 1}")
+        else:
+            candidates = [i for i in range(width * game.height)
+                          if not revealed[i] and not flagged[i] and i not in analysis.mines]
+            if not candidates:
+                lines.append("没有可以提示的格子了，请检查插旗是否正确。")
+            else:
+                i = min(candidates, key=analysis.probability)
+                approximate = "" if analysis.exact else "（近似）"
+                lines.append(f"没有确定安全的格子，只能猜了。格子 ({i % width + 1}, {i // width + 1}) "
+                             f"踩雷概率最低，约 {analysis.probability(i):.0%}{approximate}。")
+        logger.info(f"会话 {session_id}: 请求提示")
+        try:
+            image_bytes = await self._render_heatmap(session)
+        except Exception as e:
+            logger.error(f"渲染概率热力图时出错: {e}", exc_info=True)
+            yield event.plain_result("\n".join(lines))
+            return
+        lines.append("图中未点开的格子按踩雷概率着色：绿色较安全，红色较危险。")
+        yield event.chain_result([Comp.Plain("\n".join(lines)), Comp.Image.fromBytes(image_bytes)])
+
+    async def _analyze(self, session: Session, heatmap: bool = False) -> Analysis:
+        """
+        求解当前局面，heatmap 为真时同时生成热力图。大棋盘上求解可能需要数秒，因此在渲染池中
+        对游戏的副本求解，不阻塞事件循环；结果按局面缓存在会话中。
+        """
+        game = session.game
+        analysis = session.analysis
+        if (analysis is None or analysis.revision != len(game.reveal_order)
+                or heatmap and analysis.heatmap is None):
+            analysis = await self.render_pool.submit(analyze, game.copy(), heatmap)
+            session.analysis = analysis
+        return analysis
+
+    async def _render_heatmap(self, session: Session) -> bytes:
+        """渲染叠加了踩雷概率热力图的棋盘。局面和视口不变时直接复用上次的结果。"""
+        game = session.game
+        cache = session.render_cache
+        key = (game.revision, session.viewport)
+        if cache.overlay_key != key:
+            # 求解与热力图在渲染池中生成并按局面缓存（见 _analyze）；热力图帧不使用增量缓存，也不会取走待重绘的格子
+            heatmap = (await self._analyze(session, heatmap=True)).heatmap
+            from .renderer import render_board # 第一次出图时才加载 Pillow 和字体
+            cache.overlay_frame = await self.render_pool.submit(
+                render_board, game.snapshot(), encoding=self.render_pool.encoding,
+                viewport=session.viewport, overlay=heatmap)
+            cache.overlay_key = key
+        return cache.overlay_frame
+
+    @filter.command("扫雷 score")
+    async def show_score(self, event: AstrMessageEvent):
+        """多人模式: 查看本局各玩家的得分排名。"""
+        session = sessions.session(event.get_session_id())
+        if not session:
+            yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
+            return
+        if session.scoreboard is None:
+            yield event.plain_result("当前游戏不是多人模式。可使用 /扫雷 start [难度] 合作 或 /扫雷 start [难度] 对战 开始多人游戏。")
+            return
+        yield event.plain_result(session.scoreboard.summary())
+
+    @filter.command("扫雷 rank")
+    async def show_rank(self, event: AstrMessageEvent):
+        """
+        查看单人对局的排行榜或自己的战绩。
+        用法: /扫雷 rank [难度] [无猜] [用时|效率|胜场] [全局]，/扫雷 rank me [全局]
+        默认为本会话普通难度的最佳用时榜；加上 全局 查看所有会话的排行。
+        """
+        if self.leaderboard is None:
+            yield event.plain_result("排行榜未开启（配置项 leaderboard_enabled）。")
+            return
+        session_id = event.get_session_id()
+        scope, scope_name = session_id, "本会话"
+        difficulty = None
+        no_guess = False
+        metric = METRIC_TIME
+        show_self = False
+        for word in event.message_str.split("rank", 1)[-1].lower().split():
+            if word in RANK_GLOBAL_WORDS:
+                scope, scope_name = GLOBAL_SCOPE, "全局"
+            elif word in RANK_SELF_WORDS:
+                show_self = True
+            elif word in RANK_METRIC_WORDS:
+                metric = RANK_METRIC_WORDS[word]
+            elif word in NO_GUESS_WORDS:
+                no_guess = True
+            elif word in DIFFICULTY_LEVELS:
+                difficulty = difficulty_name(word)
+            elif word in ("自定义", "custom"):
+                difficulty = CUSTOM_DIFFICULTY
+            else:
+                yield event.plain_result(f"无法识别的参数 '{word}'。用法: /扫雷 rank [难度] [用时|效率|胜场] [全局]，/扫雷 rank me [全局]")
+                return
+
+        if show_self:
+            player_id = str(event.get_sender_id())
+            results = self.leaderboard.user_stats(scope, player_id)
+            name = event.get_sender_name() or player_id
+            if not results:
+                yield event.plain_result(f"{name} 在{scope_name}还没有单人对局的战绩。")
+                return
+            games = sum(stats.games for stats in results.values())
+            wins = sum(stats.wins for stats in results.values())
+            lines = [f"{name} 的战绩（{scope_name}）: 共 {games} 局，胜 {wins} 局 ({wins / games:.0%})"]
+            for key in sorted(results, key=lambda k: (k == CUSTOM_DIFFICULTY, k)):
+                stats = results[key]
+                line = f"  {key}: {stats.games} 局，胜 {stats.wins} 局 ({stats.win_rate:.0%})"
+                if stats.best_time is not None:
+                    line += f"，最佳 {stats.best_time:.1f} 秒"
+                if stats.best_rate is not None:
+                    line += f"，最高 {stats.best_rate:.2f} 3BV/s"
+                lines.append(line)
+            yield event.plain_result("\n".join(lines))
+            return
+
+        difficulty = difficulty or DEFAULT_DIFFICULTY
+        if difficulty == CUSTOM_DIFFICULTY and no_guess:
+            # 自定义棋盘的无猜对局也记在 "自定义" 下（见 game_difficulty）
+            yield event.plain_result("自定义棋盘不区分无猜模式: /扫雷 rank 自定义 胜场")
+            return
+        if no_guess:
+            difficulty += "·无猜"
+        if difficulty == CUSTOM_DIFFICULTY and metric != METRIC_WINS:
+            yield event.plain_result("自定义棋盘只统计胜场: /扫雷 rank 自定义 胜场")
+            return
+        rows = self.leaderboard.top(scope, difficulty, metric)
+        title = f"{difficulty} {METRIC_NAMES[metric]}排行（{scope_name}）"
+        if not rows:
+            yield event.plain_result(f"{title}: 暂无记录。")
+            return
+        lines = [f"🏆 {title}:"]
+        for rank, (_, stats) in enumerate(rows, 1):
+            lines.append(f"{rank}. {stats.name}  {format_stat_value(metric, stats)}")
+        yield event.plain_result("\n".join(lines))
+
+    @filter.command("扫雷 mode")
+    async def set_render_mode(self, event: AstrMessageEvent):
+        """
+        设置本会话的棋盘显示方式。
+        用法: /扫雷 mode [图片|文字|自动]，不带参数时显示当前设置
+        """
+        session = sessions.session(event.get_session_id())
+        if not session:
+            yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
+            return
+        args_text = event.message_str.split("mode", 1)[-1].strip().lower()
+        if not args_text:
+            current = session.render_mode or self.render_mode
+            yield event.plain_result(f"当前显示方式: {RENDER_MODE_NAMES[current]}。可选: 图片、文字、自动。")
+            return
+        mode = RENDER_MODE_WORDS.get(args_text)
+        if mode is None:
+            yield event.plain_result(f"无效的显示方式 '{args_text}'。可选: 图片、文字、自动。")
+            return
+        session.render_mode = mode
+        session.text_cache.invalidate() # 切换后先发一次完整棋盘
+        async for result in self._send_board(event, session, f"显示方式已切换为: {RENDER_MODE_NAMES[mode]}。"):
+            yield result
+
+    @filter.command("扫雷 view")
+    async def move_viewport(self, event: AstrMessageEvent):
+        """
+        移动大棋盘的显示区域，使指定格子位于中心。
+        用法: /扫雷 view [列号] [行号]
+        示例: /扫雷 view 100 100
+        """
+        session_id = event.get_session_id()
+        session = sessions.session(session_id)
+
+        if not session:
+            yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
+            return
+        game = session.game
+
+        if session.viewport is None:
+            yield event.plain_result("当前棋盘已完整显示，无需移动视图。")
+            return
+
+        args_text = event.message_str.split("view", 1)[-1].strip()
+        coords = parse_coords(args_text)
+
+        if not coords:
+            yield event.plain_result("无效的坐标格式。请使用：/扫雷 view [列号] [行号] (例如: /扫雷 view 50 50)")
+            return
+
+        x, y = coords
+        if not game._is_valid(x, y):
+             yield event.plain_result(f"无效的坐标 ({x+1}, {y+1})。坐标范围应在 1-{game.width} 列, 1-{game.height} 行之间。")
+             return
+
+        viewport = center_viewport(game, x, y)
+        session.viewport = viewport
+        x0, y0, width, height = viewport
+        message = f"当前显示第 {x0+1}-{x0+width} 列, 第 {y0+1}-{y0+height} 行。"
+        async for result in self._send_board(event, session, message):
             yield result
 
+    @filter.command("扫雷 zoom")
+    async def show_overview(self, event: AstrMessageEvent):
+        """
+        发送整个棋盘的缩略图，蓝框标出当前显示区域。
+        """
+        session_id = event.get_session_id()
+        session = sessions.session(session_id)
+
+        if not session:
+            yield event.plain_result("当前没有进行中的游戏。请使用 /扫雷 start 开始新游戏。")
+            return
+        game = session.game
+
+        try:
+            from .renderer import render_overview # 第一次出图时才加载 Pillow 和字体
+            image_bytes = await self.render_pool.submit(
+                render_overview, game.snapshot(), session.viewport, encoding=self.render_pool.encoding)
+            chain = [
+                Comp.Plain(f"全局缩略图 ({game.width}x{game.height}，剩余 {game.mines_remaining} 个雷未标记)"),
+                Comp.Image.fromBytes(image_bytes),
+            ]
+            yield event.chain_result(chain)
+        except Exception as e:
+            logger.error(f"渲染缩略图时出错: {e}", exc_info=True)
+            yield event.plain_result(f"抱歉，渲染缩略图时出错: {e}")
+
+    @filter.command("扫雷 replay")
+    async def replay_game(self, event: AstrMessageEvent):
+        """
+        生成本会话上一局（没有已结束的对局时为当前对局）的回放动画。
+        用法: /扫雷 replay [gif|webp]
+        """
+        session_id = event.get_session_id()
+        fmt = event.message_str.split("replay", 1)[-1].strip().lower() or self.replay_format
+        if fmt not in REPLAY_FORMATS:
+            yield event.plain_result(f"无效的回放格式 '{fmt}'。可选: {', '.join(REPLAY_FORMATS)}")
+            return
+
+        snapshot = sessions.last_finished(session_id)
+        title = "上一局的回放"
+        if snapshot is None:
+            session = sessions.session(session_id)
+            if session is None:
+                yield event.plain_result("还没有可以回放的对局。请使用 /扫雷 start 开始新游戏。")
+                return
+            game = session.game
+            if not game.replayable:
+                yield event.plain_result("当前对局由旧版存档恢复，没有走子记录，无法回放。")
+                return
+            if not game.move_log:
+                yield event.plain_result("当前对局还没有走子。")
+                return
+            snapshot = game.to_bytes()
+            title = f"当前对局的回放（前 {len(game.move_log)} 步）"
+
+        if session_id in self._replaying:
+            yield event.plain_result("回放正在生成中，请稍候。")
+            return
+        self._replaying.add(session_id)
+        try:
+            from .replay import render_replay # 第一次回放时才加载
+            # 在渲染池中生成，不阻塞事件循环；参数和结果都是字节，进程池中同样可用
+            data = await self.render_pool.submit(render_replay, snapshot, fmt, frame_ms=self.replay_frame_ms)
+        except Exception as e:
+            logger.error(f"生成回放动画时出错: {e}", exc_info=True)
+            yield event.plain_result(f"抱歉，生成回放动画时出错: {e}")
+            return
+        finally:
+            self._replaying.discard(session_id)
+        metrics.count("bytes_sent", len(data))
+        yield event.chain_result([Comp.Plain(title), Comp.Image.fromBytes(data)])
+
     @filter.command("扫雷 end")
     async def end_current_game(self, event: AstrMessageEvent):
         """
         结束当前频道的扫雷游戏。
         """
         session_id = event.get_session_id()
-        game = get_game(session_id)
+        session = sessions.session(session_id)
 
-        if not game:
+        if not session:
             yield event.plain_result("当前没有进行中的游戏。")
             return
 
-        end_game(session_id)
+        sessions.end(session_id, session)
         logger.info(f"会话 {session_id}: 用户命令结束游戏")
         yield event.plain_result("当前扫雷游戏已结束。")
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("扫雷 stats")
+    async def show_stats(self, event: AstrMessageEvent):
+        """
+        管理员: 查看插件的运行统计（吞吐、各环节耗时分位数、活动对局数、渲染缓存命中率、发送字节数）。
+        用法: /扫雷 stats，/扫雷 stats reset 清空统计
+        """
+        if not metrics.enabled:
+            yield event.plain_result("运行统计未开启（配置项 metrics_enabled）。")
+            return
+        if event.message_str.split("stats", 1)[-1].strip() == "reset":
+            metrics.reset()
+            yield event.plain_result("运行统计已重置。")
+            return
+        yield event.plain_result(format_stats(metrics.snapshot(), sessions.resident, self.sender, self.leaderboard))
@@ -0,0 +1,91 @@
+"""
+多人模式: 多名玩家在同一棋盘上合作或对战时的计分。
+
+- 合作 (coop): 大家一起解开棋盘，记录每人的贡献，踩雷则全体失败。
+- 对战 (versus): 每点开一个安全格得 1 分，踩雷扣 MINE_PENALTY 分并结束本局，结束时得分最高者获胜。
+
+每步只需比较走子前后游戏的已揭开安全格数，计分为 O(1)，不扫描棋盘。
+"""
+from typing import Dict, List
+
+MODE_COOP = "coop"
+MODE_VERSUS = "versus"
+MODE_NAMES = {MODE_COOP: "合作", MODE_VERSUS: "对战"}
+
+MINE_PENALTY = 10 # 对战模式下踩雷扣的分数
+SUMMARY_LIMIT = 10 # 排名中最多列出的玩家数
+
+
+class PlayerScore:
+    """一名玩家在本局中的统计。"""
+    __slots__ = ("name", "cells", "mines", "moves")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cells = 0 # 点开的安全格数
+        self.mines = 0 # 踩到的雷数
+        self.moves = 0 # 有效走子数
+
+
+class Scoreboard:
+    """一局多人游戏的计分板，按玩家 ID 记录。"""
+
+    def __init__(self, mode: str):
+        if mode not in MODE_NAMES:
+            raise ValueError(f"不支持的多人模式: {mode}")
+        self.mode = mode
+        self.players: Dict[str, PlayerScore] = {}
+
+    @property
+    def mode_name(self) -> str:
+        return MODE_NAMES[self.mode]
+
+    def points(self, player: PlayerScore) -> int:
+        if self.mode == MODE_VERSUS:
+            return player.cells - player.mines * MINE_PENALTY
+        return player.cells
+
+    def record(self, player_id: str, name: str, cells: int, hit_mine: bool, moves: int = 1) -> PlayerScore:
+        """记录玩家的一条走子消息: cells 为点开的安全格数，hit_mine 表示踩雷，moves 为其中的有效步数。"""
+        player = self.players.get(player_id)
+        if player is None:
+            player = self.players[player_id] = PlayerScore(name)
+        player.name = name # 玩家可能改了昵称
+        player.cells += cells
+        player.mines += hit_mine
+        player.moves += moves
+        return player
+
+    def ranking(self) -> List[PlayerScore]:
+        """按得分从高到低排列的玩家。"""
+        return sorted(self.players.values(), key=lambda p: (-self.points(p), p.mines, -p.cells))
+
+    def move_message(self, player: PlayerScore, cells: int, hit_mine: bool) -> str:
+        """一步之后的得分提示，没有得失分时为空。"""
+        if not cells and not hit_mine:
+            return ""
+        if self.mode == MODE_VERSUS:
+            delta = cells - (MINE_PENALTY if hit_mine else 0)
+            return f"{player.name} {delta:+d} 分（共 {self.points(player)} 分）"
+        return f"{player.name} 点开了 {cells} 格（累计 {player.cells} 格）" if cells else f"{player.name} 踩到了雷"
+
+    def summary(self, final: bool = False) -> str:
+        """排名文本。final 为真时用于本局结束。"""
+        ranking = self.ranking()
+        if not ranking:
+            return "还没有玩家走子。"
+        title = "最终排名" if final else "当前排名"
+        if self.mode == MODE_COOP:
+            title = "各玩家贡献" if final else "当前贡献"
+        lines = [f"{title}（{self.mode_name}）:"]
+        for rank, player in enumerate(ranking[:SUMMARY_LIMIT], 1):
+            detail = f"点开 {player.cells} 格"
+            if player.mines:
+                detail += f"，踩雷 {player.mines} 次"
+            lines.append(f"{rank}. {player.name}  {self.points(player)} 分 ({detail})")
+        if len(ranking) > SUMMARY_LIMIT:
+            lines.append(f"……共 {len(ranking)} 名玩家")
+        if final and self.mode == MODE_VERSUS:
+            lines.append(f"🏆 {ranking[0].name} 获胜！")
+        return "\n".join(lines)
+
@@ -0,0 +1,124 @@
+"""
+渲染相关的共享定义：单元格外观、视口、渲染缓存和输出编码参数。
+
+本模块不依赖 Pillow。插件启动时只需导入这里，renderer.py（以及 Pillow、字体）在第一次渲染图片时才加载，
+文字棋盘模式下则完全不会加载。
+"""
+import threading
+
+from .game import CELL_CHARS, MINE
+
+# --- 单元格外观 ---
+# 图片贴图与文字棋盘的字符都按这些键查找
+
+SPRITE_HIDDEN = "hidden"
+SPRITE_REVEALED = "revealed"
+SPRITE_MINE = "mine" # 已揭开的地雷
+SPRITE_HIDDEN_MINE = "hidden_mine" # 游戏失败后显示的未揭开地雷
+SPRITE_EXPLODED = "exploded" # 被踩中的地雷
+SPRITE_FLAG = "flag"
+SPRITE_FLAG_MINE = "flag_mine" # 游戏结束时标记正确的地雷
+
+
+def cell_sprite_key(game_state, x, y):
+    """根据游戏状态确定单元格应使用的贴图。"""
+    index = y * game_state["width"] + x
+    value = game_state["cells"][index]
+    is_mine = value == MINE
+    if game_state["revealed_mask"][index]:
+        if is_mine:
+            if (x, y) == game_state["lost_mine_location"]: # 高亮显示导致游戏结束的地雷
+                return SPRITE_EXPLODED
+            return SPRITE_MINE
+        if value:
+            return CELL_CHARS[value]
+        return SPRITE_REVEALED
+    if game_state["flagged_mask"][index]:
+        if game_state["game_over"] and is_mine:
+            return SPRITE_FLAG_MINE
+        return SPRITE_FLAG
+    if game_state["game_over"] and not game_state["won"] and is_mine:
+        return SPRITE_HIDDEN_MINE
+    return SPRITE_HIDDEN
+
+
+def clamp_viewport(viewport, board_width, board_height):
+    """把视口 (x0, y0, width, height) 裁剪到棋盘范围内，尽量保持视口大小。"""
+    x0, y0, width, height = viewport
+    width = max(1, min(width, board_width))
+    height = max(1, min(height, board_height))
+    x0 = max(0, min(x0, board_width - width))
+    y0 = max(0, min(y0, board_height - height))
+    return x0, y0, width, height
+
+
+# --- 渲染缓存 ---
+
+class RenderCache:
+    """
+    单局游戏的渲染缓存：保存上一帧图像，后续只重绘发生变化的单元格。
+
+    渲染在线程池中进行，可能晚于 invalidate() 才完成（例如超时后在后台继续渲染），
+    所以每次 invalidate() 都使代数 generation 加 1，渲染结果只在代数未变时才写入缓存（见 store）。
+    """
+
+    def __init__(self):
+        self.image = None
+        self.region = None # 缓存图像对应的棋盘区域 (x0, y0, width, height)
+        self.overlay_key = None # 缓存的热力图帧对应的 (棋盘版本, 视口)
+        self.overlay_frame = None # 编码后的热力图帧，局面不变时重复请求直接复用
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """丢弃缓存的帧，下次渲染时完整重绘。尚未完成的渲染不会再写入缓存。"""
+        with self._lock:
+            self.generation += 1
+            self.image = None
+            self.region = None
+            self.overlay_key = None
+            self.overlay_frame = None
+
+    def store(self, image, region, generation):
+        """保存渲染好的一帧。generation 是取得游戏状态时的代数，之后缓存已被丢弃时不保存，返回 False。"""
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self.image = image
+            self.region = region
+            return True
+
+
+# --- 输出编码 ---
+# 棋盘只用到少量颜色，调色板 PNG 或无损 WebP 通常比 RGB PNG 更小。
+# format 可选:
+#   png          RGB PNG
+#   png_palette  自适应调色板 (P 模式) PNG
+#   webp         WebP (默认无损)
+#   gif          调色板 GIF
+OUTPUT_FORMATS = ("png", "png_palette", "webp", "gif")
+REPLAY_FORMATS = ("gif", "webp") # 回放动画的格式，见 replay.py
+DEFAULT_ENCODING = {
+    "format": "png",
+    "compress_level": 6, # zlib 压缩等级 0-9
+    "compress_type": 0, # zlib 压缩策略: 0 默认, 1 FILTERED, 2 HUFFMAN_ONLY, 3 RLE, 4 FIXED
+    "palette_colors": 32, # 调色板模式下的颜色数
+    "webp_lossless": True,
+    "webp_quality": 80, # 有损时为画质, 无损时为压缩力度 (0-100)
+}
+
+
+def normalize_encoding(options=None):
+    """合并默认编码参数并校验，返回完整的参数字典。"""
+    encoding = dict(DEFAULT_ENCODING)
+    if options:
+        encoding.update(options)
+    if encoding["format"] not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {encoding['format']}。可选: {', '.join(OUTPUT_FORMATS)}")
+    if not 0 <= encoding["compress_level"] <= 9:
+        raise ValueError("PNG 压缩等级必须在 0 到 9 之间。")
+    if not 0 <= encoding["compress_type"] <= 4:
+        raise ValueError("zlib 压缩策略必须在 0 到 4 之间。")
+    if not 2 <= encoding["palette_colors"] <= 256:
+        raise ValueError("调色板颜色数必须在 2 到 256 之间。")
+    return encoding
@@ -0,0 +1,132 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .render_common import normalize_encoding
+
+
+class _RenderJob:
+    """一个尚未开始的渲染请求。同一会话的后续请求会合并到这里。"""
+
+    def __init__(self, future, game, cache, viewport):
+        self.future = future
+        self.game = game
+        self.cache = cache
+        self.viewport = viewport
+
+
+class RenderPool:
+    """
+    在线程池或进程池中渲染棋盘，避免阻塞事件循环。
+
+    - 队列有界：队列满时 render() 会等待，形成背压。
+    - 按会话合并：同一会话已有排队中（尚未开始）的渲染时，新请求直接复用它，
+      渲染开始时才读取游戏状态，因此所有等待者都会拿到最新的一帧。
+    - 同一会话的渲染串行执行，以保证渲染缓存不会被并发修改。
+    - 第一次渲染时才启动执行器并导入 renderer（Pillow 与字体），创建渲染池本身不加载它们。
+    """
+
+    def __init__(self, max_workers=2, max_queue=64, use_processes=False, encoding=None, font_path=None):
+        if max_workers < 1 or max_queue < 1:
+            raise ValueError("渲染线程数和队列长度必须大于 0。")
+        self.encoding = normalize_encoding(encoding)
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self.font_path = font_path or None # 绘制数字使用的字体文件，None 表示默认字体
+        self._executor = None
+        self._queue = None
+        self._workers = []
+        self._pending = {} # 会话 -> 排队中的 _RenderJob
+        self._running = {} # 会话 -> 正在渲染的 future
+        # 统计
+        self.requested = 0
+        self.rendered = 0
+        self.coalesced = 0
+
+    def _ensure_started(self):
+        if self._executor is not None:
+            return
+        from .renderer import configure_fonts
+        if self.use_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            # 子进程各自导入 renderer，启动时设置字体
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=configure_fonts,
+                                                 initargs=(self.font_path,))
+        else:
+            if self.font_path:
+                configure_fonts(self.font_path)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="minesweeper-render")
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def render(self, key, game, cache=None, viewport=None):
+        """渲染 game 的当前棋盘（或 viewport 区域）并返回图像字节流。key 通常为会话 ID。"""
+        self.requested += 1
+        job = self._pending.get(key)
+        if job is not None:
+            # 合并到排队中的请求，并让它使用最新的游戏对象
+            self.coalesced += 1
+            job.game = game
+            job.cache = cache
+            job.viewport = viewport
+        else:
+            self._ensure_started()
+            job = _RenderJob(asyncio.get_running_loop().create_future(), game, cache, viewport)
+            self._pending[key] = job
+            await self._queue.put(key) # 队列满时在此等待
+        # shield: 某个等待者被取消时不应影响共享同一帧的其他等待者
+        return await asyncio.shield(job.future)
+
+    async def submit(self, func, *args, **kwargs):
+        """在渲染池的执行器中运行任意渲染函数（不参与合并和排队）。"""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _worker(self):
+        from .renderer import render_board
+        loop = asyncio.get_running_loop()
+        while True:
+            key = await self._queue.get()
+            try:
+                running = self._running.get(key)
+                if running is not None:
+                    await asyncio.wait([running])
+                job = self._pending.pop(key)
+                self._running[key] = job.future
+                try:
+                    # 状态快照在事件循环线程中获取，渲染本身在池中执行
+                    state = job.game.snapshot()
+                    dirty_cells = job.game.take_dirty_cells()
+                    generation = job.cache.generation if job.cache is not None else None
+                    if self.use_processes:
+                        # 缓存的帧无法跨进程共享，每次完整渲染
+                        args = (state, None, None)
+                    else:
+                        args = (state, job.cache, dirty_cells)
+                    render = functools.partial(render_board, *args, encoding=self.encoding, viewport=job.viewport,
+                                               generation=generation)
+                    result = await loop.run_in_executor(self._executor, render)
+                    self.rendered += 1
+                    job.future.set_result(result)
+                except Exception as e:
+                    job.future.set_exception(e)
+                finally:
+                    if self._running.get(key) is job.future:
+                        del self._running[key]
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        """停止工作协程并关闭执行器，尚未完成的请求会收到 CancelledError。"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job in self._pending.values():
+            job.future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
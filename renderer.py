@@ -1,6 +1,14 @@
 from PIL import Image, ImageDraw, ImageFont
+import functools
 import io
 import os # 导入 os 用于路径拼接
+import threading
+import time
+
+from . import metrics
+from .render_common import (DEFAULT_ENCODING, OUTPUT_FORMATS, SPRITE_EXPLODED, SPRITE_FLAG, SPRITE_FLAG_MINE,
+                            SPRITE_HIDDEN, SPRITE_HIDDEN_MINE, SPRITE_MINE, SPRITE_REVEALED, RenderCache,
+                            cell_sprite_key, clamp_viewport, normalize_encoding)
 
 # --- 配置 ---
 CELL_SIZE = 30
@@ -27,23 +35,50 @@ NUMBER_COLORS = {
 COORD_MARGIN = int(CELL_SIZE * 0.8)
 
 # --- 字体加载 ---
-try:
-    # 坐标使用较小字体
-    COORD_FONT_SIZE = int(COORD_MARGIN * 0.6)
-    COORD_FONT = ImageFont.truetype("arial.ttf", COORD_FONT_SIZE)
-    # 单元格数字使用主字体
-    CELL_FONT_SIZE = int(CELL_SIZE * 0.6)
-    FONT = ImageFont.truetype("arial.ttf", CELL_FONT_SIZE)
-except IOError:
-    try:
-        # 为没有 Arial 的系统提供备选字体 (例如某些 Linux 发行版)
-        COORD_FONT = ImageFont.truetype("DejaVuSans.ttf", COORD_FONT_SIZE)
-        FONT = ImageFont.truetype("DejaVuSans.ttf", CELL_FONT_SIZE)
-    except IOError:
-        # 如果其他字体加载失败，使用基础备选字体
-        COORD_FONT = ImageFont.load_default()
-        FONT = ImageFont.load_default()
-        print("警告：无法加载首选字体。将使用默认 PIL 字体。")
+# 字体在第一次绘制文字时才加载（之后所有对局共用），导入本模块不读取字体文件。
+# 依次尝试: configure_fonts 指定的字体、插件自带的字体、系统的 Arial 和 DejaVu Sans，最后使用 PIL 的内置字体。
+# 坐标使用较小字体
+COORD_FONT_SIZE = int(COORD_MARGIN * 0.6)
+# 单元格数字使用主字体
+CELL_FONT_SIZE = int(CELL_SIZE * 0.6)
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+BUNDLED_FONT = os.path.join(FONT_DIR, "DejaVuSans.ttf")
+SYSTEM_FONTS = ("arial.ttf", "DejaVuSans.ttf") # 为没有 Arial 的系统提供备选字体 (例如某些 Linux 发行版)
+
+_font_path = None # configure_fonts 指定的字体文件
+
+
+def configure_fonts(path=None):
+    """
+    指定绘制数字使用的字体文件（None 或空字符串表示使用默认字体）。
+
+    只记录路径并丢弃已加载的字体、贴图和底图，下次渲染时按新字体重新生成。
+    """
+    global _font_path
+    _font_path = path or None
+    for cached in (get_fonts, _glyph_metrics, get_sprite_atlas, get_heatmap_sprites, _base_image):
+        cached.cache_clear()
+
+
+def _load_font(size):
+    candidates = [BUNDLED_FONT, *SYSTEM_FONTS]
+    if _font_path:
+        candidates.insert(0, _font_path)
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except IOError:
+            continue
+    # 如果其他字体加载失败，使用基础备选字体
+    print("警告：无法加载首选字体。将使用默认 PIL 字体。")
+    return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=1)
+def get_fonts():
+    """返回 (坐标字体, 单元格数字字体)，首次调用时加载。"""
+    return _load_font(COORD_FONT_SIZE), _load_font(CELL_FONT_SIZE)
+
 
 # --- 辅助函数：获取文本尺寸 --- (处理 Pillow 版本差异)
 def get_text_size(font, text):
@@ -59,6 +94,12 @@ def get_text_size(font, text):
         offset_y = 0
     return width, height, offset_x, offset_y
 
+
+@functools.lru_cache(maxsize=4096)
+def _glyph_metrics(font, text):
+    """按 (字体, 文本) 缓存的 get_text_size，绘制坐标时每个编号只测量一次。"""
+    return get_text_size(font, text)
+
 # --- 绘制函数 (已调整以适应 COORD_MARGIN 偏移) ---
 
 def draw_cell(draw, x, y, color):
@@ -73,7 +114,8 @@ def draw_cell(draw, x, y, color):
 def draw_number(draw, x, y, number_char):
     """在单元格中绘制数字，考虑坐标边距偏移。"""
     color = NUMBER_COLORS.get(number_char, (0, 0, 0)) # 默认为黑色
-    text_width, text_height, offset_x, offset_y = get_text_size(FONT, number_char)
+    font = get_fonts()[1]
+    text_width, text_height, offset_x, offset_y = _glyph_metrics(font, number_char)
 
     # 将文本居中于单元格内
     cell_left = COORD_MARGIN + x * CELL_SIZE
@@ -81,7 +123,7 @@ def draw_number(draw, x, y, number_char):
     text_x = cell_left + (CELL_SIZE - text_width) / 2 - offset_x
     text_y = cell_top + (CELL_SIZE - text_height) / 2 - offset_y
 
-    draw.text((text_x, text_y), number_char, fill=color, font=FONT)
+    draw.text((text_x, text_y), number_char, fill=color, font=font)
 
 def draw_mine(draw, x, y):
     """在单元格中绘制地雷，考虑坐标边距偏移。"""
@@ -109,8 +151,9 @@ def draw_flag(draw, x, y):
                (center_x - CELL_SIZE * 0.2, center_y + CELL_SIZE * 0.4)], fill=(0,0,0), width=2)
 
 # --- 坐标绘制函数 ---
-def draw_coordinates(draw, width, height):
-    """在边距中绘制列号和行号。"""
+def draw_coordinates(draw, width, height, x_offset=0, y_offset=0):
+    """在边距中绘制列号和行号。x_offset/y_offset 为视口左上角在棋盘中的位置。"""
+    font = get_fonts()[0]
     # 绘制坐标区域背景
     draw.rectangle([0, 0, COORD_MARGIN, COORD_MARGIN + height * CELL_SIZE], fill=COORD_BG_COLOR)
     draw.rectangle([0, 0, COORD_MARGIN + width * CELL_SIZE, COORD_MARGIN], fill=COORD_BG_COLOR)
@@ -119,23 +162,23 @@ def draw_coordinates(draw, width, height):
 
     # 绘制列号 (X轴)
     for x in range(width):
-        num_str = str(x + 1)
-        text_width, text_height, offset_x, offset_y = get_text_size(COORD_FONT, num_str)
+        num_str = str(x_offset + x + 1)
+        text_width, text_height, offset_x, offset_y = _glyph_metrics(font, num_str)
         cell_center_x = COORD_MARGIN + x * CELL_SIZE + CELL_SIZE / 2
         text_x = cell_center_x - text_width / 2 - offset_x
         text_y = (COORD_MARGIN - text_height) / 2 - offset_y
-        draw.text((text_x, text_y), num_str, fill=COORD_TEXT_COLOR, font=COORD_FONT)
+        draw.text((text_x, text_y), num_str, fill=COORD_TEXT_COLOR, font=font)
         # 在数字下方绘制网格线
         draw.line([(COORD_MARGIN + x * CELL_SIZE, 0), (COORD_MARGIN + x * CELL_SIZE, COORD_MARGIN)], fill=BORDER_COLOR)
 
     # 绘制行号 (Y轴)
     for y in range(height):
-        num_str = str(y + 1)
-        text_width, text_height, offset_x, offset_y = get_text_size(COORD_FONT, num_str)
+        num_str = str(y_offset + y + 1)
+        text_width, text_height, offset_x, offset_y = _glyph_metrics(font, num_str)
         cell_center_y = COORD_MARGIN + y * CELL_SIZE + CELL_SIZE / 2
         text_x = (COORD_MARGIN - text_width) / 2 - offset_x
         text_y = cell_center_y - text_height / 2 - offset_y
-        draw.text((text_x, text_y), num_str, fill=COORD_TEXT_COLOR, font=COORD_FONT)
+        draw.text((text_x, text_y), num_str, fill=COORD_TEXT_COLOR, font=font)
         # 在数字右侧绘制网格线
         draw.line([(0, COORD_MARGIN + y * CELL_SIZE), (COORD_MARGIN, COORD_MARGIN + y * CELL_SIZE)], fill=BORDER_COLOR)
 
@@ -144,62 +187,263 @@ def draw_coordinates(draw, width, height):
     draw.line([(COORD_MARGIN, COORD_MARGIN), (COORD_MARGIN, COORD_MARGIN + height * CELL_SIZE)], fill=BORDER_COLOR)
 
 
-# --- 主渲染函数 --- (已调整以适应坐标)
+# --- 单元格贴图集 ---
+# 单元格可能的外观只有少数几种，预先把每种外观绘制成贴图，
+# 渲染时只需粘贴贴图，不再逐格绘制矢量图形和文字。贴图在第一次渲染时构建，所有对局共用。
 
-def render_board(game_state):
-    """将扫雷棋盘状态渲染为带坐标的 PIL 图像。"""
-    width = game_state["width"]
-    height = game_state["height"]
-    board = game_state["board"]
-    revealed = game_state["revealed"]
-    flagged = game_state["flagged"]
-    game_over = game_state["game_over"]
-    won = game_state["won"]
-    mine_locations = game_state["mine_locations"]
-    lost_mine_location = game_state["lost_mine_location"]
-
-    # 计算包含坐标边距的图像尺寸
+
+def _draw_sprite(draw, key):
+    """在单元格 (0, 0) 处绘制指定外观，供构建贴图使用。"""
+    if key in NUMBER_COLORS:
+        draw_cell(draw, 0, 0, REVEALED_COLOR)
+        draw_number(draw, 0, 0, key)
+    elif key == SPRITE_REVEALED:
+        draw_cell(draw, 0, 0, REVEALED_COLOR)
+    elif key == SPRITE_MINE:
+        draw_cell(draw, 0, 0, REVEALED_COLOR)
+        draw_mine(draw, 0, 0)
+    elif key == SPRITE_EXPLODED:
+        draw_cell(draw, 0, 0, EXPLODED_MINE_BG_COLOR)
+        draw_mine(draw, 0, 0)
+    elif key == SPRITE_HIDDEN_MINE:
+        draw_cell(draw, 0, 0, HIDDEN_COLOR)
+        draw_mine(draw, 0, 0)
+    elif key == SPRITE_FLAG_MINE:
+        draw_cell(draw, 0, 0, HIDDEN_COLOR)
+        draw_flag(draw, 0, 0)
+        draw_flag(draw, 0, 0)
+    elif key == SPRITE_FLAG:
+        draw_cell(draw, 0, 0, HIDDEN_COLOR)
+        draw_flag(draw, 0, 0)
+    else:
+        draw_cell(draw, 0, 0, HIDDEN_COLOR)
+
+
+@functools.lru_cache(maxsize=None)
+def get_sprite_atlas():
+    """
+    返回 {外观: 贴图} 字典，首次调用时构建。
+
+    贴图大小为 (CELL_SIZE + 1) 像素见方，包含单元格四周的边框线，
+    与 draw_cell 绘制的矩形完全一致。
+    """
+    keys = [SPRITE_HIDDEN, SPRITE_REVEALED, SPRITE_MINE, SPRITE_HIDDEN_MINE,
+            SPRITE_EXPLODED, SPRITE_FLAG, SPRITE_FLAG_MINE, *NUMBER_COLORS]
+    scratch_size = COORD_MARGIN + CELL_SIZE + 1
+    crop_box = (COORD_MARGIN, COORD_MARGIN, scratch_size, scratch_size)
+    atlas = {}
+    for key in keys:
+        scratch = Image.new('RGB', (scratch_size, scratch_size), color='white')
+        _draw_sprite(ImageDraw.Draw(scratch), key)
+        atlas[key] = scratch.crop(crop_box)
+    return atlas
+
+
+# --- 概率热力图 ---
+# 未揭开的格子按踩雷概率着色: 0 为绿色，0.5 为黄色，1 为红色。概率量化为 HEATMAP_LEVELS 级，
+# 每级预先生成一张着色的贴图，渲染时与普通贴图一样直接粘贴。
+HEATMAP_LEVELS = 11
+HEATMAP_COLORS = ((60, 190, 90), (240, 210, 60), (230, 60, 50))
+HEATMAP_ALPHA = 0.6
+
+
+def _heat_color(p):
+    low, mid, high = HEATMAP_COLORS
+    if p <= 0.5:
+        start, end, t = low, mid, p * 2
+    else:
+        start, end, t = mid, high, (p - 0.5) * 2
+    return tuple(round(a + (b - a) * t) for a, b in zip(start, end))
+
+
+@functools.lru_cache(maxsize=1)
+def get_heatmap_sprites():
+    """返回各概率等级的着色贴图列表（保留边框，只给格子内部着色）。"""
+    hidden = get_sprite_atlas()[SPRITE_HIDDEN]
+    inner = (1, 1, CELL_SIZE, CELL_SIZE)
+    sprites = []
+    for level in range(HEATMAP_LEVELS):
+        tint = Image.new('RGB', hidden.size, _heat_color(level / (HEATMAP_LEVELS - 1)))
+        blended = Image.blend(hidden, tint, HEATMAP_ALPHA)
+        sprite = hidden.copy()
+        sprite.paste(blended.crop(inner), inner[:2])
+        sprites.append(sprite)
+    return sprites
+
+
+def paste_heatmap(image, game_state, overlay, region):
+    """把 overlay ({下标: 踩雷概率}) 中位于 region 内、仍显示为未揭开的格子替换为着色贴图。"""
+    sprites = get_heatmap_sprites()
+    board_width = game_state["width"]
+    x0, y0, width, height = region
+    scale = HEATMAP_LEVELS - 1
+    for index, probability in overlay.items():
+        x, y = index % board_width, index // board_width
+        if x0 <= x < x0 + width and y0 <= y < y0 + height and cell_sprite_key(game_state, x, y) == SPRITE_HIDDEN:
+            sprite = sprites[round(min(max(probability, 0.0), 1.0) * scale)]
+            image.paste(sprite, (COORD_MARGIN + (x - x0) * CELL_SIZE, COORD_MARGIN + (y - y0) * CELL_SIZE))
+
+
+def paste_game_cell(image, atlas, game_state, x, y, x0=0, y0=0):
+    """把单元格对应的贴图粘贴到图像上（考虑 COORD_MARGIN 偏移和视口原点 x0, y0）。"""
+    sprite = atlas[cell_sprite_key(game_state, x, y)]
+    image.paste(sprite, (COORD_MARGIN + (x - x0) * CELL_SIZE, COORD_MARGIN + (y - y0) * CELL_SIZE))
+
+
+@functools.lru_cache(maxsize=16)
+def _base_image(width, height, x_offset=0, y_offset=0):
+    """返回指定区域只含坐标的底图（按区域缓存，使用时需复制）。"""
     img_width = width * CELL_SIZE + COORD_MARGIN
     img_height = height * CELL_SIZE + COORD_MARGIN
     image = Image.new('RGB', (img_width, img_height), color='white') # 白色背景
-    draw = ImageDraw.Draw(image)
+    draw_coordinates(ImageDraw.Draw(image), width, height, x_offset, y_offset)
+    return image
 
-    # 首先绘制坐标数字
-    draw_coordinates(draw, width, height)
 
-    # 绘制游戏单元格 (考虑 COORD_MARGIN 偏移)
-    for y in range(height):
-        for x in range(width):
-            cell_char = board[y][x]
-            is_revealed = revealed[y][x]
-            is_flagged = flagged[y][x]
-            is_mine = (x, y) in mine_locations
-
-            # 首先确定背景色
-            bg_color = HIDDEN_COLOR
-            if is_revealed:
-                bg_color = REVEALED_COLOR
-                if is_mine and (x,y) == lost_mine_location: # 高亮显示导致游戏结束的地雷
-                     bg_color = EXPLODED_MINE_BG_COLOR
-
-            draw_cell(draw, x, y, bg_color) # 使用带偏移的绘制函数
-
-            # 根据状态绘制内容 (使用带偏移的绘制函数)
-            if is_revealed:
-                if is_mine:
-                    draw_mine(draw, x, y)
-                elif cell_char.isdigit():
-                    draw_number(draw, x, y, cell_char)
-            elif is_flagged:
-                 draw_flag(draw, x, y)
-            elif game_over and not won and is_mine:
-                 draw_mine(draw, x, y)
-
-            if game_over and is_mine and is_flagged:
-                 draw_flag(draw, x, y)
+# --- 输出编码 ---
+# 按输出格式统计的编码次数、输出字节数和耗时
+ENCODE_STATS = {}
+_encode_stats_lock = threading.Lock()
 
-    # 将图像转换为字节流
+
+def _record_encode(fmt, size, seconds):
+    with _encode_stats_lock:
+        stats = ENCODE_STATS.setdefault(fmt, {"count": 0, "bytes": 0, "seconds": 0.0})
+        stats["count"] += 1
+        stats["bytes"] += size
+        stats["seconds"] += seconds
+
+
+def _quantize(image, colors):
+    """量化为自适应调色板（不抖动，保持色块边缘清晰）。"""
+    return image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+
+
+def encode_image(image, encoding=None):
+    """按 encoding 指定的格式将图像编码为字节流（默认 RGB PNG）。"""
+    encoding = normalize_encoding(encoding)
+    fmt = encoding["format"]
+    start = time.perf_counter()
     img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='PNG')
-    img_byte_arr = img_byte_arr.getvalue()
-    return img_byte_arr
+    if fmt == "png":
+        image.save(img_byte_arr, format='PNG', compress_level=encoding["compress_level"],
+                   compress_type=encoding["compress_type"])
+    elif fmt == "png_palette":
+        _quantize(image, encoding["palette_colors"]).save(
+            img_byte_arr, format='PNG', compress_level=encoding["compress_level"],
+            compress_type=encoding["compress_type"])
+    elif fmt == "webp":
+        image.save(img_byte_arr, format='WEBP', lossless=encoding["webp_lossless"],
+                   quality=encoding["webp_quality"])
+    else:
+        _quantize(image, encoding["palette_colors"]).save(img_byte_arr, format='GIF')
+    data = img_byte_arr.getvalue()
+    elapsed = time.perf_counter() - start
+    _record_encode(fmt, len(data), elapsed)
+    metrics.observe("encode", elapsed)
+    return data
+
+
+# --- 主渲染函数 --- (已调整以适应坐标)
+
+def render_board(game_state, cache=None, dirty_cells=None, encoding=None, viewport=None, overlay=None,
+                 generation=None):
+    """
+    将扫雷棋盘状态渲染为带坐标的图像字节流（格式由 encoding 决定，默认 PNG）。
+
+    viewport 为 (x0, y0, width, height) 时只渲染该区域，坐标标注保持棋盘上的实际编号，
+    用于大棋盘；默认渲染整个棋盘。
+    如果提供了 cache 且其中已有同一区域的上一帧，并且给出了 dirty_cells
+    (自上一帧以来变化的单元格)，则只重绘这些单元格；否则完整重绘。
+    overlay 为 {下标: 踩雷概率} 时在未揭开的格子上叠加概率热力图（不写入 cache）。
+    generation 为取得 game_state 时 cache 的代数（默认为当前代数）；此后缓存被丢弃过时，
+    这一帧按无缓存完整渲染，也不写入缓存。
+    """
+    start = metrics.start()
+    board_width = game_state["width"]
+    board_height = game_state["height"]
+    if viewport is None:
+        viewport = (0, 0, board_width, board_height)
+    region = clamp_viewport(viewport, board_width, board_height)
+    x0, y0, width, height = region
+    atlas = get_sprite_atlas()
+    if cache is not None:
+        if generation is None:
+            generation = cache.generation
+        elif generation != cache.generation:
+            cache = None
+
+    image = cache.image if cache is not None else None # 只读一次: 其他线程可能同时调用 invalidate()
+    if image is not None and cache.region == region and dirty_cells is not None:
+        for x, y in dirty_cells:
+            if x0 <= x < x0 + width and y0 <= y < y0 + height:
+                paste_game_cell(image, atlas, game_state, x, y, x0, y0)
+        if overlay is not None:
+            image = image.copy()
+            paste_heatmap(image, game_state, overlay, region)
+        metrics.record("render", start)
+        metrics.count("render_cache_hit")
+        return encode_image(image, encoding)
+
+    # 从缓存的坐标底图开始，逐格粘贴贴图
+    image = _base_image(width, height, x0, y0).copy()
+    for y in range(y0, y0 + height):
+        for x in range(x0, x0 + width):
+            paste_game_cell(image, atlas, game_state, x, y, x0, y0)
+
+    if cache is not None:
+        cache.store(image, region, generation)
+        metrics.count("render_cache_miss")
+    if overlay is not None:
+        if cache is not None:
+            image = image.copy()
+        paste_heatmap(image, game_state, overlay, region)
+    metrics.record("render", start)
+
+    # 将图像转换为字节流
+    return encode_image(image, encoding)
+
+
+# --- 全局缩略图 ---
+# 大棋盘无法在一张图中看清每个格子，缩略图以每格若干像素的纯色块展示全局局势。
+
+OVERVIEW_MAX_SIDE = 600 # 缩略图最长边的像素上限
+OVERVIEW_MAX_CELL_PX = 8
+VIEWPORT_OUTLINE_COLOR = (0, 90, 255)
+# 调色板下标: 0-8 已揭开 (数字), 9 已揭开的地雷, 10 旗帜, 11 未揭开, 12 视口边框
+_OVERVIEW_FLAG = 10
+_OVERVIEW_HIDDEN = 11
+_OVERVIEW_OUTLINE = 12
+
+
+@functools.lru_cache(maxsize=1)
+def _overview_palette():
+    colors = [REVEALED_COLOR]
+    colors += [NUMBER_COLORS[str(n)] for n in range(1, 9)]
+    colors += [MINE_COLOR, FLAG_COLOR, HIDDEN_COLOR, VIEWPORT_OUTLINE_COLOR]
+    return [channel for color in colors for channel in color]
+
+
+def render_overview(game_state, viewport=None, encoding=None, max_side=OVERVIEW_MAX_SIDE):
+    """
+    渲染整个棋盘的缩略图，每格为一个纯色块（不含坐标和文字）。
+
+    如果给出 viewport，则用边框标出当前视口的位置。
+    """
+    width = game_state["width"]
+    height = game_state["height"]
+    cell_px = max(1, min(OVERVIEW_MAX_CELL_PX, max_side // max(width, height)))
+    codes = bytes(
+        value if is_revealed else (_OVERVIEW_FLAG if is_flagged else _OVERVIEW_HIDDEN)
+        for value, is_revealed, is_flagged in zip(
+            game_state["cells"], game_state["revealed_mask"], game_state["flagged_mask"])
+    )
+    image = Image.frombytes('P', (width, height), codes)
+    image.putpalette(_overview_palette())
+    image = image.resize((width * cell_px, height * cell_px), Image.Resampling.NEAREST)
+    if viewport is not None:
+        x0, y0, view_width, view_height = clamp_viewport(viewport, width, height)
+        ImageDraw.Draw(image).rectangle(
+            [x0 * cell_px, y0 * cell_px, (x0 + view_width) * cell_px - 1, (y0 + view_height) * cell_px - 1],
+            outline=_OVERVIEW_OUTLINE, width=max(1, cell_px // 2))
+    return encode_image(image.convert('RGB'), encoding)
@@ -0,0 +1,177 @@
+"""
+对局回放动画: 由种子和走子记录逐步重建对局，生成 GIF 或 WebP 动画。
+
+- 帧由生成器逐个产生: 每帧只执行一步（步数超过 max_frames 时合并相邻的几步），并只重绘变化的格子。
+- GIF 流式写出: 每帧只编码变化格子所在的矩形区域，内存只占一张画布和已写出的字节，与对局长度无关。
+- WebP 由写好的 GIF 逐帧解码后转换，同样只需要一帧画布。
+- 画布为调色板 (P) 模式，贴图预先转换到同一调色板，绘制和编码时都不需要再量化。
+
+与 renderer.py 一样依赖 Pillow，在第一次回放时才导入，由渲染池在事件循环之外调用。
+"""
+import io
+
+from PIL import GifImagePlugin, Image
+
+from . import metrics
+from .game import MinesweeperGame
+from .render_common import REPLAY_FORMATS
+from .renderer import (_OVERVIEW_FLAG, _OVERVIEW_HIDDEN, CELL_SIZE, COORD_MARGIN, OVERVIEW_MAX_CELL_PX,
+                       OVERVIEW_MAX_SIDE, _base_image, _overview_palette, get_sprite_atlas, paste_game_cell)
+
+FRAME_MS = 300 # 每帧的显示时长
+FINAL_FRAME_MS = 3000 # 终局画面的停留时长
+MAX_FRAMES = 300 # 帧数上限，步数更多时把相邻的几步合并为一帧，使耗时和体积有上限
+SPRITE_MAX_SIDE = 30 # 长宽都不超过此格数的棋盘按图片样式回放，更大的棋盘按缩略图样式（纯色块）回放
+
+_sprite_assets = None # (贴图集, 调色板贴图集, 调色板图像)，字体变化后贴图集重建时随之更新
+
+
+def _palette_sprites():
+    """返回转换到同一调色板的贴图集和调色板图像。调色板由所有贴图和坐标底图的颜色量化而来。"""
+    global _sprite_assets
+    atlas = get_sprite_atlas()
+    if _sprite_assets is None or _sprite_assets[0] is not atlas:
+        base = _base_image(10, 1)
+        sample = Image.new('RGB', (base.width + len(atlas) * (CELL_SIZE + 1), base.height), color='white')
+        sample.paste(base, (0, 0))
+        for i, sprite in enumerate(atlas.values()):
+            sample.paste(sprite, (base.width + i * (CELL_SIZE + 1), 0))
+        palette = sample.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        converted = {key: sprite.quantize(palette=palette, dither=Image.Dither.NONE) for key, sprite in atlas.items()}
+        _sprite_assets = (atlas, converted, palette)
+    return _sprite_assets[1], _sprite_assets[2]
+
+
+class _SpriteCanvas:
+    """图片样式的回放画布: 与 render_board 相同的贴图和坐标。"""
+
+    def __init__(self, game_state):
+        width = game_state["width"]
+        height = game_state["height"]
+        self.atlas, palette = _palette_sprites()
+        self.image = _base_image(width, height).quantize(palette=palette, dither=Image.Dither.NONE)
+        for y in range(height):
+            for x in range(width):
+                paste_game_cell(self.image, self.atlas, game_state, x, y)
+
+    def paint(self, game_state, dirty_cells):
+        """重绘变化的格子，返回它们在画布上的外接矩形 (左, 上, 右, 下)。"""
+        for x, y in dirty_cells:
+            paste_game_cell(self.image, self.atlas, game_state, x, y)
+        xs = [x for x, _ in dirty_cells]
+        ys = [y for _, y in dirty_cells]
+        # 贴图含右侧和下方的边框线，比单元格多 1 像素（棋盘最右、最下一格的边框在画布之外）
+        return (COORD_MARGIN + min(xs) * CELL_SIZE, COORD_MARGIN + min(ys) * CELL_SIZE,
+                min(COORD_MARGIN + (max(xs) + 1) * CELL_SIZE + 1, self.image.width),
+                min(COORD_MARGIN + (max(ys) + 1) * CELL_SIZE + 1, self.image.height))
+
+
+class _BlockCanvas:
+    """缩略图样式的回放画布: 每格一个纯色块，用于大棋盘（配色与 /扫雷 zoom 相同）。"""
+
+    def __init__(self, game_state):
+        width = game_state["width"]
+        height = game_state["height"]
+        self.cell_px = max(1, min(OVERVIEW_MAX_CELL_PX, OVERVIEW_MAX_SIDE // max(width, height)))
+        self.image = Image.new('P', (width * self.cell_px, height * self.cell_px), _OVERVIEW_HIDDEN)
+        self.image.putpalette(_overview_palette())
+        self.paint(game_state, [(x, y) for y in range(height) for x in range(width)
+                                if self._code(game_state, y * width + x) != _OVERVIEW_HIDDEN])
+
+    @staticmethod
+    def _code(game_state, index):
+        if game_state["revealed_mask"][index]:
+            return game_state["cells"][index]
+        return _OVERVIEW_FLAG if game_state["flagged_mask"][index] else _OVERVIEW_HIDDEN
+
+    def paint(self, game_state, dirty_cells):
+        """重绘变化的格子，返回它们在画布上的外接矩形 (左, 上, 右, 下)。"""
+        width = game_state["width"]
+        px = self.cell_px
+        for x, y in dirty_cells:
+            self.image.paste(self._code(game_state, y * width + x), (x * px, y * px, (x + 1) * px, (y + 1) * px))
+        if not dirty_cells:
+            return (0, 0, px, px)
+        xs = [x for x, _ in dirty_cells]
+        ys = [y for _, y in dirty_cells]
+        return (min(xs) * px, min(ys) * px, (max(xs) + 1) * px, (max(ys) + 1) * px)
+
+
+def iter_frames(game, max_frames=MAX_FRAMES):
+    """
+    逐帧产生 (画布, 变化区域)。画布是同一张原地更新的 P 模式图像，变化区域为 (左, 上, 右, 下)。
+
+    第一帧为开局画面，变化区域为整张画布；之后每帧执行一步或合并的几步，没有变化的步不产生帧。
+    """
+    step = max(1, -(-len(game.move_log) // max(1, max_frames - 1))) # 向上取整
+    states = game.iter_replay(step)
+    replayed = next(states)
+    replayed.take_dirty_cells()
+    canvas_type = _SpriteCanvas if max(game.width, game.height) <= SPRITE_MAX_SIDE else _BlockCanvas
+    canvas = canvas_type(replayed.get_state())
+    yield canvas.image, (0, 0) + canvas.image.size
+    for replayed in states:
+        dirty_cells = replayed.take_dirty_cells()
+        if dirty_cells:
+            yield canvas.image, canvas.paint(replayed.get_state(), dirty_cells)
+
+
+def encode_gif(frames, frame_ms=FRAME_MS, final_ms=FINAL_FRAME_MS):
+    """
+    把 iter_frames() 产生的帧流式编码为循环播放的 GIF，返回 (字节流, 帧数)。
+
+    每帧只编码变化区域，叠加在上一帧之上；最后一帧停留 final_ms 毫秒。
+    """
+    output = io.BytesIO()
+    pending = None # 上一帧的 (区域图像, 位置)，知道是否为最后一帧后才写出
+    count = 0
+    for image, box in frames:
+        if pending is None:
+            header, _ = GifImagePlugin.getheader(image.copy(), info={"loop": 0, "optimize": False})
+            for part in header:
+                output.write(part)
+        else:
+            _write_gif_frame(output, *pending, frame_ms)
+        pending = (image.crop(box), box[:2])
+        count += 1
+    if pending is None:
+        raise ValueError("没有可编码的帧。")
+    _write_gif_frame(output, *pending, final_ms)
+    output.write(b";") # GIF 结束标记
+    return output.getvalue(), count
+
+
+def _write_gif_frame(output, image, offset, duration):
+    for part in GifImagePlugin.getdata(image, offset=offset, duration=duration):
+        output.write(part)
+
+
+def gif_to_webp(gif_bytes, count, frame_ms=FRAME_MS, final_ms=FINAL_FRAME_MS):
+    """
+    把 encode_gif() 的结果逐帧转换为无损 WebP 动画。
+
+    只有第一帧为关键帧 (kmax=0)，其余帧只编码与上一帧的差异；
+    聊天中的动画从头播放，不需要随机定位，这样编码快一倍以上，体积也小得多。
+    """
+    output = io.BytesIO()
+    with Image.open(io.BytesIO(gif_bytes)) as animation:
+        animation.save(output, format='WEBP', save_all=True, lossless=True, quality=0, method=0, kmax=0, loop=0,
+                       duration=[frame_ms] * (count - 1) + [final_ms])
+    return output.getvalue()
+
+
+def render_replay(snapshot, fmt="gif", max_frames=MAX_FRAMES, frame_ms=FRAME_MS):
+    """
+    由 MinesweeperGame.to_bytes() 快照生成整局的回放动画，返回图像字节流。
+
+    参数和返回值都是字节，可以在进程池中执行。对局没有走子记录时抛出 ValueError。
+    """
+    if fmt not in REPLAY_FORMATS:
+        raise ValueError(f"不支持的回放格式: {fmt}。可选: {', '.join(REPLAY_FORMATS)}")
+    start = metrics.start()
+    game = MinesweeperGame.from_bytes(snapshot)
+    data, count = encode_gif(iter_frames(game, max_frames), frame_ms)
+    if fmt == "webp":
+        data = gif_to_webp(data, count, frame_ms)
+    metrics.record("replay", start)
+    return data
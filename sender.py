@@ -0,0 +1,37 @@
+import time
+
+
+class SendLimiter:
+    """
+    按会话限制发送棋盘图片的频率（令牌桶）。
+
+    每个会话每秒补充 rate 个令牌，最多积累 burst 个，每发送一帧消耗一个。
+    令牌不足时先回复文字，等到有令牌时再发送最新的棋盘，等待期间的走子都合并到这一帧中。
+    rate 为 0 时不限制频率（仍会合并渲染期间的走子）。
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 3):
+        if rate < 0 or burst < 1:
+            raise ValueError("发送频率不能为负数，突发上限必须至少为 1。")
+        self.rate = rate
+        self.burst = burst
+        # 统计
+        self.sent = 0 # 发送的图片帧数
+        self.dropped = 0 # 没有单独发图、合并到后续帧中的走子数
+        self.throttled = 0 # 因限流而等待的次数
+
+    def delay(self, session) -> float:
+        """该会话距离可以发送下一帧还需等待的秒数，可以立即发送时为 0。"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        tokens = min(self.burst, session.send_tokens + (now - session.send_updated) * self.rate)
+        session.send_tokens = tokens
+        session.send_updated = now
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def consume(self, session):
+        """记录该会话发送了一帧。"""
+        if self.rate:
+            session.send_tokens -= 1
+        self.sent += 1
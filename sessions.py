@@ -0,0 +1,224 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .game import MinesweeperGame
+from .multiplayer import Scoreboard
+from .render_common import RenderCache
+from .storage import StoreWriter
+from .text_renderer import TextCache
+
+
+class Session:
+    """
+    一个会话的游戏及其渲染状态。
+
+    同一棋盘上的走子不需要加锁: 命令处理器从查找会话、校验坐标到走子、计分和标记保存都是同步代码，
+    中间没有 await，在事件循环中不会与其他玩家的处理器交错。只有发送棋盘会让出事件循环，
+    这期间的并发由 rendering / frame_stale 合并为一帧；在校验与走子之间加入 await 前需要重新考虑这一点。
+    """
+    __slots__ = ("game", "render_cache", "viewport", "last_access", "scoreboard", "rendering", "frame_stale",
+                 "send_tokens", "send_updated", "render_mode", "text_cache", "player", "analysis")
+
+    def __init__(self, game: MinesweeperGame, viewport=None):
+        self.game = game
+        self.render_cache = RenderCache()
+        self.viewport = viewport # 大棋盘当前显示的视口 (x0, y0, width, height)，完整显示时为 None
+        self.last_access = time.monotonic()
+        self.scoreboard: Optional[Scoreboard] = None # 多人模式的计分板，单人游戏为 None
+        self.rendering = False # 是否有一帧正在渲染或发送
+        self.frame_stale = False # 渲染期间是否又有新的走子，需要再发一帧
+        self.send_tokens = float("inf") # 发图限流的令牌数，首次使用时截断为突发上限
+        self.send_updated = 0.0
+        self.render_mode: Optional[str] = None # 本会话的显示方式，None 表示使用插件配置
+        self.text_cache = TextCache()
+        self.player: Optional[Tuple[str, str]] = None # 单人游戏的开局玩家 (ID, 昵称)，本局计入其战绩；有其他人走子后为 None
+        self.analysis = None # 最近一次求解的结果 (solver.Analysis)，局面变化后过期
+
+
+def estimate_session_bytes(session: Session) -> int:
+    """粗略估计会话占用的内存：棋盘数组 + 缓存的上一帧图像。"""
+    game = session.game
+    size = len(game.cells) * 3 + len(game.mine_indices) * 4 + len(game.dirty_cells) * 72
+    image = session.render_cache.image
+    if image is not None:
+        size += image.width * image.height * len(image.getbands())
+    return size
+
+
+class SessionManager:
+    """
+    管理各会话的活动游戏，取代裸字典。
+
+    - 空闲超过 idle_ttl 秒的会话会被清理；
+    - 常驻会话数超过 max_sessions 时按 LRU 淘汰；
+    - 估计内存超过 memory_budget 字节时按 LRU 淘汰直到低于预算；
+    - 有对局存储且 spill_to_disk 为真时，被淘汰的未完成对局写入存储，
+      下次访问时懒加载回来；否则直接删除。
+    - 结束的对局保留快照（种子 + 走子记录，每局几十到几百字节）供 /扫雷 replay 回放，
+      最多保留 max_replays 个会话，只保存在内存中。
+    """
+
+    def __init__(self, store_writer: Optional[StoreWriter] = None, idle_ttl: float = 3600.0,
+                 max_sessions: int = 1000, memory_budget: int = 256 * 1024 * 1024,
+                 spill_to_disk: bool = True, sweep_interval: float = 60.0,
+                 viewport_factory: Optional[Callable[[MinesweeperGame], Optional[tuple]]] = None,
+                 max_replays: int = 1000):
+        self.store_writer = store_writer
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.spill_to_disk = spill_to_disk
+        self.sweep_interval = sweep_interval
+        self.viewport_factory = viewport_factory
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict() # 按最近访问排序，最久未用的在前
+        self._sweeper: Optional[asyncio.Task] = None
+        self.max_replays = max_replays
+        self._finished: "OrderedDict[str, bytes]" = OrderedDict() # 会话 -> 最近一局结束的对局快照
+        # 统计
+        self.stats: Dict[str, int] = {
+            "evicted_idle": 0,
+            "evicted_lru": 0,
+            "evicted_memory": 0,
+            "spilled": 0,
+            "loaded": 0,
+        }
+
+    @property
+    def resident(self) -> int:
+        """常驻内存的会话数。"""
+        return len(self._sessions)
+
+    def session(self, session_id: str) -> Optional[Session]:
+        """获取会话（刷新其访问时间）。重启或被淘汰后首次访问时从存储中懒加载。"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+        if self.store_writer is None:
+            return None
+        game = self.store_writer.load_game(session_id)
+        if game is None:
+            return None
+        if game.game_over:
+            # 游戏结束后、删除写入前进程退出留下的快照
+            self.store_writer.mark_deleted(session_id)
+            return None
+        self.stats["loaded"] += 1
+        return self._register(session_id, game)
+
+    def get(self, session_id: str) -> Optional[MinesweeperGame]:
+        """获取会话的活动游戏（如果存在）。"""
+        session = self.session(session_id)
+        return session.game if session is not None else None
+
+    def add(self, session_id: str, game: MinesweeperGame) -> Session:
+        """登记新游戏并立即安排保存。"""
+        session = self._register(session_id, game)
+        self.save(session_id, game)
+        return session
+
+    def _register(self, session_id: str, game: MinesweeperGame) -> Session:
+        viewport = self.viewport_factory(game) if self.viewport_factory else None
+        session = Session(game, viewport)
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        self._ensure_sweeper()
+        while len(self._sessions) > self.max_sessions:
+            self._evict_oldest("evicted_lru")
+        return session
+
+    def save(self, session_id: str, game: MinesweeperGame):
+        """标记会话的游戏需要保存（批量、延迟写入，不阻塞走子）。"""
+        if self.store_writer is not None:
+            self.store_writer.mark_dirty(session_id, game)
+
+    def is_current(self, session_id: str, session: Session) -> bool:
+        """session 是否仍是该会话当前登记（常驻内存）的游戏。不会从存储中加载。"""
+        return self._sessions.get(session_id) is session
+
+    def end(self, session_id: str, session: Session):
+        """
+        结束并移除会话的游戏，保留可回放对局的快照。
+
+        只有 session 仍是该会话当前登记的游戏时才移除: 合并帧时较晚返回的处理器可能在
+        会话已开始新的一局（或这一局已被淘汰）之后才调用，此时什么也不做，不会误删新的对局。
+        """
+        if not self.is_current(session_id, session):
+            return
+        del self._sessions[session_id]
+        if session.game.replayable and session.game.move_log and self.max_replays:
+            self._finished[session_id] = session.game.to_bytes()
+            self._finished.move_to_end(session_id)
+            while len(self._finished) > self.max_replays:
+                self._finished.popitem(last=False)
+        if self.store_writer is not None:
+            self.store_writer.mark_deleted(session_id)
+
+    def last_finished(self, session_id: str) -> Optional[bytes]:
+        """会话中最近一局结束的对局快照（MinesweeperGame.to_bytes() 格式），没有时为 None。"""
+        return self._finished.get(session_id)
+
+    # --- 淘汰 ---
+
+    def _evict(self, session_id: str, reason: str):
+        session = self._sessions.pop(session_id)
+        self.stats[reason] += 1
+        if self.store_writer is not None:
+            if self.spill_to_disk and not session.game.game_over:
+                self.store_writer.mark_dirty(session_id, session.game)
+                self.stats["spilled"] += 1
+            else:
+                self.store_writer.mark_deleted(session_id)
+
+    def _evict_oldest(self, reason: str):
+        self._evict(next(iter(self._sessions)), reason)
+
+    def sweep(self):
+        """执行一次清理：空闲超时、数量上限、内存预算。返回本次淘汰的会话数。"""
+        evicted = 0
+        deadline = time.monotonic() - self.idle_ttl
+        # 按访问时间排序，遇到第一个未超时的会话即可停止
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access > deadline:
+                break
+            self._evict(session_id, "evicted_idle")
+            evicted += 1
+        while len(self._sessions) > self.max_sessions:
+            self._evict_oldest("evicted_lru")
+            evicted += 1
+        if self.memory_budget > 0:
+            usage = self.memory_usage()
+            while self._sessions and usage > self.memory_budget:
+                usage -= estimate_session_bytes(next(iter(self._sessions.values())))
+                self._evict_oldest("evicted_memory")
+                evicted += 1
+        return evicted
+
+    def memory_usage(self) -> int:
+        """所有常驻会话的估计内存（字节）。"""
+        return sum(estimate_session_bytes(session) for session in self._sessions.values())
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            try:
+                self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+            except RuntimeError:
+                pass # 没有运行中的事件循环（例如离线脚本），不启动后台清理
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    async def close(self):
+        """停止后台清理，并写入尚未保存的对局。"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        if self.store_writer is not None:
+            await self.store_writer.close()
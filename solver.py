@@ -0,0 +1,526 @@
+"""
+扫雷求解器: 根据玩家可见的信息（已揭开的数字）推断安全格、地雷和每格的踩雷概率。
+
+求解分两步:
+1. 约束传播: 单格规则（剩余雷数为 0 或等于未知格数）与两两约束的差集规则，速度快，能解决大部分局面；
+2. 精确枚举: 对传播后剩下的边界格按约束连通分量分别回溯枚举，再结合全局剩余雷数加权，
+   得到精确的概率。分量过大时退化为近似概率。
+
+求解器不使用玩家插的旗（旗可能插错），只依据已揭开的格子。
+"""
+import math
+import weakref
+
+from .game import MINE
+
+# 单个边界分量允许精确枚举的最大格数和最大搜索节点数，超过时使用近似概率
+ENUM_MAX_CELLS = 48
+ENUM_MAX_NODES = 200_000
+# 按剩余雷数精确组合的最大分量数，超过时各分量按统一的雷密度独立加权（近似）
+COUPLED_MAX_COMPONENTS = 500
+MAX_LOG_ODDS = 10.0 # 统一雷密度的对数几率范围 [-10, 10]
+BALANCE_STEPS = 30
+NEGLIGIBLE = 1e-30 # 组合雷数分布时忽略的相对概率
+
+
+class _EnumerationLimit(Exception):
+    pass
+
+
+class Analysis:
+    """一次求解的结果。下标均为 y * width + x。"""
+    __slots__ = ("revision", "safe", "mines", "probabilities", "other_probability", "exact", "heatmap")
+
+    def __init__(self, revision, safe, mines, probabilities, other_probability, exact):
+        self.revision = revision # 求解时已揭开的格子数，用于判断结果是否过期
+        self.safe = safe # 确定安全但尚未揭开的格子
+        self.mines = mines # 确定是雷的格子
+        self.probabilities = probabilities # 边界上未确定格子的踩雷概率
+        self.other_probability = other_probability # 不与任何数字相邻的未知格子的踩雷概率
+        self.exact = exact # 为 False 时部分概率是近似值
+        self.heatmap = None # 所有未揭开格子的概率 {下标: 概率}，由 Solver.heatmap() 按需生成
+
+    def probability(self, index):
+        """未揭开格子的踩雷概率（已揭开的格子不应传入）。"""
+        if index in self.safe:
+            return 0.0
+        if index in self.mines:
+            return 1.0
+        return self.probabilities.get(index, self.other_probability)
+
+
+class Solver:
+    """
+    绑定到一局游戏的求解器。
+
+    通过游戏的 reveal_order 增量维护边界（与未知格相邻的已揭开数字格）和已推断出的
+    安全格/地雷，每次求解只处理上次之后新揭开的格子和当前边界，而不是扫描整个棋盘。
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.frontier = set() # 与未确定格子相邻的已揭开数字格
+        self.known_safe = set() # 推断为安全、尚未揭开的格子
+        self.known_mines = set() # 推断为地雷的格子
+        self._seen = 0 # 已处理的 reveal_order 长度
+        self._analysis = None
+
+    def update(self):
+        """处理自上次以来新揭开的格子。"""
+        order = self.game.reveal_order
+        if self._seen == len(order):
+            return
+        cells = self.game.cells
+        frontier = self.frontier
+        known_safe = self.known_safe
+        for i in order[self._seen:]:
+            known_safe.discard(i)
+            if 0 < cells[i] < MINE:
+                frontier.add(i)
+        self._seen = len(order)
+
+    def _constraints(self):
+        """由边界生成约束 {未知格集合: 其中的雷数}，同时移除已无未知邻格的边界格。"""
+        cells = self.game.cells
+        revealed = self.game.revealed_mask
+        neighbors = self.game.neighbors
+        known_safe = self.known_safe
+        known_mines = self.known_mines
+        constraints = {}
+        resolved = []
+        for i in self.frontier:
+            unknown = []
+            need = cells[i]
+            for j in neighbors[i]:
+                if j in known_mines:
+                    need -= 1
+                elif not revealed[j] and j not in known_safe:
+                    unknown.append(j)
+            if unknown:
+                constraints[frozenset(unknown)] = need
+            else:
+                resolved.append(i)
+        self.frontier.difference_update(resolved)
+        return constraints
+
+    def _mark(self, safe, mines):
+        self.known_safe.update(safe)
+        self.known_mines.update(mines)
+
+    def propagate(self):
+        """反复应用单格规则和两两约束规则直到没有新结论，返回剩余的约束。"""
+        while True:
+            constraints = self._constraints()
+            safe = set()
+            mines = set()
+            for unknown, need in constraints.items():
+                if need == 0:
+                    safe.update(unknown)
+                elif need == len(unknown):
+                    mines.update(unknown)
+            if not safe and not mines:
+                self._pair_rule(constraints, safe, mines)
+            if not safe and not mines:
+                return constraints
+            self._mark(safe, mines)
+
+    @staticmethod
+    def _pair_rule(constraints, safe, mines):
+        """
+        两两约束: 设 A、B 有公共格，a = A - B、b = B - A。
+        若 need(A) - need(B) == |a|，则 a 全是雷、b 全部安全（子集规则是 a 为空的特例）。
+        """
+        by_cell = {}
+        for unknown in constraints:
+            for j in unknown:
+                by_cell.setdefault(j, []).append(unknown)
+        for first, need_first in constraints.items():
+            checked = set()
+            for j in first:
+                for second in by_cell[j]:
+                    if second is first or second in checked:
+                        continue
+                    checked.add(second)
+                    only_first = first - second
+                    if need_first - constraints[second] == len(only_first):
+                        mines.update(only_first)
+                        safe.update(second - first)
+        safe.difference_update(mines) # 局面矛盾时（理论上不会发生）不给出错误结论
+
+    def analyze(self):
+        """求解当前局面并返回 Analysis。结果按已揭开的格子数缓存，局面未变时直接返回。"""
+        self.update()
+        revision = len(self.game.reveal_order)
+        if self._analysis is not None and self._analysis.revision == revision:
+            return self._analysis
+        constraints = self.propagate()
+        probabilities, other_probability, exact = self._probabilities(constraints)
+        self._analysis = Analysis(revision, frozenset(self.known_safe), frozenset(self.known_mines),
+                                  probabilities, other_probability, exact)
+        return self._analysis
+
+    def heatmap(self):
+        """返回所有未揭开格子的踩雷概率 {下标: 概率}，用于渲染热力图。与分析结果一起按局面缓存。"""
+        analysis = self.analyze()
+        if analysis.heatmap is None:
+            revealed = self.game.revealed_mask
+            probability = analysis.probability
+            analysis.heatmap = {i: probability(i) for i in range(len(revealed)) if not revealed[i]}
+        return analysis.heatmap
+
+    def safe_cells(self):
+        """返回确定安全的格子。传播即可得出结论时不做枚举（用于无猜局面的生成）。"""
+        self.update()
+        self.propagate()
+        if not self.known_safe:
+            self.analyze()
+        return self.known_safe
+
+    # --- 精确枚举 ---
+
+    def _probabilities(self, constraints):
+        """枚举剩余约束，把确定的结论并入已知集合，返回 (边界概率, 其余格子概率, 是否精确)。"""
+        game = self.game
+        revealed = game.revealed_mask
+        remaining = game.mines_count - len(self.known_mines)
+        constrained = set().union(*constraints) if constraints else set()
+        others = [i for i in range(game.width * game.height)
+                  if not revealed[i] and i not in constrained
+                  and i not in self.known_safe and i not in self.known_mines]
+        n_other = len(others)
+
+        components = []
+        probabilities = {}
+        exact = True
+        for cells, component in _components(constraints):
+            if len(cells) <= ENUM_MAX_CELLS:
+                try:
+                    components.append((cells, _enumerate(cells, component)))
+                    continue
+                except _EnumerationLimit:
+                    pass
+            # 近似: 每格取其所在约束的平均雷密度
+            exact = False
+            for j in cells:
+                densities = [need / len(unknown) for unknown, need in component if j in unknown]
+                probabilities[j] = sum(densities) / len(densities)
+
+        if not exact:
+            remaining -= round(sum(probabilities.values()))
+        # 各分量的局部解 [(雷数, 解的个数, 每格为雷的解的个数)]
+        solutions = [[(k, n, sums) for k, (n, sums) in distribution.items()] for _, distribution in components]
+        log_odds = _balance(solutions, n_other, remaining)
+        if len(components) > COUPLED_MAX_COMPONENTS:
+            return self._independent(components, solutions, probabilities, log_odds, n_other)
+
+        # 按剩余雷数把各分量与其余格子组合起来。为避免大整数运算，各分量的雷数分布按 log_odds 倾斜后
+        # 归一化为概率分布，其余格子的雷数取同一密度下的二项分布；这只是对所有组合乘以同一个常数，不改变结果。
+        # 是否可能（确定的结论）另用位集精确判断，不受浮点误差影响。
+        distributions = []
+        for component in solutions:
+            scale = sum(n * math.exp(k * log_odds) for k, n, _ in component)
+            distributions.append({k: n * math.exp(k * log_odds) / scale for k, n, _ in component})
+        # prefixes[i]: 前 i 个分量的雷数分布；reachable[i]: 其可能取到的雷数（位集）
+        prefixes = [{0: 1.0}]
+        reachable = [1]
+        for distribution in distributions:
+            prefixes.append(_trim(_convolve(prefixes[-1], distribution)))
+            bits = 0
+            for k in distribution:
+                bits |= reachable[-1] << k
+            reachable.append(bits)
+        # suffix[s]: 前面的分量共放 s 个雷时，后面的分量与其余格子放下剩余雷数的概率；
+        # allowed: 使之可能的 s（位集）
+        totals = prefixes[-1]
+        suffix = {s: _binomial_probability(n_other, remaining - s, log_odds) for s in totals}
+        allowed = 0
+        if remaining >= 0:
+            allowed = (1 << remaining + 1) - (1 << max(remaining - n_other, 0))
+        feasible_totals = reachable[-1] & allowed
+        if not feasible_totals:
+            # 剩余雷数与可见信息矛盾（仅在近似时可能出现），退化为均匀概率
+            unknown_count = n_other + len(constrained)
+            uniform = remaining / unknown_count if unknown_count else 0.0
+            for cells, _ in components:
+                for j in cells:
+                    probabilities[j] = uniform
+            return probabilities, uniform, False
+        total = sum(p * suffix[s] for s, p in totals.items())
+        if total == 0.0:
+            return self._independent(components, solutions, probabilities, log_odds, n_other)
+        other_probability = 0.0
+        if n_other:
+            # 其余每格为雷的概率 = 其余格子的期望雷数 / 格数
+            other_probability = sum(p * suffix[s] * (remaining - s) for s, p in totals.items()) / total / n_other
+
+        # 从后往前处理各分量: 前缀分布与后缀概率相乘即得"除本分量外"的权重，总工作量与分量数成线性
+        safe = []
+        mines = []
+        for index in range(len(components) - 1, -1, -1):
+            cells, _ = components[index]
+            distribution = distributions[index]
+            prefix = prefixes[index]
+            before = reachable[index]
+            numerators = [0.0] * len(cells)
+            possible = []
+            for k, n, sums in solutions[index]:
+                if not exact or (before << k) & allowed:
+                    possible.append((n, sums))
+                weight = sum(p * suffix.get(s + k, 0.0) for s, p in prefix.items())
+                if weight:
+                    weight *= distribution[k] / n
+                    for position, mine_count in enumerate(sums):
+                        numerators[position] += mine_count * weight
+            suffix = _trim({s: sum(p * suffix.get(s + k, 0.0) for k, p in distribution.items()) for s in prefix})
+            bits = 0
+            for k in distribution:
+                bits |= allowed >> k
+            allowed = bits
+            # 精确时只看全局可能的局部解；剩余雷数只是估计值时，确定的结论只能来自分量内部
+            for position, j in enumerate(cells):
+                if all(sums[position] == 0 for _, sums in possible):
+                    safe.append(j)
+                elif all(sums[position] == n for n, sums in possible):
+                    mines.append(j)
+                else:
+                    probabilities[j] = numerators[position] / total
+
+        if n_other and exact:
+            if feasible_totals == 1 << remaining:
+                safe.extend(others)
+            elif remaining >= n_other and feasible_totals == 1 << remaining - n_other:
+                mines.extend(others)
+        self._mark(safe, mines)
+        return probabilities, other_probability, exact
+
+    def _independent(self, components, solutions, probabilities, log_odds, n_other):
+        """
+        分量太多时的近似: 不再按剩余雷数把各分量组合起来，而是取统一的雷密度（见 _balance），
+        每个分量的局部解按该密度独立加权，其余格子的概率即为该密度。确定的结论只来自各分量内部。
+        """
+        safe = []
+        mines = []
+        for (cells, _), component in zip(components, solutions):
+            total = 0.0
+            numerators = [0.0] * len(cells)
+            for k, n, sums in component:
+                weight = math.exp(k * log_odds)
+                total += n * weight
+                for position, mine_count in enumerate(sums):
+                    numerators[position] += mine_count * weight
+            for position, j in enumerate(cells):
+                if all(sums[position] == 0 for _, _, sums in component):
+                    safe.append(j)
+                elif all(sums[position] == n for _, n, sums in component):
+                    mines.append(j)
+                else:
+                    probabilities[j] = numerators[position] / total
+        self._mark(safe, mines)
+        return probabilities, 1.0 / (1.0 + math.exp(-log_odds)) if n_other else 0.0, False
+
+
+def _balance(solutions, n_other, remaining):
+    """
+    求统一的雷密度（对数几率）: 各分量的局部解按 e ** (对数几率 * 雷数) 加权、其余格子取同一密度时，
+    期望总雷数等于剩余雷数。二分求解。
+    """
+    def expected_mines(log_odds):
+        expected = n_other / (1.0 + math.exp(-log_odds))
+        for component in solutions:
+            total = mines = 0.0
+            for k, n, _ in component:
+                weight = n * math.exp(k * log_odds)
+                total += weight
+                mines += weight * k
+            expected += mines / total
+        return expected
+
+    low, high = -MAX_LOG_ODDS, MAX_LOG_ODDS
+    for _ in range(BALANCE_STEPS):
+        middle = (low + high) / 2
+        if expected_mines(middle) < remaining:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def _components(constraints):
+    """按公共格把约束分成互不相关的分量，返回 [(格子列表, [(未知格集合, 雷数)])]。"""
+    parent = {}
+
+    def find(j):
+        while parent[j] != j:
+            parent[j] = parent[parent[j]]
+            j = parent[j]
+        return j
+
+    for unknown in constraints:
+        cells = iter(unknown)
+        root = find(parent.setdefault(next(cells), next(iter(unknown))))
+        for j in cells:
+            other = find(parent.setdefault(j, j))
+            if other != root:
+                parent[other] = root
+    groups = {}
+    for unknown, need in constraints.items():
+        groups.setdefault(find(next(iter(unknown))), []).append((unknown, need))
+    result = []
+    for component in groups.values():
+        result.append((_search_order(component), component))
+    return result
+
+
+def _search_order(component):
+    """按约束的相邻关系广度优先排列格子，使约束尽早被填满，回溯时剪枝更多。"""
+    by_cell = {}
+    for unknown, _ in component:
+        for j in unknown:
+            by_cell.setdefault(j, []).append(unknown)
+    start = min(by_cell)
+    order = [start]
+    seen = {start}
+    position = 0
+    while position < len(order):
+        for unknown in by_cell[order[position]]:
+            for j in sorted(unknown):
+                if j not in seen:
+                    seen.add(j)
+                    order.append(j)
+        position += 1
+    return order
+
+
+def _enumerate(cells, component):
+    """
+    回溯枚举一个分量的所有合法布雷，返回 {雷数: (解的个数, 每格为雷的解的个数)}，后者与 cells 顺序对应。
+
+    只出现在同一组约束中的格子可以互换，把它们合为一组，枚举每组的雷数并按组合数计数，
+    而不是逐格枚举。搜索节点超过 ENUM_MAX_NODES 时抛出 _EnumerationLimit。
+    """
+    needs = [need for _, need in component]
+    membership = {}
+    for c, (unknown, _) in enumerate(component):
+        for j in unknown:
+            membership.setdefault(j, []).append(c)
+    groups = {} # 约束集合 -> 组内格子，按 cells 的搜索顺序排列
+    for j in cells:
+        groups.setdefault(tuple(membership[j]), []).append(j)
+    group_constraints = list(groups)
+    group_sizes = [len(members) for members in groups.values()]
+    count = len(group_sizes)
+    placed = [0] * len(component) # 每个约束已放置的雷数
+    unassigned = [len(unknown) for unknown, _ in component] # 每个约束尚未赋值的格子数
+    assignment = [0] * count
+    results = {}
+    nodes = 0
+
+    def search(position, mines, ways):
+        nonlocal nodes
+        if position == count:
+            entry = results.get(mines)
+            if entry is None:
+                entry = results[mines] = [0, [0] * count]
+            entry[0] += ways
+            sums = entry[1]
+            for g in range(count):
+                if assignment[g]:
+                    # 组内每格为雷的解数: ways * v / size，恒为整数
+                    sums[g] += ways * assignment[g] // group_sizes[g]
+            return
+        nodes += 1
+        if nodes > ENUM_MAX_NODES:
+            raise _EnumerationLimit()
+        constraint_ids = group_constraints[position]
+        size = group_sizes[position]
+        for c in constraint_ids:
+            unassigned[c] -= size
+        for value in range(size + 1):
+            if all(placed[c] + value <= needs[c] <= placed[c] + value + unassigned[c] for c in constraint_ids):
+                for c in constraint_ids:
+                    placed[c] += value
+                assignment[position] = value
+                search(position + 1, mines + value, ways * math.comb(size, value))
+                for c in constraint_ids:
+                    placed[c] -= value
+        for c in constraint_ids:
+            unassigned[c] += size
+        assignment[position] = 0
+
+    search(0, 0, 1)
+    position_of = {}
+    for g, members in enumerate(groups.values()):
+        for j in members:
+            position_of[j] = g
+    return {k: (total, [sums[position_of[j]] for j in cells]) for k, (total, sums) in results.items()}
+
+
+def _convolve(a, b):
+    result = {}
+    for i, x in a.items():
+        for j, y in b.items():
+            result[i + j] = result.get(i + j, 0) + x * y
+    return result
+
+
+def _trim(distribution):
+    """去掉相对最大项小于 NEGLIGIBLE 的项，它们对概率的影响远小于浮点误差。"""
+    if not distribution:
+        return distribution
+    cutoff = max(distribution.values()) * NEGLIGIBLE
+    return {k: p for k, p in distribution.items() if p > cutoff}
+
+
+def _binomial_probability(n, r, log_odds):
+    """n 格中每格以对数几率 log_odds 独立为雷时，恰有 r 个雷的概率。"""
+    if r < 0 or r > n:
+        return 0.0
+    log_p = -math.log1p(math.exp(-log_odds))
+    log_q = -math.log1p(math.exp(log_odds))
+    return math.exp(math.lgamma(n + 1) - math.lgamma(r + 1) - math.lgamma(n - r + 1) + r * log_p + (n - r) * log_q)
+
+
+# --- 对外接口 ---
+
+_solvers = weakref.WeakKeyDictionary()
+
+
+def solver_for(game):
+    """返回绑定到 game 的求解器（随游戏对象一起释放），多次求解共享增量状态和缓存。"""
+    solver = _solvers.get(game)
+    if solver is None:
+        solver = _solvers[game] = Solver(game)
+    return solver
+
+
+def analyze(game, heatmap=False):
+    """
+    求解 game 并返回 Analysis（不经过 solver_for 的缓存），heatmap 为真时同时生成热力图。
+    大棋盘上求解可能需要数秒，插件在渲染池中对游戏的副本调用它，不阻塞事件循环。
+    """
+    solver = Solver(game)
+    if heatmap:
+        solver.heatmap()
+    return solver.analyze()
+
+
+def is_solvable(game, start_x, start_y):
+    """
+    判断已布好雷的 game 能否从 (start_x, start_y) 开始不靠猜测解开。
+
+    在游戏的副本上模拟: 每一步揭开所有确定安全的格子，直到胜利或无法继续推断。
+    """
+    simulation = game.copy()
+    simulation.flagged_mask[:] = bytes(len(simulation.flagged_mask))
+    simulation.flag_count = simulation.correct_flag_count = 0
+    simulation.first_click = False
+    width = game.width
+    simulation.reveal_cell(start_x, start_y)
+    solver = Solver(simulation)
+    while not simulation.game_over:
+        safe = solver.safe_cells()
+        if not safe:
+            return False
+        for i in list(safe):
+            simulation.reveal_cell(i % width, i // width)
+    return simulation.won
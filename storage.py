@@ -0,0 +1,224 @@
+import asyncio
+import base64
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from .game import MinesweeperGame
+
+
+class GameStore:
+    """
+    对局快照存储的接口。键为会话 ID，值为 MinesweeperGame.to_bytes() 生成的快照。
+
+    所有方法都是同步的阻塞 I/O，由 StoreWriter 放到线程中调用。
+    """
+
+    def keys(self) -> Set[str]:
+        raise NotImplementedError
+
+    def load(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def write_batch(self, upserts: Dict[str, bytes], deletes: Iterable[str]):
+        """写入一批快照并删除一批键。"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileGameStore(GameStore):
+    """每个会话一个文件的本地存储（默认）。写入先写临时文件再原子替换，进程崩溃不会留下半个快照。"""
+
+    SUFFIX = ".msw"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # 会话 ID 可能包含路径分隔符等字符，使用可逆的 URL 安全 base64 作为文件名
+        name = base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii")
+        return os.path.join(self.directory, name + self.SUFFIX)
+
+    def keys(self) -> Set[str]:
+        keys = set()
+        for name in os.listdir(self.directory):
+            if name.endswith(self.SUFFIX):
+                try:
+                    keys.add(base64.urlsafe_b64decode(name[:-len(self.SUFFIX)]).decode("utf-8"))
+                except ValueError:
+                    continue # 忽略无关文件
+        return keys
+
+    def load(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_batch(self, upserts: Dict[str, bytes], deletes: Iterable[str]):
+        for key, data in upserts.items():
+            path = self._path(key)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        for key in deletes:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+class SQLiteGameStore(GameStore):
+    """SQLite 存储。每批写入在一个事务中完成，崩溃时要么整批生效，要么整批丢弃。"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 连接会在 StoreWriter 的写线程与事件循环线程之间共用，由锁保证串行访问
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS games (session_id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def keys(self) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT session_id FROM games")}
+
+    def load(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM games WHERE session_id = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def write_batch(self, upserts: Dict[str, bytes], deletes: Iterable[str]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO games (session_id, data) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data",
+                upserts.items())
+            self._conn.executemany("DELETE FROM games WHERE session_id = ?", ((key,) for key in deletes))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORE_TYPES = ("file", "sqlite", "none")
+
+
+def create_store(kind: str, path: str) -> Optional[GameStore]:
+    """按类型创建存储。kind 为 'none' 时返回 None（不持久化）。"""
+    if kind == "file":
+        return FileGameStore(path)
+    if kind == "sqlite":
+        return SQLiteGameStore(os.path.join(path, "games.sqlite3"))
+    if kind == "none":
+        return None
+    raise ValueError(f"不支持的存储类型: {kind}。可选: {', '.join(STORE_TYPES)}")
+
+
+class StoreWriter:
+    """
+    以防抖、批量的方式把对局写入 GameStore。
+
+    走子时只调用 mark_dirty() 记录会话（O(1)，不做 I/O）；第一次标记后经过
+    flush_interval 秒，把这段时间内所有变化的对局序列化后在线程中一次写入。
+    进程崩溃最多丢失最近 flush_interval 秒内的走子。
+    """
+
+    def __init__(self, store: GameStore, flush_interval: float = 2.0):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.known_keys = store.keys() # 存储中已有的会话，用于判断是否需要懒加载
+        self._dirty: Dict[str, MinesweeperGame] = {}
+        self._deleted: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # 统计
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+
+    def load_game(self, key: str) -> Optional[MinesweeperGame]:
+        """从存储中读取会话的对局。快照损坏时丢弃并返回 None。"""
+        if key not in self.known_keys or key in self._deleted:
+            return None
+        pending = self._dirty.get(key)
+        if pending is not None:
+            return pending # 尚未写入的对局（例如刚被换出内存）比存储中的快照更新
+        data = self.store.load(key)
+        if data is None:
+            self.known_keys.discard(key)
+            return None
+        try:
+            return MinesweeperGame.from_bytes(data)
+        except ValueError:
+            self.mark_deleted(key)
+            return None
+
+    def mark_dirty(self, key: str, game: MinesweeperGame):
+        self._deleted.discard(key)
+        self._dirty[key] = game
+        self.known_keys.add(key)
+        self._schedule()
+
+    def mark_deleted(self, key: str):
+        self._dirty.pop(key, None)
+        if key in self.known_keys:
+            self.known_keys.discard(key)
+            self._deleted.add(key)
+            self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # 写入期间产生的新变化或写入失败的变化，在下一个周期继续写入
+        while self._dirty or self._deleted:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.errors += 1
+
+    async def flush(self):
+        """立即写入所有待保存的变化。"""
+        async with self._flush_lock:
+            if not self._dirty and not self._deleted:
+                return
+            # 在事件循环线程中序列化，保证快照与对局状态一致
+            games = dict(self._dirty)
+            upserts = {key: game.to_bytes() for key, game in games.items()}
+            deletes = list(self._deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+            try:
+                await asyncio.to_thread(self.store.write_batch, upserts, deletes)
+            except Exception:
+                # 写入失败: 把未被更新操作覆盖的变化放回队列
+                for key, game in games.items():
+                    if key not in self._dirty and key not in self._deleted:
+                        self._dirty[key] = game
+                for key in deletes:
+                    if key not in self._dirty:
+                        self._deleted.add(key)
+                raise
+            self.flushes += 1
+            self.written += len(upserts)
+
+    async def close(self):
+        """写入剩余的变化并关闭存储。"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        self.store.close()
@@ -0,0 +1,109 @@
+from .render_common import (SPRITE_EXPLODED, SPRITE_FLAG, SPRITE_FLAG_MINE, SPRITE_HIDDEN, SPRITE_HIDDEN_MINE,
+                            SPRITE_MINE, SPRITE_REVEALED, cell_sprite_key, clamp_viewport)
+
+# --- 文字棋盘 ---
+# 用 Unicode 字符或 emoji 组成的棋盘，不需要绘制和上传图片，适合不便发图或带宽较低的平台。
+# 坐标标注与图片一致: 上方为列号（多位数竖排），左侧为行号，视口内保持棋盘上的实际编号。
+
+TEXT_STYLES = {
+    # emoji 与全角数字宽度相近，在多数客户端中可以对齐
+    "emoji": {
+        "glyphs": {
+            SPRITE_HIDDEN: "🟦", SPRITE_REVEALED: "⬜", SPRITE_MINE: "💣", SPRITE_HIDDEN_MINE: "💣",
+            SPRITE_EXPLODED: "💥", SPRITE_FLAG: "🚩", SPRITE_FLAG_MINE: "🚩",
+            **{str(n): f"{n}️⃣" for n in range(1, 9)},
+        },
+        "digits": "０１２３４５６７８９",
+        "blank": "　",
+        "separator": "",
+    },
+    # 纯字符，适合等宽字体
+    "unicode": {
+        "glyphs": {
+            SPRITE_HIDDEN: "■", SPRITE_REVEALED: "·", SPRITE_MINE: "*", SPRITE_HIDDEN_MINE: "*",
+            SPRITE_EXPLODED: "X", SPRITE_FLAG: "F", SPRITE_FLAG_MINE: "F",
+            **{str(n): str(n) for n in range(1, 9)},
+        },
+        "digits": "0123456789",
+        "blank": " ",
+        "separator": " ",
+    },
+}
+DEFAULT_TEXT_STYLE = "emoji"
+DIFF_MAX_ROW_FRACTION = 0.5 # 变化的行不超过视口高度的这一比例时只发送这些行
+
+
+class TextCache:
+    """单局游戏的文字棋盘缓存：保存上一次发送的各行，用于只发送发生变化的行。"""
+    __slots__ = ("rows", "region", "style")
+
+    def __init__(self):
+        self.rows = None
+        self.region = None
+        self.style = None
+
+    def invalidate(self):
+        self.rows = None
+        self.region = None
+        self.style = None
+
+
+def _number(n, width, style):
+    """用样式的数字字符写出 n，左侧以空白补齐到 width 位。"""
+    text = "".join(style["digits"][int(d)] for d in str(n))
+    return style["blank"] * (width - len(str(n))) + text
+
+
+def _header(x0, width, label_width, style):
+    """列号标注: 每一位数字占一行，从最高位到个位，不足位数的列留空。"""
+    numbers = range(x0 + 1, x0 + width + 1)
+    places = len(str(numbers[-1]))
+    indent = style["blank"] * label_width
+    lines = []
+    for place in range(places - 1, -1, -1):
+        power = 10 ** place
+        cells = [style["digits"][n // power % 10] if n >= power else style["blank"] for n in numbers]
+        lines.append(indent + style["separator"] + style["separator"].join(cells))
+    return lines
+
+
+def render_text(game_state, cache=None, viewport=None, style=DEFAULT_TEXT_STYLE, full=False):
+    """
+    将棋盘状态渲染为文字棋盘。
+
+    提供 cache 且其中有同一区域、同一样式的上一帧时，只输出发生变化的行（连同列号），
+    变化的行过多、没有变化或 full 为真时输出完整棋盘。
+    """
+    board_width = game_state["width"]
+    board_height = game_state["height"]
+    if viewport is None:
+        viewport = (0, 0, board_width, board_height)
+    x0, y0, width, height = region = clamp_viewport(viewport, board_width, board_height)
+    chars = TEXT_STYLES[style]
+    glyphs = chars["glyphs"]
+    separator = chars["separator"]
+    label_width = len(str(y0 + height))
+
+    rows = []
+    for y in range(y0, y0 + height):
+        cells = separator.join(glyphs[cell_sprite_key(game_state, x, y)] for x in range(x0, x0 + width))
+        rows.append(_number(y + 1, label_width, chars) + separator + cells)
+
+    shown = range(height)
+    note = None
+    if cache is not None:
+        if not full and cache.rows is not None and cache.region == region and cache.style == style:
+            changed = [i for i in range(height) if rows[i] != cache.rows[i]]
+            if changed and len(changed) <= max(1, int(height * DIFF_MAX_ROW_FRACTION)):
+                shown = changed
+                row_names = "、".join(str(y0 + i + 1) for i in changed)
+                note = f"（只显示有变化的第 {row_names} 行）"
+        cache.rows = rows
+        cache.region = region
+        cache.style = style
+
+    lines = _header(x0, width, label_width, chars)
+    lines.extend(rows[i] for i in shown)
+    if note:
+        lines.append(note)
+    return "\n".join(lines)